@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""Throughput of N simulated users hitting Sheets directly vs. through AsyncSheetsClient.
+
+Usage: python benchmarks/bench_async_sheets.py [--users 50] [--latency 0.2] [--workers 8]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('BOT_TOKEN', 'benchmark')
+
+from sheets import SheetsClient, AsyncSheetsClient
+
+
+class SlowSheetsClient(SheetsClient):
+    """SheetsClient whose reads sleep for a fixed network latency instead of calling Google"""
+
+    def __init__(self, latency: float):
+        super().__init__()
+        self.latency = latency
+        self.initialized = True
+
+    def get_events(self):
+        time.sleep(self.latency)
+        return []
+
+
+async def run_blocking(client: SlowSheetsClient, users: int) -> float:
+    async def update():
+        client.get_events()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(update() for _ in range(users)))
+    return time.perf_counter() - start
+
+
+async def run_async(client: AsyncSheetsClient, users: int) -> float:
+    start = time.perf_counter()
+    await asyncio.gather(*(client.get_events() for _ in range(users)))
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.2)
+    parser.add_argument('--workers', type=int, default=8)
+    args = parser.parse_args()
+
+    client = SlowSheetsClient(args.latency)
+    async_client = AsyncSheetsClient(client, max_workers=args.workers)
+
+    blocking = asyncio.run(run_blocking(client, args.users))
+    concurrent = asyncio.run(run_async(async_client, args.users))
+    async_client.shutdown()
+
+    print(f"{args.users} users, {args.latency * 1000:.0f} ms per Sheets call, {args.workers} workers")
+    print(f"  blocking handlers: {blocking:.2f} s  ({args.users / blocking:.1f} updates/s)")
+    print(f"  AsyncSheetsClient: {concurrent:.2f} s  ({args.users / concurrent:.1f} updates/s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""Micro-benchmark: CallbackRouter.resolve vs. the old sequential if/elif dispatch.
+
+Usage: python benchmarks/bench_callback_router.py [--iterations 200000]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('BOT_TOKEN', 'benchmark')
+
+from handlers.router import CallbackRouter
+
+# Representative callback data, weighted towards the common taps
+SAMPLES = [
+    "ignore", "ignore", "ignore", "back_to_main", "events", "event_3", "event_12",
+    "calendar_2026_11", "date_2026-11-14", "class_Hatha Flow", "signup_event_42", "skip_comment",
+    "lang_en", "schedule", "admin_registrations",
+]
+
+EXACT = [
+    "back_to_main", "main_menu", "change_language", "events", "yoga_signup", "schedule", "store",
+    "about", "admin", "admin_registrations", "admin_refresh_cache", "admin_add_event",
+    "admin_broadcast", "broadcast_send",
+]
+
+# Same table as handlers/callbacks.py, without importing the Sheets client
+PATTERNS = EXACT + [
+    "ignore", "skip_comment", "lang_{str}", "calendar_{int}_{int}", "date_{iso}", "class_{str}",
+    "event_{str}", "next_event_{int}", "signup_event_{str}",
+]
+
+
+async def noop(*args, **kwargs) -> None:
+    pass
+
+
+def if_chain(data: str) -> str:
+    """Branch order of the former button_callback"""
+    if data.startswith("lang_"):
+        return "lang"
+    for name in EXACT:
+        if data == name:
+            return name
+    if data.startswith("calendar_"):
+        parts = data.split("_")
+        return "calendar" if len(parts) == 3 and int(parts[1]) and int(parts[2]) else ""
+    if data.startswith("date_"):
+        return "date"
+    if data.startswith("class_"):
+        return "class"
+    if data == "skip_comment":
+        return "skip_comment"
+    if data.startswith("event_"):
+        return data.split("_")[-1]
+    if data.startswith("next_event_"):
+        return str(int(data.split("_")[-1]))
+    if data.startswith("signup_event_"):
+        return data.split("_")[-1]
+    if data == "ignore":
+        return "ignore"
+    return ""
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=200000)
+    args = parser.parse_args()
+
+    router = CallbackRouter()
+    for pattern in PATTERNS:
+        router.add(pattern, noop)
+    for data in SAMPLES:
+        assert router.resolve(data) is not None, data
+
+    def run_router():
+        for data in SAMPLES:
+            router.resolve(data)
+
+    def run_chain():
+        for data in SAMPLES:
+            if_chain(data)
+
+    rounds = max(1, args.iterations // len(SAMPLES))
+    router_time = timeit.timeit(run_router, number=rounds)
+    chain_time = timeit.timeit(run_chain, number=rounds)
+    per_call = 1e9 / (rounds * len(SAMPLES))
+    print(f"{rounds * len(SAMPLES)} dispatches over {len(SAMPLES)} callback shapes")
+    print(f"  if/elif chain:  {chain_time * per_call:7.0f} ns/dispatch")
+    print(f"  CallbackRouter: {router_time * per_call:7.0f} ns/dispatch")
+
+
+if __name__ == '__main__':
+    main()
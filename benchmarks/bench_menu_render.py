@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""Benchmark: CPU time per update of the main menu handler, rebuilding markup vs. prerendered screens.
+
+Usage: python benchmarks/bench_menu_render.py [--updates 20000]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('BOT_TOKEN', 'benchmark')
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+import handlers.user as user_handlers
+from handlers.screens import prerender
+from utils.localization import get_text
+from config import LANGUAGES
+
+
+class FakeSheetsClient:
+    """Answers language lookups from memory, as the warm user cache does"""
+
+    async def get_user_language(self, user_id):
+        return LANGUAGES[user_id % len(LANGUAGES)]
+
+
+class FakeQuery:
+    async def edit_message_text(self, text, reply_markup=None, parse_mode=None):
+        pass
+
+
+class FakeUser:
+    def __init__(self, user_id):
+        self.id = user_id
+
+
+class FakeUpdate:
+    def __init__(self, user_id):
+        self.effective_user = FakeUser(user_id)
+        self.callback_query = FakeQuery()
+        self.message = None
+
+
+async def rebuilt_main_menu(update, context) -> None:
+    """The main menu handler as it was before screens were prerendered"""
+    user_id = update.effective_user.id
+    user_lang = await user_handlers.sheets_client.get_user_language(user_id)
+
+    keyboard = [
+        [
+            InlineKeyboardButton(get_text("events", user_lang), callback_data="events"),
+            InlineKeyboardButton(get_text("yoga_signup", user_lang), callback_data="yoga_signup")
+        ],
+        [
+            InlineKeyboardButton(get_text("schedule", user_lang), callback_data="schedule"),
+            InlineKeyboardButton(get_text("store", user_lang), callback_data="store")
+        ],
+        [
+            InlineKeyboardButton(get_text("about_me", user_lang), callback_data="about"),
+            InlineKeyboardButton("🌐 " + {
+                'uk': 'Українська',
+                'en': 'English',
+                'de': 'Deutsch'
+            }[user_lang], callback_data="change_language")
+        ]
+    ]
+    if user_id in user_handlers.ADMIN_USER_IDS:
+        keyboard.append([InlineKeyboardButton(get_text("admin_panel", user_lang), callback_data="admin")])
+
+    await update.callback_query.edit_message_text(
+        text=get_text("main_menu", user_lang),
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+
+
+async def measure(handler, updates) -> float:
+    """CPU seconds spent handling every update"""
+    started = time.process_time()
+    for update in updates:
+        await handler(update, None)
+    return time.process_time() - started
+
+
+async def run(count: int) -> None:
+    user_handlers.sheets_client = FakeSheetsClient()
+    prerender()
+    updates = [FakeUpdate(user_id) for user_id in range(count)]
+
+    rebuilt = await measure(rebuilt_main_menu, updates)
+    cached = await measure(user_handlers.main_menu, updates)
+    print(f"{count} main menu updates")
+    print(f"  rebuilt markup:     {rebuilt / count * 1e6:7.1f} µs CPU/update")
+    print(f"  prerendered screen: {cached / count * 1e6:7.1f} µs CPU/update")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--updates', type=int, default=20000)
+    args = parser.parse_args()
+    asyncio.run(run(args.updates))
+
+
+if __name__ == '__main__':
+    main()
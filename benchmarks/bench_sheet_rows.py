@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""Memory and CPU of reading a large worksheet as get_all_records dicts vs. columnar Rows.
+
+Builds the registrations sheet from the same get_all_values() result as
+get_all_records() did (numericised dicts), as plain dict(zip(header, row))
+dicts and as Rows, then runs what the registrations page does without the
+replica (filter by class type, sort by registration time). Savings are
+against plain dicts, so numericise's share of the old cost is not credited to
+Rows. The replica's query() is measured the same way: dicts copied from
+sqlite3.Row before, Rows over plain tuples now.
+
+Usage: python benchmarks/bench_sheet_rows.py [--rows 50000] [--repeat 3]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('BOT_TOKEN', 'benchmark')
+
+from gspread.utils import numericise_all
+
+from replica import SheetsReplica
+from sheet_rows import rows_from_values
+from sheets import WORKSHEET_HEADERS
+
+HEADER = WORKSHEET_HEADERS['yoga_registrations']
+CLASS_TYPES = ['Hatha', 'Vinyasa', 'Yin', 'Kundalini']
+
+
+def sheet_values(count: int):
+    """What get_all_values() returns for a registrations sheet of `count` rows"""
+    rows = [list(HEADER)]
+    for index in range(1, count + 1):
+        rows.append([
+            str(index), f"User {index}", f"user{index}@example.com", f"2024-{index % 12 + 1:02d}-{index % 28 + 1:02d}",
+            CLASS_TYPES[index % len(CLASS_TYPES)], "" if index % 3 else "First class",
+            f"2024-01-01 {index // 3600 % 24:02d}:{index // 60 % 60:02d}:{index % 60:02d}",
+        ])
+    return rows
+
+
+def get_all_records(values):
+    """gspread's get_all_records() on already fetched values"""
+    keys = values[0]
+    return [dict(zip(keys, numericise_all(row))) for row in values[1:]]
+
+
+def plain_dicts(values):
+    """One dict per row without numericising, the cheapest dict-based reader"""
+    keys = values[0]
+    return [dict(zip(keys, row)) for row in values[1:]]
+
+
+def registrations_page(records):
+    selected = [r for r in records if r.get('class_type') == 'Yin']
+    selected.sort(key=lambda r: r.get('registered_at', ''), reverse=True)
+    return selected[:10]
+
+
+def measure(build, repeat: int):
+    """(best CPU seconds to build, best CPU seconds to page, bytes held by the result)"""
+    build_times, page_times = [], []
+    for _ in range(repeat):
+        started = time.process_time()
+        records = build()
+        build_times.append(time.process_time() - started)
+        started = time.process_time()
+        registrations_page(records)
+        page_times.append(time.process_time() - started)
+        del records
+
+    tracemalloc.start()
+    records = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del records
+    return min(build_times), min(page_times), size
+
+
+def report(title: str, results) -> None:
+    """Print (label, measure() result) pairs; the last one is compared with the one before it"""
+    print(title)
+    for label, (build, page, size) in results:
+        print(f"  {label:8} build {build * 1000:7.1f} ms CPU   page {page * 1000:6.1f} ms CPU   "
+              f"held {size / 2 ** 20:6.1f} MiB")
+    before, after = results[-2][1], results[-1][1]
+    print(f"  {'saved':8} build {(1 - after[0] / before[0]) * 100:5.0f} %       page {(1 - after[1] / before[1]) * 100:5.0f} %"
+          f"       held {(1 - after[2] / before[2]) * 100:5.0f} %")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    values = sheet_values(args.rows)
+    print(f"{args.rows} registrations, {len(HEADER)} columns")
+    report("Sheet read (get_all_values result):", [
+        ("records", measure(lambda: get_all_records(values), args.repeat)),
+        ("dicts", measure(lambda: plain_dicts(values), args.repeat)),
+        ("Rows", measure(lambda: rows_from_values(values), args.repeat)),
+    ])
+
+    with tempfile.TemporaryDirectory(prefix='bench-rows-') as workdir:
+        path = os.path.join(workdir, 'replica.db')
+        replica = SheetsReplica(path, WORKSHEET_HEADERS)
+        with replica._lock:
+            replica._insert_rows('yoga_registrations', values[1:], 2)
+
+        conn = sqlite3.connect(path)
+        conn.row_factory = sqlite3.Row
+        columns = ", ".join(f'"{column}"' for column in HEADER)
+
+        def query_dicts():
+            return [dict(row) for row in conn.execute(f'SELECT {columns} FROM yoga_registrations').fetchall()]
+
+        report("Replica query:", [
+            ("dicts", measure(query_dicts, args.repeat)),
+            ("Rows", measure(lambda: replica.query('yoga_registrations'), args.repeat)),
+        ])
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,334 @@
+"""In-process stand-ins for the Google Sheets REST API and the Telegram Bot API, used by the load test.
+
+Nothing here talks to the network. The Sheets fake is an HTTP session that
+gspread's own client sends its requests through, so the bot's client class,
+quota scheduler, metrics and schema code all run as in production. Both
+fakes count calls by operation, add a configurable latency, and the Sheets
+fake can answer with quota errors like the real API does.
+"""
+import asyncio
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter, deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import unquote
+
+from telegram.request import BaseRequest
+
+_A1_RANGE = re.compile(r'^([A-Z]*)(\d*)(?::([A-Z]*)(\d*))?$')
+_SHEETS_URL = re.compile(r'^https://sheets\.googleapis\.com/v4/spreadsheets/([^/:]+)(?:/values/([^:]+)|/values)?(?::(\w+))?$')
+
+
+def _column_index(letters: str) -> int:
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter) - ord('A') + 1
+    return index
+
+
+def _column_letter(index: int) -> str:
+    letters = ''
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return letters
+
+
+def _split_range(range_name: str) -> Tuple[str, str]:
+    """("title", "A1:B2") of "'title'!A1:B2"; the A1 part is '' for a whole worksheet"""
+    title, _, cells = range_name.partition('!')
+    if title.startswith("'") and title.endswith("'"):
+        title = title[1:-1].replace("''", "'")
+    return title, cells
+
+
+class FakeResponse:
+    """Enough of requests.Response for gspread's client and gspread.exceptions.APIError"""
+
+    def __init__(self, status_code: int, body: Dict[str, Any]):
+        self.status_code = status_code
+        self.ok = status_code < 400
+        self.headers: Dict[str, str] = {}
+        self.text = json.dumps(body)
+        self.content = self.text.encode('utf-8')
+
+    def json(self) -> Dict[str, Any]:
+        return json.loads(self.text)
+
+
+class FakeWorksheet:
+    """One worksheet's cells, a list of rows (row 1 is the header)"""
+
+    def __init__(self, sheet_id: int, title: str, rows: List[List[str]], row_count: int = 1000):
+        self.sheet_id = sheet_id
+        self.title = title
+        self.rows = rows
+        self.row_count = max(row_count, len(rows))
+
+    def properties(self, index: int) -> Dict[str, Any]:
+        width = max((len(row) for row in self.rows), default=1)
+        return {'sheetId': self.sheet_id, 'title': self.title, 'index': index, 'sheetType': 'GRID',
+                'gridProperties': {'rowCount': self.row_count, 'columnCount': max(width, 26)}}
+
+    def read(self, cells: str, by_columns: bool = False) -> List[List[str]]:
+        """Values in an A1 range, without trailing empty rows and cells like the API"""
+        match = _A1_RANGE.match(cells)
+        if match is None:
+            raise ValueError(f"Unsupported range {cells!r}")
+        first_col, first_row, last_col, last_row = match.groups()
+        start_row = int(first_row or 1)
+        start_col = _column_index(first_col) if first_col else 1
+        if match.group(3) is None:
+            end_col, end_row = start_col if first_col else None, int(first_row) if first_row else None
+        else:
+            end_col = _column_index(last_col) if last_col else None
+            end_row = int(last_row) if last_row else None
+        selected = [list(row[start_col - 1:end_col]) for row in self.rows[start_row - 1:end_row]]
+        if by_columns:
+            width = max((len(row) for row in selected), default=0)
+            selected = [[row[col] if col < len(row) else '' for row in selected] for col in range(width)]
+        for values in selected:
+            while values and values[-1] == '':
+                values.pop()
+        while selected and not selected[-1]:
+            selected.pop()
+        return selected
+
+    def write(self, cells: str, values: List[List[Any]]) -> int:
+        match = _A1_RANGE.match(cells)
+        first_col, first_row = _column_index(match.group(1)), int(match.group(2))
+        for row_offset, row_values in enumerate(values):
+            row_number = first_row + row_offset
+            while len(self.rows) < row_number:
+                self.rows.append([])
+            row = self.rows[row_number - 1]
+            for col_offset, value in enumerate(row_values):
+                col = first_col + col_offset
+                row.extend([''] * (col - len(row)))
+                row[col - 1] = str(value)
+        return sum(len(row_values) for row_values in values)
+
+    def append(self, values: List[List[Any]]) -> Dict[str, Any]:
+        # The API appends after the last row of the table holding data
+        while self.rows and not any(self.rows[-1]):
+            self.rows.pop()
+        first = len(self.rows) + 1
+        self.rows.extend([str(value) for value in row] for row in values)
+        self.row_count = max(self.row_count, len(self.rows))
+        width = max((len(row) for row in values), default=1)
+        return {'updatedRange': f"'{self.title}'!A{first}:{_column_letter(width)}{len(self.rows)}",
+                'updatedRows': len(values), 'updatedColumns': width,
+                'updatedCells': sum(len(row) for row in values)}
+
+
+class FakeSheetsBackend:
+    """Holds the spreadsheet data and applies latency, quota and failure rules to every request
+
+    quota_per_minute mimics the per-minute request quota of the Sheets API:
+    requests over it fail with HTTP 429 until the minute window moves on.
+    error_rate fails that fraction of the remaining requests with HTTP 503.
+    """
+
+    def __init__(self, latency: float = 0.0, quota_per_minute: int = 0, error_rate: float = 0.0,
+                 seed: int = 0, title: str = 'Load test'):
+        self.latency = latency
+        self.quota_per_minute = quota_per_minute
+        self.error_rate = error_rate
+        self.title = title
+        self.calls: Counter = Counter()
+        self.errors: Counter = Counter()
+        self.worksheets: Dict[str, FakeWorksheet] = {}
+        self._sheet_ids = itertools.count(0)
+        self._window: deque = deque()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def add_worksheet(self, title: str, rows: List[List[Any]], row_count: int = 1000) -> FakeWorksheet:
+        worksheet = FakeWorksheet(next(self._sheet_ids), title, [[str(value) for value in row] for row in rows],
+                                  row_count)
+        self.worksheets[title] = worksheet
+        return worksheet
+
+    def handle(self, method: str, url: str, params: Optional[Dict[str, Any]], body: Optional[Dict[str, Any]]) -> FakeResponse:
+        """Answer one HTTP request to the Sheets API"""
+        match = _SHEETS_URL.match(url.split('?')[0])
+        if match is None:
+            return self._error(404, f"Unsupported URL {url}", 'NOT_FOUND')
+        key, range_name, action = match.groups()
+        range_name = unquote(range_name) if range_name else None
+        operation = action or ('values.get' if range_name else method)
+
+        with self._lock:
+            self.calls[operation] += 1
+            error = self._check_quota()
+        if error is not None:
+            self.errors[error] += 1
+            if error == 429:
+                return self._error(429, 'Fake quota exceeded', 'RESOURCE_EXHAUSTED')
+            return self._error(503, 'Backend error', 'UNAVAILABLE')
+
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            try:
+                return FakeResponse(200, self._apply(key, method, range_name, action, params or {}, body or {}))
+            except KeyError as e:
+                return self._error(400, f"Unable to parse range: {e}", 'INVALID_ARGUMENT')
+
+    def _apply(self, key: str, method: str, range_name: Optional[str], action: Optional[str],
+               params: Dict[str, Any], body: Dict[str, Any]) -> Dict[str, Any]:
+        if range_name is not None and action is None:
+            title, cells = _split_range(range_name)
+            values = self.worksheets[title].read(cells, params.get('majorDimension') == 'COLUMNS')
+            result = {'range': range_name, 'majorDimension': params.get('majorDimension', 'ROWS')}
+            if values:
+                result['values'] = values
+            return result
+        if action == 'append':
+            title, _ = _split_range(range_name)
+            return {'spreadsheetId': key, 'updates': self.worksheets[title].append(body.get('values', []))}
+        if action == 'batchUpdate' and range_name is None and 'data' in body:
+            updated = 0
+            for item in body['data']:
+                title, cells = _split_range(item['range'])
+                updated += self.worksheets[title].write(cells, item['values'])
+            return {'spreadsheetId': key, 'totalUpdatedCells': updated}
+        if action == 'batchUpdate':
+            replies = []
+            for request in body.get('requests', []):
+                properties = request['addSheet']['properties']
+                worksheet = self.add_worksheet(properties['title'], [],
+                                               properties.get('gridProperties', {}).get('rowCount', 1000))
+                replies.append({'addSheet': {'properties': worksheet.properties(len(self.worksheets) - 1)}})
+            return {'spreadsheetId': key, 'replies': replies}
+        if method == 'get' and action is None:
+            return self._metadata(key, params)
+        raise KeyError(f"{method} {action}")
+
+    def _metadata(self, key: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """spreadsheets.get: sheet properties, and header cells for `ranges` when grid data is asked for"""
+        ranges = params.get('ranges') or []
+        if isinstance(ranges, str):
+            ranges = [ranges]
+        with_data = {}
+        for range_name in ranges:
+            title, cells = _split_range(range_name)
+            # A range naming a missing worksheet fails the whole request
+            with_data[title] = self.worksheets[title].read(cells)
+        sheets = []
+        for index, worksheet in enumerate(self.worksheets.values()):
+            sheet: Dict[str, Any] = {'properties': worksheet.properties(index)}
+            if str(params.get('includeGridData')).lower() == 'true' and worksheet.title in with_data:
+                sheet['data'] = [{'rowData': [{'values': [{'formattedValue': value} for value in row]}
+                                              for row in with_data[worksheet.title]]}]
+            sheets.append(sheet)
+        return {'spreadsheetId': key, 'properties': {'title': self.title}, 'sheets': sheets}
+
+    def _error(self, code: int, message: str, status: str) -> FakeResponse:
+        return FakeResponse(code, {'error': {'code': code, 'message': message, 'status': status}})
+
+    def _check_quota(self) -> Optional[int]:
+        now = time.monotonic()
+        if self.quota_per_minute:
+            while self._window and now - self._window[0] >= 60:
+                self._window.popleft()
+            if len(self._window) >= self.quota_per_minute:
+                return 429
+            self._window.append(now)
+        if self.error_rate and self._random.random() < self.error_rate:
+            return 503
+        return None
+
+
+class FakeSheetsSession:
+    """HTTP session for gspread.Client that answers from a FakeSheetsBackend instead of the network"""
+
+    def __init__(self, backend: FakeSheetsBackend):
+        self.backend = backend
+        self.headers: Dict[str, str] = {}
+
+    def request(self, method: str, url: str, params=None, json=None, **kwargs) -> FakeResponse:
+        return self.backend.handle(method.lower(), url, params, json)
+
+    def get(self, url: str, **kwargs) -> FakeResponse:
+        return self.request('get', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> FakeResponse:
+        return self.request('post', url, **kwargs)
+
+    def put(self, url: str, **kwargs) -> FakeResponse:
+        return self.request('put', url, **kwargs)
+
+
+class FakeTelegramRequest(BaseRequest):
+    """Bot API transport that answers from memory instead of calling api.telegram.org
+
+    Keeps the last text and inline keyboard sent to each chat, so simulated
+    users can press the buttons the bot actually showed them.
+    """
+
+    BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'Load test', 'username': 'load_test_bot'}
+
+    def __init__(self, latency: float = 0.0, on_request: Optional[Callable[[str, float], None]] = None):
+        self.latency = latency
+        self.on_request = on_request
+        self.calls: Counter = Counter()
+        self.last_text: Dict[int, str] = {}
+        self.last_markup: Dict[int, List[List[Dict[str, Any]]]] = {}
+        self._message_ids = itertools.count(1000)
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    @property
+    def read_timeout(self) -> Optional[float]:
+        return None
+
+    async def do_request(self, url: str, method: str, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None) -> Tuple[int, bytes]:
+        started = time.perf_counter()
+        api_method = url.rsplit('/', 1)[-1]
+        self.calls[api_method] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        params = request_data.parameters if request_data is not None else {}
+        result = self._answer(api_method, params)
+        if self.on_request is not None:
+            self.on_request(api_method, time.perf_counter() - started)
+        return 200, json.dumps({'ok': True, 'result': result}).encode('utf-8')
+
+    def _answer(self, api_method: str, params: Dict[str, Any]) -> Any:
+        if api_method == 'getMe':
+            return self.BOT_USER
+        if api_method in ('sendMessage', 'editMessageText', 'editMessageReplyMarkup', 'sendDocument'):
+            chat_id = int(params.get('chat_id', 0))
+            markup = params.get('reply_markup') or {}
+            if isinstance(markup, str):
+                markup = json.loads(markup)
+            if 'text' in params:
+                self.last_text[chat_id] = params['text']
+            self.last_markup[chat_id] = markup.get('inline_keyboard', [])
+            message = {
+                'message_id': int(params.get('message_id') or next(self._message_ids)),
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'},
+                'from': self.BOT_USER,
+            }
+            if 'text' in params:
+                message['text'] = params['text']
+            if markup:
+                message['reply_markup'] = markup
+            if api_method == 'sendDocument':
+                message['document'] = {'file_id': 'document', 'file_unique_id': 'document'}
+            return message
+        return True
+
+    def buttons(self, chat_id: int) -> List[Dict[str, Any]]:
+        return [button for row in self.last_markup.get(chat_id, []) for button in row]
@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+"""Load test: replay simulated user journeys through the real handlers against fake Sheets and Telegram backends.
+
+Runs offline: no Google account or bot token is needed. Each scenario runs
+--users journeys, --concurrency at a time, and reports throughput, update
+latency percentiles and the Sheets and Telegram API calls it caused.
+
+Usage: python benchmarks/load_test.py [--scenarios start,events,signup,comment,broadcast] [--users 200]
+           [--concurrency 50] [--sheets-latency 0.1] [--sheets-quota 0] [--sheets-error-rate 0] [--client-quota 60]
+           [--telegram-latency 0.03] [--seed-users 300] [--events 30] [--no-replica] [--json results.json]
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIR))
+
+from fakes import FakeSheetsBackend, FakeSheetsSession, FakeTelegramRequest
+
+SCENARIOS = ('start', 'events', 'signup', 'comment', 'broadcast')
+ADMIN_ID = 999
+# Simulated users get ids above the seeded ones
+FIRST_USER_ID = 10_000_000
+
+
+def configure_environment(args: argparse.Namespace, workdir: str) -> None:
+    """Point config.py at a scratch directory and the fakes; must run before the bot modules are imported"""
+    credentials = os.path.join(workdir, 'credentials.json')
+    with open(credentials, 'w') as f:
+        f.write('{}')
+    os.environ.update({
+        'BOT_TOKEN': '123456:LOADTEST',
+        'SPREADSHEET_ID': 'load-test',
+        'CREDENTIALS_FILE': credentials,
+        'DATA_DIR': os.path.join(workdir, 'data'),
+        'LOG_FILE': os.path.join(workdir, 'bot.log'),
+        'LOG_LEVEL': args.log_level,
+        'ADMIN_USER_IDS': str(ADMIN_ID),
+        'BROADCAST_RATE': str(args.broadcast_rate),
+        'BROADCAST_PROGRESS_INTERVAL': '1',
+        'REPLICA_ENABLED': 'false' if args.no_replica else 'true',
+        'REPLICA_SYNC_INTERVAL': '5',
+        'SHEETS_FLUSH_INTERVAL': '1',
+        'SHEETS_READ_QUOTA': str(args.client_quota),
+        'SHEETS_WRITE_QUOTA': str(args.client_quota),
+        'HEALTH_PORT': '0',
+        'METRICS_LOG_INTERVAL': '0',
+    })
+    # config.py creates ./logs, so keep it out of the checkout
+    os.chdir(workdir)
+
+
+def seed_backend(backend: FakeSheetsBackend, args: argparse.Namespace) -> None:
+    from datetime import date, timedelta
+    from sheets import WORKSHEET_HEADERS
+
+    today = date.today()
+    backend.add_worksheet('users', [WORKSHEET_HEADERS['users']] + [
+        [str(user_id), ('uk', 'en', 'de')[user_id % 3], '2024-01-01 00:00:00']
+        for user_id in range(1, args.seed_users + 1)
+    ])
+    backend.add_worksheet('events', [WORKSHEET_HEADERS['events']] + [
+        [str(index), f"Подія {index}", f"Event {index}", f"Veranstaltung {index}",
+         (today + timedelta(days=index)).isoformat(), '18:00', 'Kyiv', '300',
+         'Опис', 'Description', 'Beschreibung']
+        for index in range(1, args.events + 1)
+    ])
+    backend.add_worksheet('schedule', [WORKSHEET_HEADERS['schedule']] + [
+        [day, '09:00', f"Хатха {day}", f"Hatha {day}", f"Hatha {day}", '']
+        for day in ('Monday', 'Wednesday', 'Friday')
+    ])
+    backend.add_worksheet('yoga_registrations', [WORKSHEET_HEADERS['yoga_registrations']] + [
+        [str(index), f"User {index}", f"user{index}@example.com",
+         (today - timedelta(days=index % 90)).isoformat(), 'Hatha Monday', '', '2024-01-01 00:00:00']
+        for index in range(1, args.seed_registrations + 1)
+    ])
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
+class JourneyError(Exception):
+    """The bot did not show what the simulated user expected"""
+
+
+class Harness:
+    """Feeds synthetic updates to the Application the way the update fetcher does"""
+
+    def __init__(self, application, telegram: FakeTelegramRequest):
+        self.application = application
+        self.telegram = telegram
+        self.latencies: List[float] = []
+        self.handler_errors = 0
+        self._update_ids = itertools.count(1)
+        self._user_ids = itertools.count(FIRST_USER_ID)
+
+    def new_user_id(self) -> int:
+        return next(self._user_ids)
+
+    async def send(self, data: Dict[str, Any]) -> None:
+        from telegram import Update
+
+        data['update_id'] = next(self._update_ids)
+        update = Update.de_json(data, self.application.bot)
+        # process_update only queues the update, so wait for the handler to finish
+        handled = asyncio.get_running_loop().create_future()
+
+        async def handle() -> None:
+            try:
+                await self.application.process_update(update)
+            finally:
+                handled.set_result(None)
+
+        started = time.perf_counter()
+        await self.application.update_processor.process_update(update, handle())
+        await handled
+        self.latencies.append(time.perf_counter() - started)
+
+    async def on_error(self, update: object, context) -> None:
+        self.handler_errors += 1
+
+
+class SimulatedUser:
+    """One chat with the bot; presses only buttons the bot has shown"""
+
+    def __init__(self, harness: Harness, user_id: int):
+        self.harness = harness
+        self.user_id = user_id
+        self.user = {'id': user_id, 'is_bot': False, 'first_name': f"User {user_id}", 'language_code': 'uk'}
+        self.chat = {'id': user_id, 'type': 'private'}
+        self.message_id = 1
+
+    def _message(self, text: str) -> Dict[str, Any]:
+        self.message_id += 1
+        message = {'message_id': self.message_id, 'date': int(time.time()), 'chat': self.chat,
+                   'from': self.user, 'text': text}
+        if text.startswith('/'):
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+        return message
+
+    async def say(self, text: str) -> None:
+        await self.harness.send({'message': self._message(text)})
+
+    async def press(self, callback_data: str) -> None:
+        await self.harness.send({'callback_query': {
+            'id': str(self.message_id), 'from': self.user, 'chat_instance': str(self.user_id),
+            'data': callback_data,
+            'message': {'message_id': self.message_id, 'date': int(time.time()), 'chat': self.chat,
+                        'from': FakeTelegramRequest.BOT_USER, 'text': self.text},
+        }})
+
+    @property
+    def text(self) -> str:
+        return self.harness.telegram.last_text.get(self.user_id, '')
+
+    def button(self, prefix: str = '', label: str = '') -> Optional[str]:
+        """callback_data of the first shown button matching the data prefix and label text"""
+        for button in self.harness.telegram.buttons(self.user_id):
+            data = button.get('callback_data', '')
+            if data.startswith(prefix) and label in button.get('text', '') and data != 'ignore':
+                return data
+        return None
+
+    async def press_button(self, prefix: str = '', label: str = '') -> None:
+        data = self.button(prefix, label)
+        if data is None:
+            raise JourneyError(f"No button {prefix!r}/{label!r} after {self.text[:40]!r}")
+        await self.press(data)
+
+
+async def journey_start(user: SimulatedUser, args: argparse.Namespace) -> None:
+    """/start -> choose a language -> main menu"""
+    await user.say('/start')
+    if user.button('lang_') is None:
+        await user.press_button('change_language')
+    await user.press_button('lang_')
+    await user.press_button('back_to_main')
+    if user.button('events') is None:
+        raise JourneyError(f"No main menu after {user.text[:40]!r}")
+
+
+async def journey_events(user: SimulatedUser, args: argparse.Namespace) -> None:
+    """Main menu -> events -> page forward through --pages events -> back"""
+    await user.say('/start')
+    await user.press_button('events')
+    for _ in range(args.pages):
+        if user.button('event_', 'Next') is None:
+            break
+        await user.press_button('event_', 'Next')
+    await user.press_button('back_to_main')
+
+
+async def journey_signup(user: SimulatedUser, args: argparse.Namespace) -> None:
+    """Main menu -> yoga signup -> name -> email -> calendar date -> class -> skip comment"""
+    await user.say('/start')
+    await user.press_button('yoga_signup')
+    await user.say(f"User {user.user_id}")
+    await user.say(f"user{user.user_id}@example.com")
+    await user.press_button('date_')
+    await user.press_button('class_')
+    await user.press_button('skip_comment')
+
+
+async def journey_comment(user: SimulatedUser, args: argparse.Namespace) -> None:
+    """Like signup, but types a comment instead of skipping it"""
+    await user.say('/start')
+    await user.press_button('yoga_signup')
+    await user.say(f"User {user.user_id}")
+    await user.say(f"user{user.user_id}@example.com")
+    await user.press_button('date_')
+    await user.press_button('class_')
+    await user.say('First class, knee injury')
+    if user.button('back_to_main') is None:
+        raise JourneyError(f"No registration result after {user.text[:40]!r}")
+
+
+async def journey_broadcast(user: SimulatedUser, args: argparse.Namespace) -> None:
+    """Admin panel -> broadcast -> text -> confirm, then wait until delivery finishes"""
+    await user.say('/start')
+    await user.press('admin')
+    await user.press_button('admin_broadcast')
+    await user.say('Load test broadcast')
+    await user.press_button('broadcast_send')
+    deadline = time.monotonic() + args.broadcast_timeout
+    while not user.text.startswith('Broadcast complete'):
+        if time.monotonic() > deadline:
+            raise JourneyError('Broadcast did not finish in time')
+        await asyncio.sleep(0.2)
+
+
+JOURNEYS: Dict[str, Callable[[SimulatedUser, argparse.Namespace], Awaitable[None]]] = {
+    'start': journey_start,
+    'events': journey_events,
+    'signup': journey_signup,
+    'comment': journey_comment,
+    'broadcast': journey_broadcast,
+}
+
+
+async def run_scenario(name: str, harness: Harness, backend: FakeSheetsBackend,
+                       args: argparse.Namespace) -> Dict[str, Any]:
+    from sheets import sheets_client
+
+    journey = JOURNEYS[name]
+    # A broadcast goes to every user, so one admin journey is the whole scenario
+    journeys = 1 if name == 'broadcast' else args.users
+    semaphore = asyncio.Semaphore(args.concurrency)
+    failures: Counter = Counter()
+
+    sheets_before, telegram_before = Counter(backend.calls), Counter(harness.telegram.calls)
+    quota_before, errors_before = Counter(backend.errors), harness.handler_errors
+    harness.latencies = []
+
+    async def one() -> None:
+        user_id = ADMIN_ID if name == 'broadcast' else harness.new_user_id()
+        async with semaphore:
+            try:
+                await journey(SimulatedUser(harness, user_id), args)
+            except JourneyError as e:
+                failures[str(e).split(' after ')[0]] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(journeys)))
+    elapsed = time.perf_counter() - started
+    # Writes queued by the journeys are part of their cost
+    await asyncio.get_running_loop().run_in_executor(None, sheets_client.write_queue.flush)
+
+    latencies = harness.latencies
+    sheets_calls = backend.calls - sheets_before
+    telegram_calls = harness.telegram.calls - telegram_before
+    return {
+        'scenario': name,
+        'journeys': journeys,
+        'failed': sum(failures.values()),
+        'failures': dict(failures),
+        'updates': len(latencies),
+        'seconds': round(elapsed, 3),
+        'journeys_per_second': round(journeys / elapsed, 2),
+        'updates_per_second': round(len(latencies) / elapsed, 2),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 1),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 1),
+        'handler_errors': harness.handler_errors - errors_before,
+        'sheets_calls': dict(sheets_calls),
+        'sheets_errors': dict(backend.errors - quota_before),
+        'telegram_calls': dict(telegram_calls),
+    }
+
+
+def print_report(results: List[Dict[str, Any]], args: argparse.Namespace) -> None:
+    print(f"{args.users} journeys per scenario, concurrency {args.concurrency}, "
+          f"Sheets latency {args.sheets_latency * 1000:.0f} ms, Telegram latency {args.telegram_latency * 1000:.0f} ms, "
+          f"replica {'off' if args.no_replica else 'on'}")
+    print(f"{'scenario':<10} {'journeys':>8} {'failed':>6} {'updates':>7} {'time s':>7} {'upd/s':>7} "
+          f"{'p50 ms':>7} {'p95 ms':>7} {'p99 ms':>7} {'sheets/j':>8} {'tg/j':>6}")
+    for result in results:
+        journeys = result['journeys']
+        print(f"{result['scenario']:<10} {journeys:>8} {result['failed']:>6} {result['updates']:>7} "
+              f"{result['seconds']:>7.2f} {result['updates_per_second']:>7.1f} {result['p50_ms']:>7.1f} "
+              f"{result['p95_ms']:>7.1f} {result['p99_ms']:>7.1f} "
+              f"{sum(result['sheets_calls'].values()) / journeys:>8.2f} "
+              f"{sum(result['telegram_calls'].values()) / journeys:>6.1f}")
+    for result in results:
+        print(f"\n{result['scenario']}:")
+        print(f"  Sheets calls:   {_format_counts(result['sheets_calls'])}")
+        if result['sheets_errors']:
+            print(f"  Sheets errors:  {_format_counts(result['sheets_errors'])}")
+        print(f"  Telegram calls: {_format_counts(result['telegram_calls'])}")
+        if result['failures'] or result['handler_errors']:
+            print(f"  Failures: {result['failures']}, handler errors: {result['handler_errors']}")
+
+
+def _format_counts(counts: Dict[Any, int]) -> str:
+    return ', '.join(f"{key} {value}" for key, value in sorted(counts.items(), key=lambda item: -item[1])) or '-'
+
+
+async def run(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    import gspread
+    import metrics
+    import sheets
+    from bot import build_application, start_background_tasks, post_shutdown
+
+    backend = FakeSheetsBackend(args.sheets_latency, args.sheets_quota, args.sheets_error_rate)
+    seed_backend(backend, args)
+
+    def authorize(credentials, client_factory=gspread.Client):
+        """gspread.authorize, but the client's HTTP session answers from the fake backend"""
+        client = client_factory(auth=credentials)
+        client.session = FakeSheetsSession(backend)
+        return client
+
+    # SheetsClient.initialize connects through these two calls
+    gspread.authorize = authorize
+    sheets.ServiceAccountCredentials.from_json_keyfile_name = staticmethod(lambda *a, **k: None)
+
+    telegram = FakeTelegramRequest(args.telegram_latency, on_request=metrics.record_telegram_call)
+    application = build_application(receive_updates=False, request=telegram)
+    harness = Harness(application, telegram)
+    application.add_error_handler(harness.on_error)
+
+    results = []
+    async with application:
+        await start_background_tasks(application)
+        await application.start()
+        try:
+            # Let the first replica sync finish so scenarios start from a warm state
+            await asyncio.get_running_loop().run_in_executor(None, sheets.sheets_client.sync_replica)
+            for name in args.scenarios:
+                results.append(await run_scenario(name, harness, backend, args))
+        finally:
+            await application.stop()
+            await post_shutdown(application)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scenarios', type=lambda value: value.split(','), default=list(SCENARIOS))
+    parser.add_argument('--users', type=int, default=200, help='journeys per scenario')
+    parser.add_argument('--concurrency', type=int, default=50, help='journeys in flight at once')
+    parser.add_argument('--pages', type=int, default=5, help='events paged through in the events journey')
+    parser.add_argument('--sheets-latency', type=float, default=0.1, help='seconds per Sheets request')
+    parser.add_argument('--sheets-quota', type=int, default=0, help='Sheets requests per minute, 0 = unlimited')
+    parser.add_argument('--sheets-error-rate', type=float, default=0.0, help='fraction of Sheets requests failing')
+    parser.add_argument('--client-quota', type=int, default=60,
+                        help="the bot's own Sheets read and write budgets per minute, 0 = unlimited")
+    parser.add_argument('--telegram-latency', type=float, default=0.03, help='seconds per Bot API request')
+    parser.add_argument('--seed-users', type=int, default=300)
+    parser.add_argument('--seed-registrations', type=int, default=1000)
+    parser.add_argument('--events', type=int, default=30)
+    parser.add_argument('--broadcast-rate', type=float, default=200, help='broadcast messages per second')
+    parser.add_argument('--broadcast-timeout', type=float, default=120)
+    parser.add_argument('--no-replica', action='store_true', help='read from the sheet instead of the SQLite replica')
+    parser.add_argument('--log-level', default='ERROR')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    json_path = os.path.abspath(args.json) if args.json else None
+    with tempfile.TemporaryDirectory(prefix='bot-load-test-') as workdir:
+        configure_environment(args, workdir)
+        results = asyncio.run(run(args))
+        os.chdir(BENCHMARKS_DIR)
+
+    print_report(results, args)
+    if json_path:
+        with open(json_path, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,26 +1,125 @@
 #!/usr/bin/env python3
+import asyncio
 import logging
 import os
+from typing import Optional
 from telegram.ext import (
     Application, CommandHandler, CallbackQueryHandler,
     MessageHandler, filters, ContextTypes
 )
 from telegram import Update
+from telegram.request import BaseRequest
 
 # Import configuration
-from config import BOT_TOKEN, BOT_MODE, WEBHOOK_URL, PORT, logger
+from config import (
+    BOT_TOKEN, BOT_MODE, WEBHOOK_URL, PORT, WEBHOOK_SECRET, WEBHOOK_MAX_CONNECTIONS,
+    UPDATE_CONCURRENCY, HEALTH_PORT, METRICS_LOG_INTERVAL, WORKERS, log_handler, logger
+)
 
 # Import handlers
-from handlers import start_command, button_callback, handle_yoga_registration, handle_admin_input
+from handlers import start_command, button_callback, handle_text_message
+from handlers.admin import resume_broadcasts
+from handlers.screens import prerender
+from sheets import async_sheets_client, sheets_client
+from sheets_scheduler import scheduler as sheets_scheduler
+from update_processor import PerUserUpdateProcessor
+from health import HealthServer
+import metrics
+from utils.helpers import prewarm_calendar
 
 async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Log errors caused by Updates."""
-    logger.error(f"Update {update} caused error {context.error}")
+    # Only the update id is logged; formatting the whole Update is slow and leaks user data into the log
+    update_id = update.update_id if isinstance(update, Update) else None
+    logger.error(f"Error while handling update {update_id}", exc_info=context.error)
 
-def main() -> None:
-    """Start the bot."""
-    # Create the Application
-    application = Application.builder().token(BOT_TOKEN).build()
+def build_health_server(application: Application, port: int = HEALTH_PORT) -> HealthServer:
+    """Liveness and readiness probes for the process supervisor or load balancer, and /metrics"""
+    server = HealthServer("0.0.0.0", port)
+    
+    def healthz():
+        return 200, {"status": "ok"}
+    
+    def readyz():
+        processor = application.update_processor
+        body = {
+            "running": application.running,
+            "sheets": sheets_client.ready(),
+            "sheets_warmed_up": sheets_client.warmed_up,
+            "sheets_circuit": sheets_scheduler.breaker.state,
+            "sheets_quota": sheets_scheduler.headroom(),
+            "pending_updates": application.update_queue.qsize(),
+            "in_flight": processor.in_flight,
+            "active_users": processor.queued_users,
+            "log_dropped": log_handler.dropped,
+        }
+        ready = body["running"] and body["sheets"] and body["sheets_warmed_up"]
+        return (200 if ready else 503), body
+    
+    server.route("/healthz", healthz)
+    server.route("/readyz", readyz)
+    server.route("/metrics", lambda: (200, metrics.render()))
+    return server
+
+async def start_background_tasks(application: Application, leader: bool = True) -> None:
+    """Warm in-memory caches and start background tasks
+
+    Nothing here waits for Google Sheets: checking the spreadsheet and loading
+    the language cache run as a task once updates are already being handled,
+    retried until they succeed; /readyz reports not ready until then.
+    Only the leader (the single process, or worker 0) creates missing
+    worksheets and syncs the shared replica; every worker resumes broadcasts
+    whose sender died, which the journal lock keeps to one taker each.
+    """
+    prewarm_calendar()
+    prerender()
+    tasks = [
+        asyncio.create_task(async_sheets_client.warm_up(create_worksheets=leader)),
+        asyncio.create_task(async_sheets_client.run_cache_refresher()),
+        asyncio.create_task(async_sheets_client.run_write_queue()),
+        asyncio.create_task(resume_broadcasts(application.bot)),
+    ]
+    if METRICS_LOG_INTERVAL:
+        tasks.append(asyncio.create_task(metrics.run_summary_logger(METRICS_LOG_INTERVAL)))
+    if leader:
+        tasks.append(asyncio.create_task(async_sheets_client.run_replica_sync()))
+    application.bot_data['background_tasks'] = tasks
+
+async def post_init(application: Application) -> None:
+    """Start background tasks once the Application is initialized"""
+    if HEALTH_PORT:
+        health_server = build_health_server(application)
+        await health_server.start()
+        application.bot_data['health_server'] = health_server
+    await start_background_tasks(application)
+
+async def post_shutdown(application: Application) -> None:
+    """Release resources held outside the Application"""
+    for task in application.bot_data.pop('background_tasks', []):
+        task.cancel()
+    health_server = application.bot_data.pop('health_server', None)
+    if health_server is not None:
+        await health_server.stop()
+    await async_sheets_client.close()
+
+def build_application(receive_updates: bool = True, request: Optional[BaseRequest] = None) -> Application:
+    """Create the Application with all handlers
+
+    Workers of the multi-process mode get updates from the supervisor, so
+    they are built without an Updater and start their tasks themselves.
+    `request` replaces the HTTP client used for Bot API calls (the load test uses a fake).
+    """
+    builder = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .request(request or metrics.InstrumentedRequest(connection_pool_size=256))
+        .concurrent_updates(PerUserUpdateProcessor(UPDATE_CONCURRENCY))
+    )
+    if receive_updates:
+        builder = builder.post_init(post_init).post_shutdown(post_shutdown)
+    else:
+        builder = builder.updater(None)
+    application = builder.build()
 
     # Add command handlers
     application.add_handler(CommandHandler("start", start_command))
@@ -28,16 +127,16 @@ def main() -> None:
     # Add callback query handler
     application.add_handler(CallbackQueryHandler(button_callback))
 
-    # Add message handler for registration process
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_yoga_registration))
-
-    # Add admin message handler (same handler as registration but will check admin state)
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_admin_input))
+    # Add a single text handler; it routes to the registration or admin flow by conversation state
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text_message))
 
     # Add error handler
     application.add_error_handler(error_handler)
 
-    # Start the Bot
+    return application
+
+def run(application: Application) -> None:
+    """Receive updates by webhook or long polling until stopped"""
     if BOT_MODE.lower() == 'webhook' and WEBHOOK_URL:
         # Start webhook mode
         logger.info(f"Starting bot in webhook mode on port {PORT}")
@@ -45,12 +144,23 @@ def main() -> None:
             listen="0.0.0.0",
             port=int(PORT),
             url_path=BOT_TOKEN,
-            webhook_url=f"{WEBHOOK_URL}/{BOT_TOKEN}"
+            webhook_url=f"{WEBHOOK_URL}/{BOT_TOKEN}",
+            secret_token=WEBHOOK_SECRET or None,
+            max_connections=WEBHOOK_MAX_CONNECTIONS
         )
     else:
         # Start polling mode
         logger.info("Starting bot in polling mode")
         application.run_polling(drop_pending_updates=True)
 
+def main() -> None:
+    """Start the bot."""
+    if WORKERS > 1:
+        from supervisor import run_supervisor
+        run_supervisor(WORKERS)
+        return
+
+    run(build_application())
+
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
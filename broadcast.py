@@ -0,0 +1,230 @@
+import os
+import json
+import uuid
+import fcntl
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+from telegram import Bot
+from telegram.error import RetryAfter, Forbidden, BadRequest, TimedOut, NetworkError
+
+from config import WORKER_INDEX, BROADCAST_DIR, BROADCAST_RATE, BROADCAST_CONCURRENCY, BROADCAST_PROGRESS_INTERVAL
+from utils.rate_limit import AsyncTokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Attempts per recipient for transient network errors
+MAX_SEND_ATTEMPTS = 3
+
+# Called with (sent, failed, total, finished)
+ProgressCallback = Callable[[int, int, int, bool], Awaitable[None]]
+
+
+class BroadcastJournal:
+    """Append-only per-recipient log that lets an interrupted broadcast resume
+
+    The first line is a JSON header (text, admin chat, recipients, and the
+    worker and pid that started it); every following line is
+    "<user_id> <sent|failed>", or "owner <worker> <pid>" when another process
+    took the broadcast over.
+
+    The sending process holds an exclusive flock on the file until the
+    broadcast completes or stops. The kernel drops it when the process dies,
+    so a journal whose lock can be taken has no live owner and is safe to
+    resume, whichever worker restarted.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.broadcast_id = os.path.splitext(os.path.basename(path))[0]
+        self.header: Dict = {}
+        self.status: Dict[int, str] = {}
+        # (worker index, pid) of the process that last sent this broadcast
+        self.owner: Optional[Tuple[int, int]] = None
+        self._file = None
+
+    @classmethod
+    def create(cls, text: str, admin_chat_id: int, recipients: List[int]) -> 'BroadcastJournal':
+        os.makedirs(BROADCAST_DIR, exist_ok=True)
+        journal = cls(os.path.join(BROADCAST_DIR, f"{uuid.uuid4().hex}.log"))
+        journal.owner = (WORKER_INDEX, os.getpid())
+        journal.header = {'text': text, 'admin_chat_id': admin_chat_id, 'recipients': recipients,
+                          'worker': WORKER_INDEX, 'pid': os.getpid()}
+        journal._file = open(journal.path, 'w', encoding='utf-8')
+        # Locked before the header is written, so no resume can see it unowned
+        fcntl.flock(journal._file, fcntl.LOCK_EX)
+        journal._file.write(json.dumps(journal.header, ensure_ascii=False) + "\n")
+        journal._file.flush()
+        return journal
+
+    @classmethod
+    def load(cls, path: str) -> 'BroadcastJournal':
+        journal = cls(path)
+        with open(path, encoding='utf-8') as f:
+            journal.header = json.loads(f.readline())
+            if 'pid' in journal.header:
+                journal.owner = (journal.header['worker'], journal.header['pid'])
+            for line in f:
+                parts = line.split()
+                # A torn last line from a crash is simply retried
+                if len(parts) == 2 and parts[0].lstrip('-').isdigit():
+                    journal.status[int(parts[0])] = parts[1]
+                elif len(parts) == 3 and parts[0] == 'owner' and parts[2].isdigit():
+                    journal.owner = (int(parts[1]), int(parts[2]))
+        return journal
+
+    @classmethod
+    def claim(cls, path: str) -> Optional['BroadcastJournal']:
+        """Lock and load an unfinished journal; None while its owner is still sending it"""
+        f = open(path, 'a', encoding='utf-8')
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            f.close()
+            return None
+        try:
+            # Completed (renamed to .done) between listing and locking
+            if not os.path.exists(path):
+                f.close()
+                return None
+            # Loaded under the lock, so every recipient the last owner recorded is seen
+            journal = cls.load(path)
+        except BaseException:
+            f.close()
+            raise
+        previous = journal.owner
+        journal._file = f
+        journal.owner = (WORKER_INDEX, os.getpid())
+        f.write(f"owner {WORKER_INDEX} {os.getpid()}\n")
+        f.flush()
+        if previous is not None:
+            logger.info(f"Taking over broadcast {journal.broadcast_id} from worker {previous[0]} (pid {previous[1]})")
+        return journal
+
+    @property
+    def pending(self) -> List[int]:
+        return [user_id for user_id in self.header['recipients'] if user_id not in self.status]
+
+    def record(self, user_id: int, status: str) -> None:
+        if self._file is None:
+            self._file = open(self.path, 'a', encoding='utf-8')
+        self.status[user_id] = status
+        self._file.write(f"{user_id} {status}\n")
+        self._file.flush()
+
+    def complete(self) -> None:
+        """Mark the broadcast finished so it is not resumed on the next start"""
+        # Renamed before the lock is released, so nobody can claim it in between
+        os.replace(self.path, f"{os.path.splitext(self.path)[0]}.done")
+        self.close()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def counts(self) -> Dict[str, int]:
+        sent = sum(1 for status in self.status.values() if status == 'sent')
+        return {'sent': sent, 'failed': len(self.status) - sent}
+
+
+class BroadcastEngine:
+    """Sends one message to many chats with a bounded worker pool and a global rate limit"""
+
+    def __init__(self, bot: Bot, rate: float = BROADCAST_RATE, concurrency: int = BROADCAST_CONCURRENCY,
+                 progress_interval: float = BROADCAST_PROGRESS_INTERVAL):
+        self.bot = bot
+        self.limiter = AsyncTokenBucket(rate)
+        self.concurrency = concurrency
+        self.progress_interval = progress_interval
+
+    async def run(self, journal: BroadcastJournal, on_progress: Optional[ProgressCallback] = None) -> Dict[str, int]:
+        """Deliver the journal's message to every recipient not yet recorded"""
+        text = journal.header['text']
+        total = len(journal.header['recipients'])
+        queue: asyncio.Queue = asyncio.Queue()
+        for user_id in journal.pending:
+            queue.put_nowait(user_id)
+
+        async def worker() -> None:
+            while True:
+                try:
+                    user_id = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                journal.record(user_id, await self._send(user_id, text))
+
+        async def report(finished: bool) -> None:
+            if on_progress is None:
+                return
+            counts = journal.counts()
+            try:
+                await on_progress(counts['sent'], counts['failed'], total, finished)
+            except Exception as e:
+                logger.warning(f"Failed to update broadcast progress: {e}")
+
+        workers = [asyncio.create_task(worker()) for _ in range(min(self.concurrency, queue.qsize()) or 1)]
+        try:
+            # Progress is reported on a timer, not per message, to stay clear of per-chat limits
+            while not all(task.done() for task in workers):
+                done, _ = await asyncio.wait(workers, timeout=self.progress_interval)
+                if len(done) < len(workers):
+                    await report(False)
+            for task in workers:
+                task.result()
+        finally:
+            for task in workers:
+                task.cancel()
+            journal.close()
+
+        journal.complete()
+        await report(True)
+        return journal.counts()
+
+    async def _send(self, user_id: int, text: str) -> str:
+        attempts = 0
+        while True:
+            await self.limiter.acquire()
+            try:
+                await self.bot.send_message(chat_id=user_id, text=text, parse_mode='Markdown')
+                return 'sent'
+            except RetryAfter as e:
+                # Flood-wait applies to the whole bot: stop every worker, then retry this recipient
+                logger.warning(f"Broadcast flood-wait, pausing for {e.retry_after} s")
+                self.limiter.pause(float(e.retry_after))
+            except (Forbidden, BadRequest) as e:
+                logger.info(f"Broadcast to {user_id} rejected: {e}")
+                return 'failed'
+            except (TimedOut, NetworkError) as e:
+                attempts += 1
+                if attempts >= MAX_SEND_ATTEMPTS:
+                    logger.error(f"Failed to send broadcast to user {user_id}: {e}")
+                    return 'failed'
+                await asyncio.sleep(attempts)
+            except Exception as e:
+                logger.error(f"Failed to send broadcast to user {user_id}: {e}")
+                return 'failed'
+
+
+def unfinished_journals() -> Iterator[BroadcastJournal]:
+    """Claimed journals of broadcasts whose sender stopped before completing
+
+    Each journal is claimed only when the caller asks for it, so broadcasts
+    waiting their turn stay claimable by other workers meanwhile. Journals
+    a live process is still sending are skipped.
+    """
+    if not os.path.isdir(BROADCAST_DIR):
+        return
+    for name in sorted(os.listdir(BROADCAST_DIR)):
+        if not name.endswith('.log'):
+            continue
+        try:
+            journal = BroadcastJournal.claim(os.path.join(BROADCAST_DIR, name))
+        except FileNotFoundError:
+            continue
+        except (OSError, ValueError) as e:
+            logger.error(f"Skipping unreadable broadcast journal {name}: {e}")
+            continue
+        if journal is not None:
+            yield journal
@@ -1,6 +1,7 @@
 import os
 import logging
 from dotenv import load_dotenv
+from utils.log_pipeline import setup_logging
 
 # Завантаження змінних середовища
 load_dotenv()
@@ -11,13 +12,29 @@ numeric_level = getattr(logging, LOG_LEVEL.upper(), None)
 
 os.makedirs('logs', exist_ok=True)
 
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=numeric_level,
-    handlers=[
-        logging.FileHandler("logs/bot.log"),
-        logging.StreamHandler()
-    ]
+# Каталог для локальних даних бота
+DATA_DIR = os.getenv('DATA_DIR', 'data')
+os.makedirs(DATA_DIR, exist_ok=True)
+
+# Лог-файл (JSON-рядки) з ротацією за розміром; кожен процес-обробник пише у свій файл
+_worker_index = os.getenv('WORKER_INDEX')
+LOG_FILE = os.getenv('LOG_FILE', 'logs/bot.log' if _worker_index is None else f'logs/bot.worker{_worker_index}.log')
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', '5'))
+# Записи пишуться у фоновому потоці пачками: розмір пачки, інтервал (секунди), розмір черги
+LOG_BATCH_SIZE = int(os.getenv('LOG_BATCH_SIZE', '256'))
+LOG_FLUSH_INTERVAL = float(os.getenv('LOG_FLUSH_INTERVAL', '1'))
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+
+log_handler = setup_logging(
+    level=numeric_level or logging.INFO,
+    log_file=LOG_FILE,
+    max_bytes=LOG_MAX_BYTES,
+    backup_count=LOG_BACKUP_COUNT,
+    batch_size=LOG_BATCH_SIZE,
+    flush_interval=LOG_FLUSH_INTERVAL,
+    queue_size=LOG_QUEUE_SIZE,
+    static_fields=None if _worker_index is None else {'worker': int(_worker_index)},
 )
 logger = logging.getLogger(__name__)
 
@@ -41,6 +58,74 @@ if admin_ids_str:
 SPREADSHEET_ID = os.getenv('SPREADSHEET_ID')
 CREDENTIALS_FILE = os.getenv('CREDENTIALS_FILE', 'credentials.json')
 
+# Кеш мов користувачів (максимальна кількість записів у пам'яті)
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', '50000'))
+
+# Кількість потоків для запитів до Google Sheets
+SHEETS_MAX_WORKERS = int(os.getenv('SHEETS_MAX_WORKERS', '8'))
+
+# Квота Google Sheets API (запитів на хвилину на читання і на запис, 0 - без обмеження)
+# і скільки секунд запит може чекати на квоту. Квота спільна для всіх WORKERS процесів,
+# кожен отримує свою рівну частку
+SHEETS_READ_QUOTA = int(os.getenv('SHEETS_READ_QUOTA', '60'))
+SHEETS_WRITE_QUOTA = int(os.getenv('SHEETS_WRITE_QUOTA', '60'))
+SHEETS_QUOTA_WAIT = float(os.getenv('SHEETS_QUOTA_WAIT', '10'))
+# Повтори запитів після 429/5xx: кількість і межі експоненційної затримки (секунди)
+SHEETS_MAX_RETRIES = int(os.getenv('SHEETS_MAX_RETRIES', '4'))
+SHEETS_BACKOFF_BASE = float(os.getenv('SHEETS_BACKOFF_BASE', '1'))
+SHEETS_BACKOFF_MAX = float(os.getenv('SHEETS_BACKOFF_MAX', '32'))
+# Після скількох невдалих запитів поспіль Sheets вважається недоступним і на скільки секунд
+SHEETS_BREAKER_THRESHOLD = int(os.getenv('SHEETS_BREAKER_THRESHOLD', '5'))
+SHEETS_BREAKER_COOLDOWN = float(os.getenv('SHEETS_BREAKER_COOLDOWN', '60'))
+
+# Кількість процесів-обробників (1 - один процес без супервізора).
+# WORKER_INDEX супервізор задає кожному обробнику сам
+WORKERS = int(os.getenv('WORKERS', '1'))
+WORKER_INDEX = int(os.getenv('WORKER_INDEX', '0'))
+
+# Кешування подій і розкладу (секунди)
+SHEETS_CACHE_TTL = int(os.getenv('SHEETS_CACHE_TTL', '300'))
+SHEETS_CACHE_REFRESH_INTERVAL = int(os.getenv('SHEETS_CACHE_REFRESH_INTERVAL', '240'))
+
+# Пакетний запис у Google Sheets
+SHEETS_FLUSH_INTERVAL = float(os.getenv('SHEETS_FLUSH_INTERVAL', '5'))
+SHEETS_FLUSH_BATCH_SIZE = int(os.getenv('SHEETS_FLUSH_BATCH_SIZE', '50'))
+PENDING_WRITES_FILE = os.path.join(
+    DATA_DIR, 'pending_writes.json' if WORKER_INDEX == 0 else f'pending_writes.{WORKER_INDEX}.json'
+)
+
+# Розсилка: повідомлень на секунду (ліміт Telegram - 30), паралельних відправок, інтервал оновлення прогресу
+BROADCAST_RATE = float(os.getenv('BROADCAST_RATE', '25'))
+BROADCAST_CONCURRENCY = int(os.getenv('BROADCAST_CONCURRENCY', '10'))
+BROADCAST_PROGRESS_INTERVAL = float(os.getenv('BROADCAST_PROGRESS_INTERVAL', '5'))
+BROADCAST_DIR = os.path.join(DATA_DIR, 'broadcasts')
+
+# Стан діалогів: 'memory' або 'sqlite' (зберігається між перезапусками)
+STATE_BACKEND = os.getenv('STATE_BACKEND', 'sqlite').lower()
+STATE_DB_PATH = os.getenv('STATE_DB_PATH', os.path.join(DATA_DIR, 'state.db'))
+STATE_TTL = int(os.getenv('STATE_TTL', '21600'))
+STATE_MAX_ENTRIES = int(os.getenv('STATE_MAX_ENTRIES', '10000'))
+
+# Локальна SQLite-копія таблиці для читання
+REPLICA_ENABLED = os.getenv('REPLICA_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+REPLICA_DB_PATH = os.getenv('REPLICA_DB_PATH', os.path.join(DATA_DIR, 'replica.db'))
+REPLICA_SYNC_INTERVAL = int(os.getenv('REPLICA_SYNC_INTERVAL', '60'))
+REPLICA_FULL_SYNC_EVERY = int(os.getenv('REPLICA_FULL_SYNC_EVERY', '10'))
+
+# Кеш структури таблиці (id аркушів і заголовки): перезапуск підключається без запитів до Google Sheets
+SHEETS_SCHEMA_CACHE = os.getenv('SHEETS_SCHEMA_CACHE', os.path.join(DATA_DIR, 'sheets_schema.json'))
+
+# Кількість реєстрацій на сторінці адмін-панелі
+REGISTRATIONS_PAGE_SIZE = int(os.getenv('REGISTRATIONS_PAGE_SIZE', '10'))
+
+# Експорт реєстрацій: каталог тимчасових файлів і кількість рядків, що читаються за раз
+EXPORT_DIR = os.path.join(DATA_DIR, 'exports')
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', '1000'))
+
+# Кеш клавіатур календаря: розмір і кількість місяців, що будуються при старті (0 - не будувати)
+CALENDAR_CACHE_SIZE = int(os.getenv('CALENDAR_CACHE_SIZE', '64'))
+CALENDAR_PREWARM_MONTHS = int(os.getenv('CALENDAR_PREWARM_MONTHS', '3'))
+
 # Перевірка наявності credentials.json
 if not os.path.exists(CREDENTIALS_FILE):
     logger.warning(f"Файл {CREDENTIALS_FILE} не знайдено! Google Sheets функціонал буде недоступний.")
@@ -49,7 +134,22 @@ if not os.path.exists(CREDENTIALS_FILE):
 BOT_MODE = os.getenv('BOT_MODE', 'polling').lower()
 WEBHOOK_URL = os.getenv('WEBHOOK_URL', '')
 PORT = int(os.getenv('PORT', '8443'))
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')
+# Скільки одночасних з'єднань Telegram може відкрити до вебхука (1-100)
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv('WEBHOOK_MAX_CONNECTIONS', '40'))
+
+# Скільки оновлень обробляється одночасно (оновлення одного користувача - завжди по черзі)
+UPDATE_CONCURRENCY = int(os.getenv('UPDATE_CONCURRENCY', '64'))
+
+# Порт для /healthz і /readyz (0 - вимкнено)
+HEALTH_PORT = int(os.getenv('HEALTH_PORT', '8081'))
+
+# Як часто писати в лог зведення затримок і викликів Sheets по обробниках (секунди, 0 - вимкнено)
+METRICS_LOG_INTERVAL = int(os.getenv('METRICS_LOG_INTERVAL', '300'))
 
 # Підтримувані мови
 LANGUAGES = ['uk', 'en', 'de']
-DEFAULT_LANGUAGE = 'uk'
\ No newline at end of file
+DEFAULT_LANGUAGE = 'uk'
+
+# Каталоги перекладів <мова>.json
+LOCALES_DIR = os.getenv('LOCALES_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'locales'))
\ No newline at end of file
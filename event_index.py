@@ -0,0 +1,82 @@
+import logging
+from bisect import bisect_left
+from datetime import date
+from typing import Any, Dict, List, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class EventPage(NamedTuple):
+    """One event of the upcoming list with the ids of its neighbours (None at either end)"""
+    event: Dict[str, Any]
+    prev_id: Optional[str]
+    next_id: Optional[str]
+    position: int
+    total: int
+
+
+class EventIndex:
+    """Immutable view of the events sheet, sorted by parsed date
+
+    Built once per snapshot refresh. Upcoming events are a bisect away,
+    events are looked up by id in O(1), and pages are addressed by event
+    id so a cursor stays valid when events are added or days roll over.
+    """
+
+    def __init__(self, records: List[Dict[str, Any]]):
+        dated = []
+        for record in records:
+            try:
+                event_date = date.fromisoformat(str(record.get('date', '')).strip())
+            except ValueError:
+                logger.debug(f"Skipping event {record.get('id')} with invalid date {record.get('date')!r}")
+                continue
+            dated.append((event_date.toordinal(), str(record.get('time', '')), str(record.get('id', '')), record))
+        dated.sort(key=lambda item: item[:3])
+
+        self._ordinals = [item[0] for item in dated]
+        self._events = [item[3] for item in dated]
+        # event id -> position in the sorted list
+        self._positions = {item[2]: position for position, item in enumerate(dated) if item[2]}
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    def _first_upcoming(self, today: Optional[date] = None) -> int:
+        return bisect_left(self._ordinals, (today or date.today()).toordinal())
+
+    def upcoming(self, today: Optional[date] = None) -> List[Dict[str, Any]]:
+        """Events dated today or later, soonest first"""
+        return self._events[self._first_upcoming(today):]
+
+    def between(self, start: date, end: date) -> List[Dict[str, Any]]:
+        """Events with start <= date <= end"""
+        return self._events[bisect_left(self._ordinals, start.toordinal()):
+                            bisect_left(self._ordinals, end.toordinal() + 1)]
+
+    def get(self, event_id: Any) -> Optional[Dict[str, Any]]:
+        position = self._positions.get(str(event_id))
+        return None if position is None else self._events[position]
+
+    def page(self, event_id: Any = None, today: Optional[date] = None) -> Optional[EventPage]:
+        """Page of an upcoming event, or of the first upcoming event when event_id is None
+
+        Returns None if there are no upcoming events or the event is unknown or past.
+        """
+        first = self._first_upcoming(today)
+        position = first if event_id is None else self._positions.get(str(event_id))
+        if position is None or not first <= position < len(self._events):
+            return None
+
+        def event_id_at(index: int) -> Optional[str]:
+            if first <= index < len(self._events):
+                return str(self._events[index].get('id', ''))
+            return None
+
+        return EventPage(
+            event=self._events[position],
+            prev_id=event_id_at(position - 1),
+            next_id=event_id_at(position + 1),
+            position=position - first,
+            total=len(self._events) - first,
+        )
@@ -0,0 +1,78 @@
+import os
+import csv
+import uuid
+import logging
+from typing import Any, Dict, Iterable, List, Tuple
+
+from config import EXPORT_DIR
+
+try:
+    from openpyxl import Workbook
+except ImportError:  # pinned in requirements.txt; without it only CSV is offered
+    Workbook = None
+
+logger = logging.getLogger(__name__)
+
+XLSX_AVAILABLE = Workbook is not None
+if not XLSX_AVAILABLE:
+    logger.warning("openpyxl is not installed: XLSX export is unavailable, only CSV will be offered")
+
+FORMATS = ('csv', 'xlsx') if XLSX_AVAILABLE else ('csv',)
+
+# Leading characters that make Excel/LibreOffice/Sheets treat a cell as a formula
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def safe_cell(value: Any) -> Any:
+    """Quote user-supplied text that a spreadsheet would otherwise evaluate as a formula"""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def write_csv(rows: Iterable[Dict[str, Any]], columns: List[str], path: str) -> int:
+    """Write rows to a CSV file one at a time; returns the number of rows written"""
+    count = 0
+    # utf-8-sig so Excel detects the encoding of Cyrillic names
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow([safe_cell(row.get(column, '')) for column in columns])
+            count += 1
+    return count
+
+
+def write_xlsx(rows: Iterable[Dict[str, Any]], columns: List[str], path: str) -> int:
+    """Write rows to an XLSX file with openpyxl's streaming write-only mode"""
+    if Workbook is None:
+        raise RuntimeError("XLSX export is unavailable: openpyxl is not installed")
+    count = 0
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('registrations')
+    sheet.append(columns)
+    for row in rows:
+        sheet.append([safe_cell(row.get(column, '')) for column in columns])
+        count += 1
+    workbook.save(path)
+    return count
+
+
+WRITERS = {'csv': write_csv, 'xlsx': write_xlsx}
+
+
+def export_rows(rows: Iterable[Dict[str, Any]], columns: List[str], fmt: str) -> Tuple[str, int]:
+    """Stream rows into a new file under EXPORT_DIR; returns (path, row count)
+
+    The caller owns the file and should delete it once it has been sent.
+    """
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    path = os.path.join(EXPORT_DIR, f"{uuid.uuid4().hex}.{fmt}")
+    try:
+        count = WRITERS[fmt](rows, columns, path)
+    except Exception:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    logger.info(f"Exported {count} rows to {path}")
+    return path, count
@@ -1,24 +1,35 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import CallbackContext
 import logging
+import os
 from typing import Dict, Any, List
-from datetime import datetime
+from datetime import date, datetime, timedelta
 
 from utils.localization import get_text
-from sheets import SheetsClient
+from sheets import async_sheets_client as sheets_client
+from broadcast import BroadcastEngine, BroadcastJournal, unfinished_journals
+from export import FORMATS as EXPORT_FORMATS, XLSX_AVAILABLE
+from utils.state_store import create_state_store
 from config import ADMIN_USER_IDS
 
 logger = logging.getLogger(__name__)
-sheets_client = SheetsClient()
 
 # Admin state
-admin_state: Dict[int, Dict[str, Any]] = {}
+admin_state = create_state_store('admin')
+
+# Class date ranges offered by the export menu
+EXPORT_RANGES = {
+    "all": "All dates",
+    "upcoming": "Upcoming",
+    "last30": "Last 30 days",
+    "custom": "Custom range",
+}
 
 async def is_admin(update: Update) -> bool:
     """Check if user is admin"""
     user_id = update.effective_user.id
     if user_id not in ADMIN_USER_IDS:
-        user_lang = sheets_client.get_user_language(user_id)
+        user_lang = await sheets_client.get_user_language(user_id)
         if update.callback_query:
             await update.callback_query.answer(get_text("admin_only", user_lang))
         else:
@@ -33,12 +44,13 @@ async def admin_panel(update: Update, context: CallbackContext) -> None:
     
     query = update.callback_query
     user_id = update.effective_user.id
-    user_lang = sheets_client.get_user_language(user_id)
+    user_lang = await sheets_client.get_user_language(user_id)
     
     keyboard = [
         [InlineKeyboardButton(get_text("view_registrations", user_lang), callback_data="admin_registrations")],
         [InlineKeyboardButton(get_text("add_event", user_lang), callback_data="admin_add_event")],
         [InlineKeyboardButton(get_text("send_broadcast", user_lang), callback_data="admin_broadcast")],
+        [InlineKeyboardButton("🔄 Refresh data", callback_data="admin_refresh_cache")],
         [InlineKeyboardButton(get_text("back", user_lang), callback_data="back_to_main")]
     ]
     
@@ -50,31 +62,44 @@ async def admin_panel(update: Update, context: CallbackContext) -> None:
     )
 
 async def admin_view_registrations(update: Update, context: CallbackContext) -> None:
-    """Show yoga registrations"""
+    """Show the newest yoga registrations without filters"""
     if not await is_admin(update):
         return
     
-    query = update.callback_query
     user_id = update.effective_user.id
-    user_lang = sheets_client.get_user_language(user_id)
+    admin_state.update(user_id, registration_filters={})
+    await show_registrations(update, user_id)
+
+async def admin_registrations_filtered(update: Update, context: CallbackContext) -> None:
+    """Show the newest yoga registrations matching the current filters"""
+    if not await is_admin(update):
+        return
     
-    # Show loading message
-    await query.edit_message_text(
-        text=get_text("loading", user_lang)
-    )
+    await show_registrations(update, update.effective_user.id)
+
+async def admin_registrations_page(update: Update, context: CallbackContext, direction: str, cursor: str) -> None:
+    """Show the registrations older or newer than the cursor registration"""
+    if not await is_admin(update):
+        return
     
-    # Get registrations from Google Sheets
-    registrations = sheets_client.get_all_registrations()
+    await show_registrations(update, update.effective_user.id, cursor, newer=direction == "newer")
+
+async def show_registrations(update: Update, user_id: int, cursor: str = None, newer: bool = False) -> None:
+    """Render one page of registrations; only that page is read from the replica"""
+    query = update.callback_query
+    user_lang = await sheets_client.get_user_language(user_id)
+    filters = (admin_state.get(user_id) or {}).get("registration_filters", {})
     
-    if not registrations:
+    page = await sheets_client.get_registrations_page(
+        cursor, newer, date=filters.get("date", ""), class_type=filters.get("class_type", "")
+    )
+    
+    if not page.rows:
         message_text = "No registrations found."
     else:
-        # Limit to 10 most recent registrations to avoid message length limits
-        recent_registrations = registrations[:10]
-        
-        message_text = "*Most Recent Yoga Registrations:*\n\n"
+        message_text = "*Yoga Registrations:*\n\n"
         
-        for reg in recent_registrations:
+        for reg in page.rows:
             message_text += f"*ID:* {reg.get('id', 'N/A')}\n"
             message_text += f"*Name:* {reg.get('name', 'N/A')}\n"
             message_text += f"*Email:* {reg.get('email', 'N/A')}\n"
@@ -88,18 +113,195 @@ async def admin_view_registrations(update: Update, context: CallbackContext) ->
             message_text += f"*Registered:* {reg.get('registered_at', 'N/A')}\n"
             message_text += "\n---\n\n"
         
-        if len(registrations) > 10:
-            message_text += f"\n_Showing 10 of {len(registrations)} registrations._"
-    
-    keyboard = [[InlineKeyboardButton(get_text("back", user_lang), callback_data="admin")]]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+        message_text += f"\n_Showing {len(page.rows)} of {page.total} registrations._"
+    
+    if filters:
+        applied = ", ".join(f"{name}: {value}" for name, value in filters.items())
+        message_text += f"\n_Filter: {applied}_"
+    
+    keyboard = []
+    nav_row = []
+    if page.has_prev:
+        nav_row.append(InlineKeyboardButton("⏪ Newer", callback_data=f"admin_reg_page_newer_{page.rows[0].get('id')}"))
+    if page.has_next:
+        nav_row.append(InlineKeyboardButton("Older ⏩", callback_data=f"admin_reg_page_older_{page.rows[-1].get('id')}"))
+    if nav_row:
+        keyboard.append(nav_row)
+    keyboard.append([
+        InlineKeyboardButton("🔎 Filter", callback_data="admin_reg_filter"),
+        InlineKeyboardButton("📤 Export", callback_data="admin_export")
+    ])
+    keyboard.append([InlineKeyboardButton(get_text("back", user_lang), callback_data="admin")])
     
     await query.edit_message_text(
         text=message_text,
-        reply_markup=reply_markup,
+        reply_markup=InlineKeyboardMarkup(keyboard),
         parse_mode='Markdown'
     )
 
+async def admin_registrations_filter_menu(update: Update, context: CallbackContext) -> None:
+    """Offer recent class dates and class types to filter registrations by"""
+    if not await is_admin(update):
+        return
+    
+    query = update.callback_query
+    user_id = update.effective_user.id
+    user_lang = await sheets_client.get_user_language(user_id)
+    
+    dates, class_types = await sheets_client.get_registration_filters()
+    # Class names can exceed the 64-byte callback data limit, so buttons carry an index
+    admin_state.update(user_id, registration_classes=class_types)
+    
+    keyboard = []
+    for i in range(0, len(dates), 2):
+        keyboard.append([
+            InlineKeyboardButton(f"📅 {value}", callback_data=f"admin_reg_date_{value}") for value in dates[i:i + 2]
+        ])
+    for index, class_type in enumerate(class_types):
+        keyboard.append([InlineKeyboardButton(f"🧘 {class_type}", callback_data=f"admin_reg_class_{index}")])
+    keyboard.append([InlineKeyboardButton("✖️ Clear filter", callback_data="admin_registrations")])
+    keyboard.append([InlineKeyboardButton(get_text("back", user_lang), callback_data="admin_reg_show")])
+    
+    await query.edit_message_text(
+        text="Filter registrations by class date or type:",
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+
+async def admin_registrations_filter_date(update: Update, context: CallbackContext, value: str) -> None:
+    """Filter registrations by class date"""
+    if not await is_admin(update):
+        return
+    
+    user_id = update.effective_user.id
+    filters = (admin_state.get(user_id) or {}).get("registration_filters", {})
+    admin_state.update(user_id, registration_filters={**filters, "date": value})
+    await show_registrations(update, user_id)
+
+async def admin_registrations_filter_class(update: Update, context: CallbackContext, index: int) -> None:
+    """Filter registrations by class type"""
+    if not await is_admin(update):
+        return
+    
+    user_id = update.effective_user.id
+    state = admin_state.get(user_id) or {}
+    class_types = state.get("registration_classes", [])
+    if 0 <= index < len(class_types):
+        filters = {**state.get("registration_filters", {}), "class_type": class_types[index]}
+        admin_state.update(user_id, registration_filters=filters)
+    await show_registrations(update, user_id)
+
+async def admin_export_menu(update: Update, context: CallbackContext) -> None:
+    """Choose the class date range and file format of a registrations export"""
+    if not await is_admin(update):
+        return
+    
+    query = update.callback_query
+    user_id = update.effective_user.id
+    user_lang = await sheets_client.get_user_language(user_id)
+    class_type = (admin_state.get(user_id) or {}).get("registration_filters", {}).get("class_type", "")
+    
+    keyboard = []
+    for range_key, label in EXPORT_RANGES.items():
+        keyboard.append([
+            InlineKeyboardButton(f"{label} · {fmt.upper()}", callback_data=f"admin_export_{fmt}_{range_key}")
+            for fmt in EXPORT_FORMATS
+        ])
+    keyboard.append([InlineKeyboardButton(get_text("back", user_lang), callback_data="admin_reg_show")])
+    
+    text = "Export registrations by class date:"
+    if class_type:
+        text += f"\nOnly class: {class_type}"
+    if not XLSX_AVAILABLE:
+        text += "\nXLSX is unavailable (openpyxl is not installed), only CSV can be exported."
+    
+    await query.edit_message_text(text=text, reply_markup=InlineKeyboardMarkup(keyboard))
+
+async def admin_export(update: Update, context: CallbackContext, fmt: str, range_key: str) -> None:
+    """Export registrations for a preset range, or ask for a custom one"""
+    if not await is_admin(update):
+        return
+    
+    query = update.callback_query
+    user_id = update.effective_user.id
+    user_lang = await sheets_client.get_user_language(user_id)
+    if range_key not in EXPORT_RANGES:
+        return
+    if fmt not in EXPORT_FORMATS:
+        await query.edit_message_text(
+            text=f"❌ {fmt.upper()} export is unavailable on this server (openpyxl is not installed).",
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton(get_text("back", user_lang), callback_data="admin_export")
+            ]])
+        )
+        return
+    
+    if range_key == "custom":
+        admin_state.update(user_id, step="export_range", export_format=fmt)
+        await query.edit_message_text(
+            text="Please enter the class date range as YYYY-MM-DD YYYY-MM-DD:",
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton(get_text("back", user_lang), callback_data="admin_export")
+            ]])
+        )
+        return
+    
+    today = date.today()
+    date_from, date_to = {
+        "all": ("", ""),
+        "upcoming": (today.isoformat(), ""),
+        "last30": ((today - timedelta(days=30)).isoformat(), today.isoformat()),
+    }[range_key]
+    
+    await query.edit_message_text(text=get_text("loading", user_lang))
+    await send_export(context, query.message.chat_id, user_id, user_lang, fmt, date_from, date_to)
+
+async def send_export(context: CallbackContext, chat_id: int, user_id: int, user_lang: str,
+                      fmt: str, date_from: str, date_to: str) -> None:
+    """Build the export file in a worker thread and send it as a document"""
+    class_type = (admin_state.get(user_id) or {}).get("registration_filters", {}).get("class_type", "")
+    back = InlineKeyboardMarkup([[InlineKeyboardButton(get_text("back", user_lang), callback_data="admin")]])
+    
+    try:
+        path, count = await sheets_client.export_registrations(fmt, date_from, date_to, class_type)
+    except Exception as e:
+        logger.error(f"Error exporting registrations: {e}")
+        await context.bot.send_message(chat_id=chat_id, text=f"❌ Export failed: {e}", reply_markup=back)
+        return
+    
+    try:
+        with open(path, 'rb') as f:
+            await context.bot.send_document(
+                chat_id=chat_id,
+                document=f,
+                filename=f"registrations_{datetime.now().strftime('%Y%m%d_%H%M')}.{fmt}",
+                caption=f"✅ {count} registrations",
+                reply_markup=back
+            )
+    finally:
+        os.remove(path)
+
+async def admin_refresh_cache(update: Update, context: CallbackContext) -> None:
+    """Reload cached events and schedule from Google Sheets"""
+    if not await is_admin(update):
+        return
+    
+    query = update.callback_query
+    user_id = update.effective_user.id
+    user_lang = await sheets_client.get_user_language(user_id)
+    
+    await query.edit_message_text(
+        text=get_text("loading", user_lang)
+    )
+    
+    await sheets_client.refresh_caches()
+    
+    await query.edit_message_text(
+        text="✅ Events and schedule reloaded from Google Sheets.",
+        reply_markup=InlineKeyboardMarkup([[
+            InlineKeyboardButton(get_text("back", user_lang), callback_data="admin")
+        ]])
+    )
+
 async def admin_add_event_start(update: Update, context: CallbackContext) -> None:
     """Start process to add a new event"""
     if not await is_admin(update):
@@ -107,7 +309,7 @@ async def admin_add_event_start(update: Update, context: CallbackContext) -> Non
     
     query = update.callback_query
     user_id = update.effective_user.id
-    user_lang = sheets_client.get_user_language(user_id)
+    user_lang = await sheets_client.get_user_language(user_id)
     
     # Initialize admin state
     admin_state[user_id] = {"step": "title_uk"}
@@ -126,79 +328,80 @@ async def handle_admin_input(update: Update, context: CallbackContext) -> None:
     if user_id not in ADMIN_USER_IDS:
         return
     
-    if user_id not in admin_state:
+    state = admin_state.get(user_id)
+    if state is None:
         return
     
-    user_lang = sheets_client.get_user_language(user_id)
-    current_step = admin_state[user_id].get("step", "")
+    user_lang = await sheets_client.get_user_language(user_id)
+    current_step = state.get("step", "")
     
     # Handle event creation steps
     if current_step.startswith("title_"):
         language = current_step.split("_")[1]
-        admin_state[user_id][f"title_{language}"] = update.message.text
+        state[f"title_{language}"] = update.message.text
         
         if language == "uk":
-            admin_state[user_id]["step"] = "title_en"
+            state["step"] = "title_en"
             await update.message.reply_text("Please enter the event title in English:")
         elif language == "en":
-            admin_state[user_id]["step"] = "title_de"
+            state["step"] = "title_de"
             await update.message.reply_text("Please enter the event title in German:")
         elif language == "de":
-            admin_state[user_id]["step"] = "date"
+            state["step"] = "date"
             await update.message.reply_text("Please enter the event date (YYYY-MM-DD):")
+        
+        admin_state[user_id] = state
     
     elif current_step == "date":
         # Validate date format
         date_text = update.message.text
         try:
             datetime.strptime(date_text, "%Y-%m-%d")
-            admin_state[user_id]["date"] = date_text
-            admin_state[user_id]["step"] = "time"
+            admin_state.update(user_id, date=date_text, step="time")
             await update.message.reply_text("Please enter the event time (e.g., 18:00):")
         except ValueError:
             await update.message.reply_text("Invalid date format. Please use YYYY-MM-DD:")
     
     elif current_step == "time":
-        admin_state[user_id]["time"] = update.message.text
-        admin_state[user_id]["step"] = "location"
+        admin_state.update(user_id, time=update.message.text, step="location")
         await update.message.reply_text("Please enter the event location:")
     
     elif current_step == "location":
-        admin_state[user_id]["location"] = update.message.text
-        admin_state[user_id]["step"] = "price"
+        admin_state.update(user_id, location=update.message.text, step="price")
         await update.message.reply_text("Please enter the event price:")
     
     elif current_step == "price":
-        admin_state[user_id]["price"] = update.message.text
-        admin_state[user_id]["step"] = "description_uk"
+        admin_state.update(user_id, price=update.message.text, step="description_uk")
         await update.message.reply_text("Please enter the event description in Ukrainian:")
     
     elif current_step.startswith("description_"):
         language = current_step.split("_")[1]
-        admin_state[user_id][f"description_{language}"] = update.message.text
+        state[f"description_{language}"] = update.message.text
         
         if language == "uk":
-            admin_state[user_id]["step"] = "description_en"
+            state["step"] = "description_en"
+            admin_state[user_id] = state
             await update.message.reply_text("Please enter the event description in English:")
         elif language == "en":
-            admin_state[user_id]["step"] = "description_de"
+            state["step"] = "description_de"
+            admin_state[user_id] = state
             await update.message.reply_text("Please enter the event description in German:")
         elif language == "de":
             # Final step - add event
             event_data = {
-                'title_uk': admin_state[user_id].get("title_uk", ""),
-                'title_en': admin_state[user_id].get("title_en", ""),
-                'title_de': admin_state[user_id].get("title_de", ""),
-                'date': admin_state[user_id].get("date", ""),
-                'time': admin_state[user_id].get("time", ""),
-                'location': admin_state[user_id].get("location", ""),
-                'price': admin_state[user_id].get("price", ""),
-                'description_uk': admin_state[user_id].get("description_uk", ""),
-                'description_en': admin_state[user_id].get("description_en", ""),
-                'description_de': admin_state[user_id].get("description_de", "")
+                'title_uk': state.get("title_uk", ""),
+                'title_en': state.get("title_en", ""),
+                'title_de': state.get("title_de", ""),
+                'date': state.get("date", ""),
+                'time': state.get("time", ""),
+                'location': state.get("location", ""),
+                'price': state.get("price", ""),
+                'description_uk': state.get("description_uk", ""),
+                'description_en': state.get("description_en", ""),
+                'description_de': state.get("description_de", "")
             }
             
-            success, message = sheets_client.add_event(event_data)
+            success, message = await sheets_client.add_event(event_data)
             
             if success:
                 await update.message.reply_text(
@@ -218,11 +421,27 @@ async def handle_admin_input(update: Update, context: CallbackContext) -> None:
             # Clear admin state
             del admin_state[user_id]
     
+    # Handle export range
+    elif current_step == "export_range":
+        parts = update.message.text.replace("..", " ").split()
+        try:
+            date_from, date_to = (date.fromisoformat(part).isoformat() for part in parts)
+        except ValueError:
+            await update.message.reply_text("Invalid range. Please use YYYY-MM-DD YYYY-MM-DD:")
+            return
+        
+        fmt = state.get("export_format", "csv")
+        state.pop("step", None)
+        state.pop("export_format", None)
+        admin_state[user_id] = state
+        
+        await update.message.reply_text(get_text("loading", user_lang))
+        await send_export(context, update.effective_chat.id, user_id, user_lang, fmt, date_from, date_to)
+    
     # Handle broadcast steps
     elif current_step == "broadcast_text":
         broadcast_text = update.message.text
-        admin_state[user_id]["broadcast_text"] = broadcast_text
-        admin_state[user_id]["step"] = "broadcast_confirm"
+        admin_state.update(user_id, broadcast_text=broadcast_text, step="broadcast_confirm")
         
         await update.message.reply_text(
             f"Your broadcast message:\n\n{broadcast_text}\n\nAre you sure you want to send this to all users?",
@@ -239,7 +458,7 @@ async def admin_broadcast_start(update: Update, context: CallbackContext) -> Non
     
     query = update.callback_query
     user_id = update.effective_user.id
-    user_lang = sheets_client.get_user_language(user_id)
+    user_lang = await sheets_client.get_user_language(user_id)
     
     # Initialize admin state
     admin_state[user_id] = {"step": "broadcast_text"}
@@ -258,9 +477,10 @@ async def admin_broadcast_send(update: Update, context: CallbackContext) -> None
     
     query = update.callback_query
     user_id = update.effective_user.id
-    user_lang = sheets_client.get_user_language(user_id)
+    user_lang = await sheets_client.get_user_language(user_id)
     
-    if user_id not in admin_state or "broadcast_text" not in admin_state[user_id]:
+    state = admin_state.get(user_id, {})
+    if "broadcast_text" not in state:
         await query.edit_message_text(
             text="Error: Broadcast text not found.",
             reply_markup=InlineKeyboardMarkup([[
@@ -269,10 +489,10 @@ async def admin_broadcast_send(update: Update, context: CallbackContext) -> None
         )
         return
     
-    broadcast_text = admin_state[user_id]["broadcast_text"]
+    broadcast_text = state["broadcast_text"]
     
     # Get all users from Google Sheets
-    users = sheets_client.get_all_users()
+    users = await sheets_client.get_all_users()
     
     if not users:
         await query.edit_message_text(
@@ -283,46 +503,58 @@ async def admin_broadcast_send(update: Update, context: CallbackContext) -> None
         )
         return
     
-    # Send message to all users
-    sent_count = 0
-    failed_count = 0
+    recipients = [int(str(user.get("user_id", ""))) for user in users if str(user.get("user_id", "")).isdigit()]
     
     # Update message to show progress
     progress_message = await query.edit_message_text(
-        text=f"Sending broadcast to {len(users)} users...\nSent: 0\nFailed: 0"
+        text=f"Sending broadcast to {len(recipients)} users...\nSent: 0\nFailed: 0"
     )
     
-    for user in users:
-        try:
-            user_id_str = user.get("user_id", "")
-            if not user_id_str or not user_id_str.isdigit():
-                failed_count += 1
-                continue
-                
-            recipient_id = int(user_id_str)
-            await context.bot.send_message(
-                chat_id=recipient_id,
-                text=broadcast_text,
-                parse_mode='Markdown'
-            )
-            sent_count += 1
-            
-            # Update progress every 10 users
-            if sent_count % 10 == 0:
-                await progress_message.edit_text(
-                    text=f"Sending broadcast...\nSent: {sent_count}\nFailed: {failed_count}"
-                )
-        except Exception as e:
-            logger.error(f"Failed to send broadcast to user {user.get('user_id')}: {e}")
-            failed_count += 1
+    journal = BroadcastJournal.create(broadcast_text, query.message.chat_id, recipients)
     
     # Clear admin state
     del admin_state[user_id]
     
-    # Final report
-    await progress_message.edit_text(
-        text=f"Broadcast complete!\nSent: {sent_count}\nFailed: {failed_count}",
-        reply_markup=InlineKeyboardMarkup([[
-            InlineKeyboardButton(get_text("back", user_lang), callback_data="admin")
-        ]])
-    )
\ No newline at end of file
+    # Deliver in the background so this update does not block others
+    context.application.create_task(run_broadcast(context.bot, journal, progress_message, user_lang))
+
+async def run_broadcast(bot, journal: BroadcastJournal, progress_message, user_lang: str) -> None:
+    """Run a broadcast, editing the progress message on a timer"""
+    async def on_progress(sent: int, failed: int, total: int, finished: bool) -> None:
+        if finished:
+            await progress_message.edit_text(
+                text=f"Broadcast complete!\nSent: {sent}\nFailed: {failed}",
+                reply_markup=InlineKeyboardMarkup([[
+                    InlineKeyboardButton(get_text("back", user_lang), callback_data="admin")
+                ]])
+            )
+        else:
+            await progress_message.edit_text(
+                text=f"Sending broadcast...\nSent: {sent} of {total}\nFailed: {failed}"
+            )
+    
+    try:
+        await BroadcastEngine(bot).run(journal, on_progress if progress_message else None)
+    except Exception as e:
+        logger.error(f"Broadcast {journal.broadcast_id} stopped, will resume on restart: {e}")
+
+async def resume_broadcasts(bot) -> None:
+    """Resume broadcasts whose sending process died; ones a live worker is sending are left alone"""
+    for journal in unfinished_journals():
+        try:
+            admin_chat_id = journal.header['admin_chat_id']
+            counts = journal.counts()
+            logger.info(f"Resuming broadcast {journal.broadcast_id}: {len(journal.pending)} recipients left")
+            try:
+                progress_message = await bot.send_message(
+                    chat_id=admin_chat_id,
+                    text=f"Resuming interrupted broadcast...\nSent: {counts['sent']}\nFailed: {counts['failed']}"
+                )
+            except Exception as e:
+                logger.error(f"Failed to notify admin about resumed broadcast: {e}")
+                progress_message = None
+            user_lang = await sheets_client.get_user_language(admin_chat_id)
+            await run_broadcast(bot, journal, progress_message, user_lang)
+        finally:
+            # Releases the claim if the broadcast never got to run
+            journal.close()
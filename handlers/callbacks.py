@@ -0,0 +1,222 @@
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import CallbackContext
+import logging
+from typing import Dict, Any, Optional
+from datetime import date
+
+from utils.localization import get_text
+from utils.helpers import calendar_markup
+from sheets import async_sheets_client as sheets_client
+from handlers.router import CallbackRouter
+from handlers.screens import render
+from handlers.user import user_state, show_event_page, main_menu, events_menu, yoga_signup, schedule_menu, store_menu, about_menu
+from handlers.admin import (
+    admin_panel, admin_view_registrations, admin_registrations_filtered, admin_registrations_page,
+    admin_registrations_filter_menu, admin_registrations_filter_date, admin_registrations_filter_class,
+    admin_export_menu, admin_export,
+    admin_refresh_cache, admin_add_event_start, admin_broadcast_start, admin_broadcast_send
+)
+
+logger = logging.getLogger(__name__)
+
+router = CallbackRouter()
+
+async def button_callback(update: Update, context: CallbackContext) -> None:
+    """Handle button callbacks"""
+    query = update.callback_query
+
+    # Answer callback query to stop loading animation
+    await query.answer()
+
+    try:
+        await router.dispatch(update, context, sheets_client.get_user_language, user_state.get)
+    except Exception as e:
+        logger.error(f"Error handling callback: {e}")
+        user_lang = await sheets_client.get_user_language(update.effective_user.id)
+        await query.edit_message_text(
+            text=get_text("error_occurred", user_lang),
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton(get_text("back", user_lang), callback_data="back_to_main")
+            ]])
+        )
+
+# Screens that look up the language themselves
+for pattern, handler in {
+    "back_to_main": main_menu,
+    "main_menu": main_menu,
+    "events": events_menu,
+    "yoga_signup": yoga_signup,
+    "schedule": schedule_menu,
+    "store": store_menu,
+    "about": about_menu,
+    "admin": admin_panel,
+    "admin_registrations": admin_view_registrations,
+    "admin_reg_show": admin_registrations_filtered,
+    "admin_reg_filter": admin_registrations_filter_menu,
+    "admin_reg_page_{str}_{str}": admin_registrations_page,
+    "admin_reg_date_{str}": admin_registrations_filter_date,
+    "admin_reg_class_{int}": admin_registrations_filter_class,
+    "admin_export": admin_export_menu,
+    "admin_export_{str}_{str}": admin_export,
+    "admin_refresh_cache": admin_refresh_cache,
+    "admin_add_event": admin_add_event_start,
+    "admin_broadcast": admin_broadcast_start,
+    "broadcast_send": admin_broadcast_send,
+}.items():
+    router.add(pattern, handler, needs_lang=False)
+
+@router.route("ignore", needs_lang=False)
+async def ignore(update: Update, context: CallbackContext) -> None:
+    """Padding cells and disabled calendar days"""
+
+@router.route("lang_{str}", needs_lang=False)
+async def select_language(update: Update, context: CallbackContext, lang_code: str) -> None:
+    """Language selection"""
+    await sheets_client.set_user_language(update.effective_user.id, lang_code)
+    await update.callback_query.edit_message_text(
+        text=get_text("language_changed", lang_code),
+        reply_markup=InlineKeyboardMarkup([[
+            InlineKeyboardButton(get_text("main_menu", lang_code), callback_data="back_to_main")
+        ]])
+    )
+
+@router.route("change_language")
+async def change_language(update: Update, context: CallbackContext, user_lang: str) -> None:
+    """Change language"""
+    text, reply_markup = render("change_language", user_lang)
+
+    await update.callback_query.edit_message_text(
+        text=text,
+        reply_markup=reply_markup
+    )
+
+@router.route("calendar_{int}_{int}")
+async def calendar_navigation(update: Update, context: CallbackContext, year: int, month: int, user_lang: str) -> None:
+    """Calendar navigation"""
+    if not 1 <= month <= 12:
+        return
+
+    await update.callback_query.edit_message_text(
+        text=get_text("date_prompt", user_lang),
+        reply_markup=calendar_markup(year, month)
+    )
+
+@router.route("date_{iso}", needs_state=True)
+async def date_selection(update: Update, context: CallbackContext, selected_date: date,
+                         user_lang: str, state: Optional[Dict[str, Any]]) -> None:
+    """Date selection"""
+    if not state or state.get("step") != "date":
+        return
+
+    user_state.update(update.effective_user.id, date=selected_date.isoformat(), step="class_type")
+
+    # Get class types from schedule
+    schedule = await sheets_client.get_schedule()
+    class_types = set()
+
+    for item in schedule:
+        class_name = item.get(f"class_{user_lang}", "") or item.get("class_uk", "") or item.get("class_en", "")
+        if class_name:
+            class_types.add(class_name)
+
+    # Create keyboard with class types
+    keyboard = []
+    for class_type in sorted(class_types):
+        keyboard.append([InlineKeyboardButton(class_type, callback_data=f"class_{class_type}")])
+
+    keyboard.append([InlineKeyboardButton(get_text("back", user_lang), callback_data="back_to_main")])
+
+    await update.callback_query.edit_message_text(
+        text=get_text("class_prompt", user_lang),
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+
+@router.route("class_{str}", needs_state=True)
+async def class_selection(update: Update, context: CallbackContext, class_type: str,
+                          user_lang: str, state: Optional[Dict[str, Any]]) -> None:
+    """Class type selection"""
+    if not state or state.get("step") != "class_type":
+        return
+
+    user_state.update(update.effective_user.id, class_type=class_type, step="comment")
+
+    # Create keyboard with skip option
+    keyboard = [[InlineKeyboardButton(get_text("skip", user_lang), callback_data="skip_comment")]]
+
+    await update.callback_query.edit_message_text(
+        text=get_text("comment_prompt", user_lang),
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+
+@router.route("skip_comment", needs_state=True)
+async def skip_comment(update: Update, context: CallbackContext,
+                       user_lang: str, state: Optional[Dict[str, Any]]) -> None:
+    """Skip comment and finalize registration"""
+    if not state or state.get("step") != "comment":
+        return
+
+    query = update.callback_query
+
+    # Register to class
+    success, message = await sheets_client.add_yoga_registration(
+        name=state.get("name", ""),
+        email=state.get("email", ""),
+        date=state.get("date", ""),
+        class_type=state.get("class_type", ""),
+        comment=""
+    )
+
+    if success:
+        # Registration successful
+        await query.edit_message_text(
+            text=get_text("registration_success", user_lang),
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton(get_text("back", user_lang), callback_data="back_to_main")
+            ]])
+        )
+    else:
+        # Registration failed
+        await query.edit_message_text(
+            text=f"❌ {message}",
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton(get_text("back", user_lang), callback_data="back_to_main")
+            ]])
+        )
+
+    # Clear user state
+    del user_state[update.effective_user.id]
+
+@router.route("event_{str}")
+async def event_navigation(update: Update, context: CallbackContext, event_id: str, user_lang: str) -> None:
+    """Event navigation; the cursor is the event id, so it survives changes to the list"""
+    page = await sheets_client.get_event_page(event_id)
+    await show_event_page(update.callback_query, user_lang, page)
+
+@router.route("next_event_{int}")
+async def event_navigation_by_index(update: Update, context: CallbackContext, index: int, user_lang: str) -> None:
+    """Position-based navigation buttons sent before cursors were introduced"""
+    events = await sheets_client.get_events()
+
+    if index >= len(events):
+        return
+
+    page = await sheets_client.get_event_page(events[index].get('id'))
+    await show_event_page(update.callback_query, user_lang, page)
+
+@router.route("signup_event_{str}")
+async def event_signup(update: Update, context: CallbackContext, event_id: str, user_lang: str) -> None:
+    """Event signup"""
+    if await sheets_client.get_event(event_id) is None:
+        await show_event_page(update.callback_query, user_lang, None)
+        return
+
+    # Initialize user state for registration
+    user_state[update.effective_user.id] = {"step": "name", "event_id": event_id}
+
+    # Ask for name
+    await update.callback_query.edit_message_text(
+        text=get_text("name_prompt", user_lang),
+        reply_markup=InlineKeyboardMarkup([[
+            InlineKeyboardButton(get_text("back", user_lang), callback_data="back_to_main")
+        ]])
+    )
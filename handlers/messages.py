@@ -0,0 +1,56 @@
+from telegram import Update
+from telegram.ext import CallbackContext
+import logging
+from typing import Awaitable, Callable, Dict
+
+import metrics
+from handlers.user import user_state, handle_yoga_registration
+from handlers.admin import admin_state, handle_admin_input
+from config import ADMIN_USER_IDS
+
+logger = logging.getLogger(__name__)
+
+TextHandler = Callable[[Update, CallbackContext], Awaitable[None]]
+
+# Conversation steps that wait for a text message, mapped to the flow that handles them.
+# Steps answered with buttons (calendar date, broadcast confirmation) are not listed,
+# so text typed at those steps is ignored.
+USER_TEXT_STEPS: Dict[str, TextHandler] = {
+    step: handle_yoga_registration for step in ("name", "email", "class_type", "comment")
+}
+
+ADMIN_TEXT_STEPS: Dict[str, TextHandler] = {
+    step: handle_admin_input for step in (
+        "title_uk", "title_en", "title_de",
+        "date", "time", "location", "price",
+        "description_uk", "description_en", "description_de",
+        "export_range", "broadcast_text",
+    )
+}
+
+async def handle_text_message(update: Update, context: CallbackContext) -> None:
+    """Route a text message to the conversation flow waiting for it
+
+    Only the in-memory or SQLite conversation state is consulted, so messages
+    outside any flow are dropped without a Sheets call or a reply. An admin
+    flow takes precedence over a registration started by the same admin.
+    """
+    if update.effective_user is None or update.message is None:
+        return
+    user_id = update.effective_user.id
+
+    handler = None
+    if user_id in ADMIN_USER_IDS:
+        state = admin_state.get(user_id)
+        if state is not None:
+            handler = ADMIN_TEXT_STEPS.get(state.get("step", ""))
+    if handler is None:
+        state = user_state.get(user_id)
+        if state is not None:
+            handler = USER_TEXT_STEPS.get(state.get("step", ""))
+
+    if handler is None:
+        logger.debug(f"Ignoring text from user {user_id} outside of any flow")
+        return
+    metrics.set_handler(handler.__name__)
+    await handler(update, context)
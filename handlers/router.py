@@ -0,0 +1,107 @@
+from telegram import Update
+from telegram.ext import CallbackContext
+import logging
+from datetime import date
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Parameter parsers available in route patterns, e.g. "calendar_{int}_{int}"
+PARAM_TYPES: Dict[str, Callable[[str], Any]] = {
+    'int': int,
+    'str': str,
+    'iso': date.fromisoformat,
+}
+
+
+class Route(NamedTuple):
+    handler: Callable[..., Awaitable[None]]
+    params: Tuple[Callable[[str], Any], ...]
+    needs_lang: bool
+    needs_state: bool
+
+
+class CallbackRouter:
+    """Maps callback data to handlers with a dict lookup instead of an if/elif chain
+
+    Patterns are either literal ("events") or a literal prefix ending in "_"
+    followed by typed parameters ("next_event_{int}"). A `str` parameter in
+    last position takes the rest of the data, underscores included.
+    """
+
+    def __init__(self):
+        self._exact: Dict[str, Route] = {}
+        # First segment of the prefix ("next" for "next_event_") -> [(prefix, route)], longest first
+        self._prefixes: Dict[str, List[Tuple[str, Route]]] = {}
+
+    def route(self, *patterns: str, needs_lang: bool = True, needs_state: bool = False):
+        """Register the decorated coroutine for one or more patterns
+
+        The handler is called as handler(update, context, *params) plus the
+        keyword arguments `user_lang` and/or `state` when requested.
+        """
+        def decorator(handler):
+            for pattern in patterns:
+                self.add(pattern, handler, needs_lang=needs_lang, needs_state=needs_state)
+            return handler
+        return decorator
+
+    def add(self, pattern: str, handler: Callable[..., Awaitable[None]],
+            needs_lang: bool = True, needs_state: bool = False) -> None:
+        if '{' not in pattern:
+            self._exact[pattern] = Route(handler, (), needs_lang, needs_state)
+            return
+
+        prefix, _, spec = pattern.partition('{')
+        if not prefix.endswith('_'):
+            raise ValueError(f"Route prefix must end with '_': {pattern}")
+        names = ('{' + spec).replace('}_{', ' ').strip('{}').split()
+        params = tuple(PARAM_TYPES[name] for name in names)
+        route = Route(handler, params, needs_lang, needs_state)
+        candidates = self._prefixes.setdefault(prefix.partition('_')[0], [])
+        candidates[:] = [candidate for candidate in candidates if candidate[0] != prefix] + [(prefix, route)]
+        candidates.sort(key=lambda candidate: len(candidate[0]), reverse=True)
+
+    def resolve(self, data: str) -> Optional[Tuple[Route, List[Any]]]:
+        """Find the route for callback data and parse its parameters"""
+        route = self._exact.get(data)
+        if route is not None:
+            return route, []
+
+        for prefix, route in self._prefixes.get(data.partition('_')[0], ()):
+            if not data.startswith(prefix):
+                continue
+            raw = data[len(prefix):]
+            count = len(route.params)
+            try:
+                if count == 1:
+                    return route, [route.params[0](raw)]
+                values = raw.split('_', count - 1)
+                if len(values) != count:
+                    return None
+                return route, [parse(value) for parse, value in zip(route.params, values)]
+            except ValueError:
+                return None
+        return None
+
+    async def dispatch(self, update: Update, context: CallbackContext,
+                       get_lang: Callable[[int], Awaitable[Optional[str]]],
+                       get_state: Callable[[int], Optional[Dict[str, Any]]]) -> bool:
+        """Run the handler for update.callback_query.data; returns False if no route matched"""
+        data = update.callback_query.data or ''
+        resolved = self.resolve(data)
+        if resolved is None:
+            logger.warning(f"Unknown callback data: {data}")
+            return False
+
+        route, params = resolved
+        metrics.set_handler(route.handler.__name__)
+        kwargs = {}
+        if route.needs_lang:
+            kwargs['user_lang'] = await get_lang(update.effective_user.id)
+        if route.needs_state:
+            kwargs['state'] = get_state(update.effective_user.id)
+        await route.handler(update, context, *params, **kwargs)
+        return True
@@ -0,0 +1,113 @@
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+import logging
+from typing import Callable, Dict, Tuple
+
+from utils.localization import get_text
+from config import LANGUAGES, DEFAULT_LANGUAGE
+
+logger = logging.getLogger(__name__)
+
+# Store URL
+STORE_URL = "https://marina-kaminska-art.myshopify.com/"
+
+LANGUAGE_NAMES = {
+    'uk': 'Українська',
+    'en': 'English',
+    'de': 'Deutsch'
+}
+
+Rendered = Tuple[str, InlineKeyboardMarkup]
+
+# Screen name -> builder(lang, is_admin)
+SCREENS: Dict[str, Callable[[str, bool], Rendered]] = {}
+
+# (screen, lang, is_admin) -> (text, markup); both are immutable and shared by every update
+_rendered: Dict[Tuple[str, str, bool], Rendered] = {}
+
+def screen(name: str):
+    """Register a builder for a static screen"""
+    def decorator(builder: Callable[[str, bool], Rendered]) -> Callable[[str, bool], Rendered]:
+        SCREENS[name] = builder
+        return builder
+    return decorator
+
+def render(name: str, lang: str, is_admin: bool = False) -> Rendered:
+    """Text and markup of a static screen, built on first use and reused afterwards"""
+    if lang not in LANGUAGES:
+        lang = DEFAULT_LANGUAGE
+    key = (name, lang, is_admin)
+    rendered = _rendered.get(key)
+    if rendered is None:
+        rendered = _rendered[key] = SCREENS[name](lang, is_admin)
+    return rendered
+
+def prerender() -> None:
+    """Build every (screen, language, is_admin) combination up front"""
+    for name in SCREENS:
+        for lang in LANGUAGES:
+            for is_admin in (False, True):
+                render(name, lang, is_admin)
+    logger.info(f"Prerendered {len(_rendered)} screens")
+
+@screen("language_selection")
+def language_selection_screen(lang: str, is_admin: bool) -> Rendered:
+    keyboard = [
+        [
+            InlineKeyboardButton("🇺🇦 Українська", callback_data="lang_uk"),
+            InlineKeyboardButton("🇬🇧 English", callback_data="lang_en"),
+            InlineKeyboardButton("🇩🇪 Deutsch", callback_data="lang_de")
+        ]
+    ]
+    return "Оберіть мову / Select language / Sprache wählen:", InlineKeyboardMarkup(keyboard)
+
+@screen("change_language")
+def change_language_screen(lang: str, is_admin: bool) -> Rendered:
+    text, markup = language_selection_screen(lang, is_admin)
+    keyboard = list(markup.inline_keyboard) + [
+        [InlineKeyboardButton(get_text("back", lang), callback_data="back_to_main")]
+    ]
+    return get_text("language_select", lang), InlineKeyboardMarkup(keyboard)
+
+@screen("main_menu")
+def main_menu_screen(lang: str, is_admin: bool) -> Rendered:
+    keyboard = [
+        [
+            InlineKeyboardButton(get_text("events", lang), callback_data="events"),
+            InlineKeyboardButton(get_text("yoga_signup", lang), callback_data="yoga_signup")
+        ],
+        [
+            InlineKeyboardButton(get_text("schedule", lang), callback_data="schedule"),
+            InlineKeyboardButton(get_text("store", lang), callback_data="store")
+        ],
+        [
+            InlineKeyboardButton(get_text("about_me", lang), callback_data="about"),
+            InlineKeyboardButton("🌐 " + LANGUAGE_NAMES[lang], callback_data="change_language")
+        ]
+    ]
+
+    # Add admin button for administrators
+    if is_admin:
+        keyboard.append([
+            InlineKeyboardButton(get_text("admin_panel", lang), callback_data="admin")
+        ])
+
+    return get_text("main_menu", lang), InlineKeyboardMarkup(keyboard)
+
+@screen("store")
+def store_screen(lang: str, is_admin: bool) -> Rendered:
+    keyboard = [
+        [InlineKeyboardButton("🛒 Online Store", url=STORE_URL)],
+        [InlineKeyboardButton(get_text("back", lang), callback_data="back_to_main")]
+    ]
+    return get_text("store_text", lang), InlineKeyboardMarkup(keyboard)
+
+@screen("about")
+def about_screen(lang: str, is_admin: bool) -> Rendered:
+    keyboard = [
+        [
+            InlineKeyboardButton("📸 Instagram", url="https://instagram.com/marina_kaminska_art"),
+            InlineKeyboardButton("🌐 Website", url="https://www.marinakaminska.com")
+        ],
+        [InlineKeyboardButton(get_text("back", lang), callback_data="back_to_main")]
+    ]
+    return get_text("about_text", lang), InlineKeyboardMarkup(keyboard)
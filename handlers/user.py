@@ -1,32 +1,31 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, KeyboardButton, ReplyKeyboardMarkup
 from telegram.ext import CallbackContext
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from datetime import datetime
 
-from utils.localization import get_text
-from utils.helpers import validate_email, generate_calendar_keyboard
-from sheets import SheetsClient
+from utils.localization import get_text, format_text
+from utils.helpers import validate_email, calendar_markup, format_event_details
+from utils.state_store import create_state_store
+from handlers.screens import render
+from sheets import async_sheets_client as sheets_client
+from event_index import EventPage
 from config import ADMIN_USER_IDS
 
 logger = logging.getLogger(__name__)
-sheets_client = SheetsClient()
 
 # User registration state
-user_state: Dict[int, Dict[str, Any]] = {}
-# Store URL
-STORE_URL = "https://marina-kaminska-art.myshopify.com/"
+user_state = create_state_store('user')
 
 async def start_command(update: Update, context: CallbackContext) -> None:
     """Handle /start command - Entry point"""
     user_id = update.effective_user.id
     
     # Clear user state
-    if user_id in user_state:
-        del user_state[user_id]
+    user_state.pop(user_id)
     
     # Check if user has a language set
-    user_lang = sheets_client.get_user_language(user_id)
+    user_lang = await sheets_client.get_user_language(user_id)
     
     if not user_lang:
         # Ask for language
@@ -37,70 +36,35 @@ async def start_command(update: Update, context: CallbackContext) -> None:
 
 async def language_selection(update: Update, context: CallbackContext) -> None:
     """Show language selection keyboard"""
-    keyboard = [
-        [
-            InlineKeyboardButton("🇺🇦 Українська", callback_data="lang_uk"),
-            InlineKeyboardButton("🇬🇧 English", callback_data="lang_en"),
-            InlineKeyboardButton("🇩🇪 Deutsch", callback_data="lang_de")
-        ]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    await update.message.reply_text(
-        "Оберіть мову / Select language / Sprache wählen:",
-        reply_markup=reply_markup
-    )
+    text, reply_markup = render("language_selection", None)
+
+    await update.message.reply_text(text, reply_markup=reply_markup)
 
 async def main_menu(update: Update, context: CallbackContext) -> None:
     """Show main menu"""
     user_id = update.effective_user.id
-    user_lang = sheets_client.get_user_language(user_id)
-    
-    keyboard = [
-        [
-            InlineKeyboardButton(get_text("events", user_lang), callback_data="events"),
-            InlineKeyboardButton(get_text("yoga_signup", user_lang), callback_data="yoga_signup")
-        ],
-        [
-            InlineKeyboardButton(get_text("schedule", user_lang), callback_data="schedule"),
-            InlineKeyboardButton(get_text("store", user_lang), callback_data="store")
-        ],
-        [
-            InlineKeyboardButton(get_text("about_me", user_lang), callback_data="about"),
-            InlineKeyboardButton("🌐 " + {
-                'uk': 'Українська',
-                'en': 'English',
-                'de': 'Deutsch'
-            }[user_lang], callback_data="change_language")
-        ]
-    ]
-    
-    # Add admin button for administrators
-    if user_id in ADMIN_USER_IDS:
-        keyboard.append([
-            InlineKeyboardButton(get_text("admin_panel", user_lang), callback_data="admin")
-        ])
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
+    user_lang = await sheets_client.get_user_language(user_id)
+
+    text, reply_markup = render("main_menu", user_lang, user_id in ADMIN_USER_IDS)
+
     try:
         # Try to edit message if it's a callback
         if update.callback_query:
             await update.callback_query.edit_message_text(
-                text=get_text("main_menu", user_lang),
+                text=text,
                 reply_markup=reply_markup
             )
         else:
             # Otherwise send new message
             await update.message.reply_text(
-                text=get_text("main_menu", user_lang),
+                text=text,
                 reply_markup=reply_markup
             )
     except Exception as e:
         # If edit fails, send new message
         if update.message:
             await update.message.reply_text(
-                text=get_text("main_menu", user_lang),
+                text=text,
                 reply_markup=reply_markup
             )
         else:
@@ -108,7 +72,7 @@ async def main_menu(update: Update, context: CallbackContext) -> None:
             chat_id = update.callback_query.message.chat_id
             await context.bot.send_message(
                 chat_id=chat_id,
-                text=get_text("main_menu", user_lang),
+                text=text,
                 reply_markup=reply_markup
             )
 
@@ -116,17 +80,20 @@ async def events_menu(update: Update, context: CallbackContext) -> None:
     """Show list of events"""
     query = update.callback_query
     user_id = update.effective_user.id
-    user_lang = sheets_client.get_user_language(user_id)
+    user_lang = await sheets_client.get_user_language(user_id)
     
     # Show loading message
     await query.edit_message_text(
         text=get_text("loading", user_lang)
     )
     
-    # Get events from Google Sheets
-    events = sheets_client.get_events()
-    
-    if not events:
+    # First upcoming event with the ids of its neighbours
+    page = await sheets_client.get_event_page()
+    await show_event_page(query, user_lang, page)
+
+async def show_event_page(query, user_lang: str, page: Optional[EventPage]) -> None:
+    """Show one upcoming event with Prev/Next buttons addressed by event id"""
+    if page is None:
         # No events available
         keyboard = [[InlineKeyboardButton(get_text("back", user_lang), callback_data="back_to_main")]]
         reply_markup = InlineKeyboardMarkup(keyboard)
@@ -137,8 +104,7 @@ async def events_menu(update: Update, context: CallbackContext) -> None:
         )
         return
     
-    # Show first event
-    current_event = events[0]
+    current_event = page.event
     event_details = format_event_details(current_event, user_lang)
     
     # Create keyboard
@@ -146,10 +112,12 @@ async def events_menu(update: Update, context: CallbackContext) -> None:
         [InlineKeyboardButton(get_text("sign_up", user_lang), callback_data=f"signup_event_{current_event['id']}")],
     ]
     
-    # Add navigation if there are more events
+    # Add navigation
     nav_row = []
-    if len(events) > 1:
-        nav_row.append(InlineKeyboardButton("⏩ Next", callback_data="next_event_1"))
+    if page.prev_id:
+        nav_row.append(InlineKeyboardButton("⏪ Prev", callback_data=f"event_{page.prev_id}"))
+    if page.next_id:
+        nav_row.append(InlineKeyboardButton("⏩ Next", callback_data=f"event_{page.next_id}"))
     
     nav_row.append(InlineKeyboardButton(get_text("back", user_lang), callback_data="back_to_main"))
     keyboard.append(nav_row)
@@ -157,14 +125,7 @@ async def events_menu(update: Update, context: CallbackContext) -> None:
     reply_markup = InlineKeyboardMarkup(keyboard)
     
     # Format message with event details
-    message_text = get_text("event_details", user_lang).format(
-        title=event_details['title'],
-        date=event_details['date'],
-        time=event_details['time'],
-        location=event_details['location'],
-        price=event_details['price'],
-        description=event_details['description']
-    )
+    message_text = format_text("event_details", user_lang, **event_details)
     
     await query.edit_message_text(
         text=message_text,
@@ -176,7 +137,7 @@ async def yoga_signup(update: Update, context: CallbackContext) -> None:
     """Start yoga signup process"""
     query = update.callback_query
     user_id = update.effective_user.id
-    user_lang = sheets_client.get_user_language(user_id)
+    user_lang = await sheets_client.get_user_language(user_id)
     
     # Initialize user state for registration
     user_state[user_id] = {"step": "name"}
@@ -192,24 +153,15 @@ async def yoga_signup(update: Update, context: CallbackContext) -> None:
 async def handle_yoga_registration(update: Update, context: CallbackContext) -> None:
     """Handle yoga registration process"""
     user_id = update.effective_user.id
-    user_lang = sheets_client.get_user_language(user_id)
-    
-    # Check if user is in registration process
-    if user_id not in user_state:
-        await update.message.reply_text(
-            text=get_text("error_occurred", user_lang),
-            reply_markup=InlineKeyboardMarkup([[
-                InlineKeyboardButton(get_text("back", user_lang), callback_data="back_to_main")
-            ]])
-        )
-        return
+    user_lang = await sheets_client.get_user_language(user_id)
     
-    current_step = user_state[user_id].get("step", "")
+    # handle_text_message only routes here at a registration step, so the state exists
+    state = user_state.get(user_id)
+    current_step = state["step"]
     
     if current_step == "name":
         # Save name and ask for email
-        user_state[user_id]["name"] = update.message.text
-        user_state[user_id]["step"] = "email"
+        user_state.update(user_id, name=update.message.text, step="email")
         
         await update.message.reply_text(
             text=get_text("email_prompt", user_lang),
@@ -232,21 +184,16 @@ async def handle_yoga_registration(update: Update, context: CallbackContext) ->
             return
         
         # Save email and show calendar
-        user_state[user_id]["email"] = email
-        user_state[user_id]["step"] = "date"
-        
-        # Generate calendar keyboard
-        keyboard, title = generate_calendar_keyboard()
+        user_state.update(user_id, email=email, step="date")
         
         await update.message.reply_text(
             text=get_text("date_prompt", user_lang),
-            reply_markup=InlineKeyboardMarkup(keyboard)
+            reply_markup=calendar_markup()
         )
     
     elif current_step == "class_type":
         # Save class type and ask for comment
-        user_state[user_id]["class_type"] = update.message.text
-        user_state[user_id]["step"] = "comment"
+        user_state.update(user_id, class_type=update.message.text, step="comment")
         
         # Create keyboard with skip option
         keyboard = [[InlineKeyboardButton(get_text("skip", user_lang), callback_data="skip_comment")]]
@@ -258,15 +205,15 @@ async def handle_yoga_registration(update: Update, context: CallbackContext) ->
     
     elif current_step == "comment":
         # Save comment and finalize registration
-        user_state[user_id]["comment"] = update.message.text
+        state["comment"] = update.message.text
         
         # Register to class
-        success, message = sheets_client.add_yoga_registration(
-            name=user_state[user_id].get("name", ""),
-            email=user_state[user_id].get("email", ""),
-            date=user_state[user_id].get("date", ""),
-            class_type=user_state[user_id].get("class_type", ""),
-            comment=user_state[user_id].get("comment", "")
+        success, message = await sheets_client.add_yoga_registration(
+            name=state.get("name", ""),
+            email=state.get("email", ""),
+            date=state.get("date", ""),
+            class_type=state.get("class_type", ""),
+            comment=state.get("comment", "")
         )
         
         if success:
@@ -293,7 +240,7 @@ async def schedule_menu(update: Update, context: CallbackContext) -> None:
     """Show class schedule"""
     query = update.callback_query
     user_id = update.effective_user.id
-    user_lang = sheets_client.get_user_language(user_id)
+    user_lang = await sheets_client.get_user_language(user_id)
     
     # Show loading message
     await query.edit_message_text(
@@ -301,7 +248,7 @@ async def schedule_menu(update: Update, context: CallbackContext) -> None:
     )
     
     # Get schedule from Google Sheets
-    schedule = sheets_client.get_schedule()
+    schedule = await sheets_client.get_schedule()
     
     # Prepare message
     if not schedule:
@@ -340,40 +287,21 @@ async def schedule_menu(update: Update, context: CallbackContext) -> None:
 
 async def store_menu(update: Update, context: CallbackContext) -> None:
     """Show store information"""
-    query = update.callback_query
-    user_id = update.effective_user.id
-    user_lang = sheets_client.get_user_language(user_id)
-    
-    keyboard = [
-        [InlineKeyboardButton("🛒 Online Store", url=STORE_URL)],
-        [InlineKeyboardButton(get_text("back", user_lang), callback_data="back_to_main")]
-    ]
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    await query.edit_message_text(
-        text=get_text("store_text", user_lang),
+    user_lang = await sheets_client.get_user_language(update.effective_user.id)
+    text, reply_markup = render("store", user_lang)
+
+    await update.callback_query.edit_message_text(
+        text=text,
         reply_markup=reply_markup
     )
 
 async def about_menu(update: Update, context: CallbackContext) -> None:
     """Show about information"""
-    query = update.callback_query
-    user_id = update.effective_user.id
-    user_lang = sheets_client.get_user_language(user_id)
-    
-    keyboard = [
-        [
-            InlineKeyboardButton("📸 Instagram", url="https://instagram.com/marina_kaminska_art"),
-            InlineKeyboardButton("🌐 Website", url="https://www.marinakaminska.com")
-        ],
-        [InlineKeyboardButton(get_text("back", user_lang), callback_data="back_to_main")]
-    ]
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    await query.edit_message_text(
-        text=get_text("about_text", user_lang),
+    user_lang = await sheets_client.get_user_language(update.effective_user.id)
+    text, reply_markup = render("about", user_lang)
+
+    await update.callback_query.edit_message_text(
+        text=text,
         reply_markup=reply_markup,
         parse_mode='Markdown'
-    )
\ No newline at end of file
+    )
@@ -0,0 +1,75 @@
+import json
+import asyncio
+import logging
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# path -> handler returning (HTTP status, JSON body); a str body is sent as plain text
+Route = Callable[[], Tuple[int, Union[Dict[str, Any], str]]]
+
+REASONS = {200: 'OK', 404: 'Not Found', 405: 'Method Not Allowed', 503: 'Service Unavailable'}
+
+
+class HealthServer:
+    """Minimal HTTP/1.0 server for liveness and readiness probes and metrics
+
+    Runs on the bot's event loop next to the webhook listener and never
+    touches Telegram or Sheets, so probes stay fast under load.
+    """
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.routes: Dict[str, Route] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    def route(self, path: str, handler: Route) -> None:
+        self.routes[path] = handler
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        logger.info(f"Health endpoint listening on {self.host}:{self.port}")
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+            # Headers are not needed; drain them so the client sees a clean response
+            while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b'\r\n', b'\n', b''):
+                pass
+            parts = request_line.decode('latin-1').split()
+            method, path = (parts[0], parts[1].split('?')[0]) if len(parts) >= 2 else ('', '')
+
+            handler = self.routes.get(path)
+            if handler is None:
+                status, body = 404, {'error': 'not found'}
+            elif method not in ('GET', 'HEAD'):
+                status, body = 405, {'error': 'method not allowed'}
+            else:
+                status, body = handler()
+
+            if isinstance(body, str):
+                content_type, payload = 'text/plain; version=0.0.4; charset=utf-8', body.encode('utf-8')
+            else:
+                content_type, payload = 'application/json', json.dumps(body).encode('utf-8')
+            if method == 'HEAD':
+                payload = b''
+            writer.write(
+                f"HTTP/1.0 {status} {REASONS.get(status, '')}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(payload)}\r\n"
+                f"Connection: close\r\n\r\n".encode('latin-1') + payload
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        except Exception as e:
+            logger.error(f"Error serving health request: {e}")
+        finally:
+            writer.close()
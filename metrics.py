@@ -0,0 +1,264 @@
+import time
+import asyncio
+import logging
+import threading
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from telegram.request import HTTPXRequest
+
+from config import METRICS_LOG_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+CALL_BUCKETS = (0, 1, 2, 3, 4, 6, 8, 12, 16)
+BYTES_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class Histogram:
+    """Prometheus-style histogram with one label
+
+    Observing is a bisect and three increments under a lock, cheap enough
+    for every update and every API call, including from Sheets threads.
+    """
+
+    def __init__(self, name: str, help_text: str, label: str, buckets: Sequence[float]):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = tuple(buckets)
+        # label value -> [per-bucket counts (last one is +Inf), sum, count]
+        self._series: Dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_value: str, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def snapshot(self) -> Dict[str, Tuple[List[int], float, int]]:
+        with self._lock:
+            return {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for label_value, (counts, total, count) in sorted(self.snapshot().items()):
+            label = f'{self.label}="{_escape(label_value)}"'
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{self.name}_bucket{{{label},le="{le}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{label}}} {total}')
+            lines.append(f'{self.name}_count{{{label}}} {count}')
+        return lines
+
+
+class Counter:
+    """Prometheus-style counter with one label"""
+
+    def __init__(self, name: str, help_text: str, label: str):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self._values: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_value: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[label_value] = self._values.get(label_value, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        lines.extend(f'{self.name}{{{self.label}="{_escape(key)}"}} {value}' for key, value in values)
+        return lines
+
+
+class Gauge:
+    """Gauge read from a callback at render time; the callback returns {label value: value}"""
+
+    def __init__(self, name: str, help_text: str, label: str, read: Callable[[], Dict[str, float]]):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.read = read
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge"]
+        lines.extend(f'{self.name}{{{self.label}="{_escape(key)}"}} {value}'
+                     for key, value in sorted(self.read().items()))
+        return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def quantile(buckets: Sequence[float], counts: Sequence[int], q: float) -> float:
+    """Estimate a quantile from bucket counts by interpolating inside the bucket"""
+    total = sum(counts)
+    if total == 0:
+        return 0.0
+    rank = q * total
+    cumulative = 0
+    for index, bucket_count in enumerate(counts):
+        if cumulative + bucket_count >= rank and bucket_count:
+            if index == len(buckets):
+                # Beyond the last bound there is nothing to interpolate to
+                return buckets[-1]
+            lower = buckets[index - 1] if index else 0.0
+            return lower + (buckets[index] - lower) * (rank - cumulative) / bucket_count
+        cumulative += bucket_count
+    return buckets[-1]
+
+
+update_seconds = Histogram(
+    'bot_update_seconds', 'Wall time of handling one update', 'handler', LATENCY_BUCKETS)
+update_sheets_calls = Histogram(
+    'bot_update_sheets_calls', 'Google Sheets API requests made while handling one update', 'handler', CALL_BUCKETS)
+update_sheets_bytes = Histogram(
+    'bot_update_sheets_bytes', 'Google Sheets response bytes received while handling one update', 'handler',
+    BYTES_BUCKETS)
+update_telegram_seconds = Histogram(
+    'bot_update_telegram_seconds', 'Time spent waiting for the Telegram API while handling one update', 'handler',
+    LATENCY_BUCKETS)
+sheets_request_seconds = Histogram(
+    'sheets_request_seconds', 'Latency of Google Sheets API requests', 'method', LATENCY_BUCKETS)
+sheets_response_bytes = Histogram(
+    'sheets_response_bytes', 'Size of Google Sheets API responses', 'method', BYTES_BUCKETS)
+telegram_request_seconds = Histogram(
+    'telegram_request_seconds', 'Latency of Telegram Bot API requests', 'method', LATENCY_BUCKETS)
+
+HISTOGRAMS = (
+    update_seconds, update_sheets_calls, update_sheets_bytes, update_telegram_seconds,
+    sheets_request_seconds, sheets_response_bytes, telegram_request_seconds,
+)
+
+# Everything served on /metrics; other modules add their own counters and gauges with register()
+COLLECTORS: list = list(HISTOGRAMS)
+
+
+def register(collector):
+    COLLECTORS.append(collector)
+    return collector
+
+
+# histogram name -> label value -> (bucket counts, sum, count)
+Snapshots = Dict[str, Dict[str, Tuple[List[int], float, int]]]
+
+
+class UpdateStats:
+    """Costs accumulated while one update is handled"""
+
+    __slots__ = ('handler', 'sheets_calls', 'sheets_bytes', 'telegram_seconds')
+
+    def __init__(self, handler: str):
+        self.handler = handler
+        self.sheets_calls = 0
+        self.sheets_bytes = 0
+        self.telegram_seconds = 0.0
+
+
+# Stats of the update handled by the current task. Sheets calls see it because
+# AsyncSheetsClient runs them in a copy of the caller's context.
+_current: ContextVar[Optional[UpdateStats]] = ContextVar('update_stats', default=None)
+
+
+def start_update(handler: str) -> Tuple[UpdateStats, object]:
+    stats = UpdateStats(handler)
+    return stats, _current.set(stats)
+
+
+def finish_update(stats: UpdateStats, token: object, seconds: float) -> None:
+    _current.reset(token)
+    update_seconds.observe(stats.handler, seconds)
+    update_sheets_calls.observe(stats.handler, stats.sheets_calls)
+    update_sheets_bytes.observe(stats.handler, stats.sheets_bytes)
+    update_telegram_seconds.observe(stats.handler, stats.telegram_seconds)
+
+
+def set_handler(name: str) -> None:
+    """Name the handler of the current update, e.g. the callback route's function"""
+    stats = _current.get()
+    if stats is not None:
+        stats.handler = name
+
+
+def record_sheets_call(method: str, seconds: float, size: int) -> None:
+    sheets_request_seconds.observe(method, seconds)
+    sheets_response_bytes.observe(method, size)
+    stats = _current.get()
+    if stats is not None:
+        stats.sheets_calls += 1
+        stats.sheets_bytes += size
+
+
+def record_telegram_call(method: str, seconds: float) -> None:
+    telegram_request_seconds.observe(method, seconds)
+    stats = _current.get()
+    if stats is not None:
+        stats.telegram_seconds += seconds
+
+
+class InstrumentedRequest(HTTPXRequest):
+    """HTTPXRequest that times every Bot API call by method name"""
+
+    async def do_request(self, url: str, method: str, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await super().do_request(url, method, *args, **kwargs)
+        finally:
+            record_telegram_call(url.rsplit('/', 1)[-1], time.perf_counter() - started)
+
+
+def render() -> str:
+    """All collectors in the Prometheus text exposition format"""
+    lines = []
+    for collector in COLLECTORS:
+        lines.extend(collector.render())
+    return '\n'.join(lines) + '\n'
+
+
+def summarize(previous: Snapshots) -> Tuple[List[str], Snapshots]:
+    """One line per handler for updates handled since the `previous` snapshots"""
+    current = {histogram.name: histogram.snapshot() for histogram in
+               (update_seconds, update_sheets_calls, update_sheets_bytes, update_telegram_seconds)}
+
+    def since(histogram: Histogram, handler: str) -> Tuple[List[int], float, int]:
+        counts, total, count = current[histogram.name].get(handler, ([], 0.0, 0))
+        before = previous.get(histogram.name, {}).get(handler, ([0] * len(counts), 0.0, 0))
+        return [now - then for now, then in zip(counts, before[0])], total - before[1], count - before[2]
+
+    lines = []
+    for handler in sorted(current[update_seconds.name]):
+        delta, _, handled = since(update_seconds, handler)
+        if handled <= 0:
+            continue
+        lines.append(
+            f"{handler}: {handled} updates, "
+            f"p50 {quantile(update_seconds.buckets, delta, 0.5) * 1000:.0f} ms, "
+            f"p95 {quantile(update_seconds.buckets, delta, 0.95) * 1000:.0f} ms, "
+            f"{since(update_sheets_calls, handler)[1] / handled:.1f} Sheets calls, "
+            f"{since(update_sheets_bytes, handler)[1] / handled:.0f} Sheets bytes, "
+            f"{since(update_telegram_seconds, handler)[1] / handled * 1000:.0f} ms Telegram per update"
+        )
+    return lines, current
+
+
+async def run_summary_logger(interval: float = METRICS_LOG_INTERVAL) -> None:
+    """Log per-handler latency and cost every `interval` seconds"""
+    previous: Snapshots = {}
+    while True:
+        await asyncio.sleep(interval)
+        lines, previous = summarize(previous)
+        if lines:
+            logger.info(f"Handler stats for the last {interval:.0f} s:\n  " + '\n  '.join(lines))
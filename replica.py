@@ -0,0 +1,337 @@
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+from sheet_rows import Columns, Row
+
+logger = logging.getLogger(__name__)
+
+# Natural key of each worksheet; None means rows are keyed by their sheet row number
+PRIMARY_KEYS = {
+    'users': 'user_id',
+    'yoga_registrations': 'id',
+    'events': 'id',
+    'schedule': None,
+}
+
+# Worksheets synced between full syncs by fetching only the rows past the last seen one.
+# Registrations only grow at the bottom. Users also get in-place language changes,
+# but the bot mirrors its own into the replica as it makes them, so only hand edits
+# wait for the next full sync. Events and schedule are small and edited by hand
+# anywhere in the sheet, so they are re-read in full and replaced only when changed.
+TAIL_SYNCED = {'yoga_registrations', 'users'}
+
+INDEXES = [
+    ('yoga_registrations', 'date'),
+    ('yoga_registrations', 'registered_at'),
+    ('yoga_registrations', 'class_type'),
+    ('events', 'date'),
+]
+
+
+class SheetsReplica:
+    """Local SQLite copy of the spreadsheet used as the primary read store
+
+    Reads never touch the network. `sync` reconciles the copy with the
+    spreadsheet: append-only sheets fetch only rows past the last seen row,
+    the rest are re-read and replaced only when their content changed.
+    """
+
+    def __init__(self, path: str, headers: Dict[str, List[str]], full_sync_every: int = 10):
+        self.path = path
+        self.headers = headers
+        self.columns = {name: Columns(columns) for name, columns in headers.items()}
+        self.full_sync_every = full_sync_every
+        self._syncs = 0
+        self._ready = False
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._create_schema()
+
+    def _create_schema(self) -> None:
+        with self._lock:
+            for name, columns in self.headers.items():
+                key = PRIMARY_KEYS.get(name)
+                column_defs = ", ".join(
+                    f'"{column}" TEXT PRIMARY KEY' if column == key else f'"{column}" TEXT' for column in columns
+                )
+                if key is None:
+                    column_defs = f"row_number INTEGER PRIMARY KEY, {column_defs}"
+                self._conn.execute(f'CREATE TABLE IF NOT EXISTS "{name}" ({column_defs})')
+            for table, column in INDEXES:
+                self._conn.execute(f'CREATE INDEX IF NOT EXISTS "idx_{table}_{column}" ON "{table}" ("{column}")')
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sync_state ("
+                " worksheet TEXT PRIMARY KEY, row_count INTEGER NOT NULL,"
+                " checksum TEXT, synced_at REAL NOT NULL)"
+            )
+
+    @property
+    def ready(self) -> bool:
+        """True once every worksheet has been synced at least once (possibly by an earlier run)"""
+        if not self._ready:
+            with self._lock:
+                synced = self._conn.execute("SELECT COUNT(*) FROM sync_state").fetchone()[0]
+            self._ready = synced >= len(self.headers)
+        return self._ready
+
+    # Reads
+
+    def query(self, table: str, where: str = '', params: Sequence[Any] = (),
+              order_by: str = '', limit: Optional[int] = None, offset: int = 0) -> List[Row]:
+        """Return rows in sheet column order; `where` and `order_by` are trusted SQL fragments"""
+        columns = ", ".join(f'"{column}"' for column in self.headers[table])
+        sql = f'SELECT {columns} FROM "{table}"'
+        if where:
+            sql += f" WHERE {where}"
+        if order_by:
+            sql += f" ORDER BY {order_by}"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)} OFFSET {int(offset)}"
+        with self._lock:
+            rows = self._fetch_values(sql, params)
+        return self.columns[table].rows(rows)
+
+    def _fetch_values(self, sql: str, params: Sequence[Any]) -> List[tuple]:
+        """Plain tuples instead of sqlite3.Row, which the callers would only copy"""
+        cursor = self._conn.cursor()
+        cursor.row_factory = None
+        return cursor.execute(sql, tuple(params)).fetchall()
+
+    def count(self, table: str, where: str = '', params: Sequence[Any] = ()) -> int:
+        sql = f'SELECT COUNT(*) FROM "{table}"'
+        if where:
+            sql += f" WHERE {where}"
+        with self._lock:
+            return self._conn.execute(sql, tuple(params)).fetchone()[0]
+
+    def iter_rows(self, table: str, where: str = '', params: Sequence[Any] = (),
+                  chunk_size: int = 1000) -> Iterator[Row]:
+        """Yield rows in insertion order, reading chunk_size rows at a time by rowid"""
+        columns = ", ".join(f'"{column}"' for column in self.headers[table])
+        table_columns = self.columns[table]
+        condition = f" AND ({where})" if where else ""
+        last_rowid = 0
+        while True:
+            with self._lock:
+                rows = self._fetch_values(
+                    f'SELECT rowid, {columns} FROM "{table}" WHERE rowid > ?{condition} ORDER BY rowid LIMIT ?',
+                    (last_rowid, *params, chunk_size)
+                )
+            for row in rows:
+                yield table_columns.row(row[1:])
+            if len(rows) < chunk_size:
+                return
+            last_rowid = rows[-1][0]
+
+    def distinct(self, table: str, column: str, where: str = '', params: Sequence[Any] = (),
+                 descending: bool = False, limit: Optional[int] = None) -> List[str]:
+        """Distinct non-empty values of a column, sorted"""
+        sql = f'SELECT DISTINCT "{column}" FROM "{table}" WHERE "{column}" != \'\''
+        if where:
+            sql += f" AND ({where})"
+        sql += f' ORDER BY "{column}"' + (" DESC" if descending else "")
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        with self._lock:
+            return [row[0] for row in self._conn.execute(sql, tuple(params)).fetchall()]
+
+    def max_id(self, table: str) -> int:
+        """Largest numeric value of the table's primary key (0 if there are none)"""
+        key = PRIMARY_KEYS[table]
+        with self._lock:
+            row = self._conn.execute(
+                f'SELECT MAX(CAST("{key}" AS INTEGER)) FROM "{table}" WHERE "{key}" GLOB \'[0-9]*\''
+            ).fetchone()
+        return row[0] or 0
+
+    def get_user_language(self, user_id: int) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute('SELECT language FROM users WHERE user_id = ?', (str(user_id),)).fetchone()
+        return row[0] if row else None
+
+    # Writes made by this process, mirrored before the sheet itself is updated
+
+    def upsert(self, table: str, values: Sequence[Any]) -> None:
+        """Insert or replace a row given in sheet column order"""
+        with self._lock:
+            self._upsert_rows(table, [values])
+
+    def _upsert_rows(self, table: str, rows: List[Sequence[Any]]) -> None:
+        """Insert or replace rows by primary key (caller holds the lock)"""
+        columns = self.headers[table]
+        placeholders = ", ".join("?" for _ in columns)
+        names = ", ".join(f'"{column}"' for column in columns)
+        batch = []
+        for values in rows:
+            row = [None if value is None else str(value) for value in values][:len(columns)]
+            batch.append(row + [''] * (len(columns) - len(row)))
+        self._conn.executemany(f'INSERT OR REPLACE INTO "{table}" ({names}) VALUES ({placeholders})', batch)
+
+    # Synchronization
+
+    def sync(self, worksheet: Callable[[str], Any],
+             pending: Optional[Callable[[], Dict[str, List[List[Any]]]]] = None) -> Set[str]:
+        """Reconcile every table with the spreadsheet and return the names of the tables that changed
+
+        `worksheet(name)` returns a gspread worksheet. `pending()` returns rows written
+        locally but not flushed to the sheet yet, by table; it is called inside each
+        table's write transaction, after the sheet was read, and its rows are applied
+        on top of what was read, so a sync never drops them.
+        """
+        def pending_rows(name: str) -> Callable[[], List[List[Any]]]:
+            return lambda: pending().get(name, []) if pending is not None else []
+
+        full = self._syncs % self.full_sync_every == 0
+        self._syncs += 1
+        changed = set()
+        for name in self.headers:
+            started = time.monotonic()
+            try:
+                if name in TAIL_SYNCED and not full:
+                    added = self._sync_tail(name, worksheet(name), pending_rows(name))
+                    logger.debug(f"Replica {name}: {added} new rows in {time.monotonic() - started:.2f}s")
+                    replaced = added > 0
+                else:
+                    replaced = self._sync_full(name, worksheet(name), pending_rows(name))
+                    logger.debug(f"Replica {name}: {'replaced' if replaced else 'unchanged'} "
+                                 f"in {time.monotonic() - started:.2f}s")
+                if replaced:
+                    changed.add(name)
+            except Exception as e:
+                logger.error(f"Error syncing replica table {name}: {e}")
+        return changed
+
+    def _sync_state(self, name: str) -> Optional[sqlite3.Row]:
+        with self._lock:
+            return self._conn.execute("SELECT * FROM sync_state WHERE worksheet = ?", (name,)).fetchone()
+
+    def _sync_tail(self, name: str, worksheet, pending: Callable[[], List[List[Any]]]) -> int:
+        state = self._sync_state(name)
+        if state is None:
+            return int(self._sync_full(name, worksheet, pending))
+
+        # Row 1 is the header, so the first unseen data row is row_count + 2.
+        # Columns are taken in the sheet's creation order (see WORKSHEET_HEADERS)
+        start = state['row_count'] + 2
+        values = worksheet.get(f"A{start}:{column_letter(len(self.headers[name]))}")
+        rows = [row for row in values if any(row)]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._insert_rows(name, rows, start)
+                self._upsert_rows(name, pending())
+                self._conn.execute(
+                    "UPDATE sync_state SET row_count = ?, synced_at = ? WHERE worksheet = ?",
+                    (state['row_count'] + len(values), time.time(), name)
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return len(rows)
+
+    def _sync_full(self, name: str, worksheet, pending: Callable[[], List[List[Any]]]) -> bool:
+        key = PRIMARY_KEYS.get(name)
+        if key is not None:
+            with self._lock:
+                before = self._keyed_rows(name)
+        values = worksheet.get_all_values()
+        header, rows = (values[0], values[1:]) if values else (self.headers[name], [])
+        checksum = hashlib.sha1(repr(values).encode('utf-8')).hexdigest()
+
+        state = self._sync_state(name)
+        if state is not None and state['checksum'] == checksum:
+            with self._lock:
+                self._conn.execute("UPDATE sync_state SET synced_at = ? WHERE worksheet = ?", (time.time(), name))
+            return False
+
+        # Map sheet columns to replica columns by header name, in case the sheet was rearranged
+        positions = [header.index(column) if column in header else None for column in self.headers[name]]
+        ordered = [[row[i] if i is not None and i < len(row) else '' for i in positions] for row in rows]
+
+        with self._lock:
+            # IMMEDIATE: the rows compared with `before` must not change before they are written
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if key is None:
+                    self._conn.execute(f'DELETE FROM "{name}"')
+                    self._insert_rows(name, ordered, 2)
+                else:
+                    self._merge_rows(name, ordered, before)
+                self._upsert_rows(name, pending())
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO sync_state (worksheet, row_count, checksum, synced_at) VALUES (?, ?, ?, ?)",
+                    (name, len(rows), checksum, time.time())
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return True
+
+    def _keyed_rows(self, name: str) -> Dict[str, Tuple[str, ...]]:
+        """{primary key: row} of a table (caller holds the lock)"""
+        columns = self.headers[name]
+        position = columns.index(PRIMARY_KEYS[name])
+        names = ", ".join(f'"{column}"' for column in columns)
+        return {row[position]: tuple(row) for row in self._conn.execute(f'SELECT {names} FROM "{name}"')}
+
+    def _merge_rows(self, name: str, rows: List[List[str]], before: Dict[str, Tuple[str, ...]]) -> None:
+        """Make a keyed table match the sheet's rows, except rows written since `before` was read
+
+        Those were upserted while the sheet was being read (an added event, or
+        another worker's write) and are newer than what was read, so they are
+        neither overwritten nor deleted. Caller holds the lock and a transaction.
+        """
+        columns = self.headers[name]
+        position = columns.index(PRIMARY_KEYS[name])
+        current = self._keyed_rows(name)
+        untouched = {key for key, row in current.items() if before.get(key) == row}
+
+        seen = set()
+        merged = []
+        for row in rows:
+            row = list(row[:len(columns)]) + [''] * (len(columns) - len(row))
+            key = row[position]
+            if not key:
+                continue
+            seen.add(key)
+            if key not in current or key in untouched:
+                merged.append(row)
+        self._conn.executemany(f'DELETE FROM "{name}" WHERE "{PRIMARY_KEYS[name]}" = ?',
+                               [(key,) for key in untouched - seen])
+        self._upsert_rows(name, merged)
+
+    def _insert_rows(self, name: str, rows: List[List[str]], first_row_number: int) -> None:
+        """Insert rows (caller holds the lock and an open transaction)"""
+        columns = self.headers[name]
+        key = PRIMARY_KEYS.get(name)
+        names = ", ".join(f'"{column}"' for column in columns)
+        placeholders = ", ".join("?" for _ in columns)
+        if key is None:
+            names = f"row_number, {names}"
+            placeholders = f"?, {placeholders}"
+
+        batch = []
+        for offset, row in enumerate(rows):
+            row = list(row[:len(columns)]) + [''] * (len(columns) - len(row))
+            if key is not None and not row[columns.index(key)]:
+                continue
+            batch.append([first_row_number + offset] + row if key is None else row)
+        self._conn.executemany(f'INSERT OR REPLACE INTO "{name}" ({names}) VALUES ({placeholders})', batch)
+
+
+def column_letter(index: int) -> str:
+    """1 -> A, 27 -> AA"""
+    letters = ''
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
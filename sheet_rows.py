@@ -0,0 +1,73 @@
+from collections.abc import Mapping
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Sequence, Tuple
+
+
+class Columns:
+    """Header -> column index map of a worksheet, built once and shared by all of its rows"""
+
+    __slots__ = ('names', 'index')
+
+    def __init__(self, names: Sequence[str]):
+        self.names: Tuple[str, ...] = tuple(names)
+        # On duplicate headers the first column wins
+        self.index: Dict[str, int] = {}
+        for position, name in enumerate(self.names):
+            self.index.setdefault(name, position)
+
+    def row(self, values: Sequence[Any]) -> 'Row':
+        """Row over `values`, padded with '' or cut to the header width like get_all_records"""
+        width = len(self.names)
+        if len(values) != width:
+            values = list(values[:width]) + [''] * (width - len(values))
+        return Row(self, tuple(values))
+
+    def rows(self, values: List[Sequence[Any]]) -> List['Row']:
+        return [self.row(row) for row in values]
+
+
+@lru_cache(maxsize=64)
+def columns_for(header: Tuple[str, ...]) -> Columns:
+    """The shared Columns of a header, so re-reading a worksheet does not rebuild its map"""
+    return Columns(header)
+
+
+class Row(Mapping):
+    """One worksheet row: a tuple of values and its worksheet's Columns
+
+    Reads like the read-only dict get_all_records returns (row['id'],
+    row.get('date', '')), but holds no per-row keys, so a row costs a
+    small object and a tuple instead of a dict.
+    """
+
+    __slots__ = ('columns', 'values')
+
+    def __init__(self, columns: Columns, values: Tuple[Any, ...]):
+        self.columns = columns
+        self.values = values
+
+    def __getitem__(self, key: str) -> Any:
+        return self.values[self.columns.index[key]]
+
+    def get(self, key: str, default: Any = None) -> Any:
+        position = self.columns.index.get(key)
+        return default if position is None else self.values[position]
+
+    def __contains__(self, key: object) -> bool:
+        return key in self.columns.index
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.columns.index)
+
+    def __len__(self) -> int:
+        return len(self.columns.index)
+
+    def __repr__(self) -> str:
+        return f"Row({dict(self)!r})"
+
+
+def rows_from_values(values: List[List[Any]]) -> List[Row]:
+    """Rows of a get_all_values() result whose first row is the header"""
+    if not values:
+        return []
+    return columns_for(tuple(values[0])).rows(values[1:])
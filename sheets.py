@@ -1,14 +1,202 @@
 import os
+import time
+import asyncio
+import functools
+import sqlite3
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import gspread
 from oauth2client.service_account import ServiceAccountCredentials
 import logging
-from typing import List, Dict, Any, Tuple, Optional
+from typing import List, Dict, Any, Tuple, Optional, Callable, NamedTuple, Iterator
 from datetime import datetime
-from config import SPREADSHEET_ID, CREDENTIALS_FILE
+from config import (
+    SPREADSHEET_ID, CREDENTIALS_FILE, USER_CACHE_SIZE, SHEETS_MAX_WORKERS, WORKERS, STATE_DB_PATH,
+    SHEETS_CACHE_TTL, SHEETS_CACHE_REFRESH_INTERVAL, REGISTRATIONS_PAGE_SIZE, EXPORT_CHUNK_SIZE,
+    REPLICA_ENABLED, REPLICA_DB_PATH, REPLICA_SYNC_INTERVAL, REPLICA_FULL_SYNC_EVERY, SHEETS_SCHEMA_CACHE
+)
+from utils.cache import LRUCache, SnapshotCache
+from sheets_queue import SheetsWriteQueue
+from replica import SheetsReplica, column_letter
+from event_index import EventIndex, EventPage
+from sheet_rows import Columns, Row, rows_from_values
+from export import export_rows
+import metrics
+from sheets_scheduler import scheduler as sheets_scheduler
+import sheets_schema
 
 logger = logging.getLogger(__name__)
 
+# Minimum delay between reconnection attempts after a failed initialization
+INIT_RETRY_INTERVAL = 30
+# Upper bound for the delay between warm-up attempts (seconds)
+MAX_WARM_UP_DELAY = 300
+
+# Header row of every worksheet the bot uses, with the initial size of new sheets
+WORKSHEET_HEADERS = {
+    'users': ["user_id", "language", "last_activity"],
+    'yoga_registrations': ["id", "name", "email", "date", "class_type", "comment", "registered_at"],
+    'events': ["id", "title_uk", "title_en", "title_de", "date", "time",
+               "location", "price", "description_uk", "description_en", "description_de"],
+    'schedule': ["day", "time", "class_uk", "class_en", "class_de", "notes"],
+}
+WORKSHEET_ROWS = {'users': 1000, 'yoga_registrations': 1000, 'events': 50, 'schedule': 50}
+
+class RegistrationsPage(NamedTuple):
+    """A page of registrations, newest first; cursors are the ids of the first and last rows"""
+    rows: List[Row]
+    has_prev: bool
+    has_next: bool
+    total: int
+
+
+class IdAllocator:
+    """Monotonic in-memory ID counter, seeded once from the sheet on first use"""
+    
+    def __init__(self, seed: Callable[[], int]):
+        self._seed = seed
+        self._next: Optional[int] = None
+        self._lock = threading.Lock()
+    
+    def next_id(self) -> int:
+        """Reserve and return the next ID; safe to call from concurrent signups"""
+        with self._lock:
+            if self._next is None:
+                self._next = self._seed() + 1
+            value = self._next
+            self._next += 1
+            return value
+    
+    def reset(self) -> None:
+        """Forget the counter so the next call re-seeds from the sheet"""
+        with self._lock:
+            self._next = None
+
+
+class SharedIdAllocator(IdAllocator):
+    """IdAllocator whose counter lives in SQLite, so worker processes never hand out the same ID"""
+    
+    def __init__(self, name: str, seed: Callable[[], int], path: str = STATE_DB_PATH):
+        super().__init__(seed)
+        self.name = name
+        self._seeded = False
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS id_sequences (name TEXT PRIMARY KEY, last_id INTEGER NOT NULL)")
+    
+    def next_id(self) -> int:
+        with self._lock:
+            # Each process seeds once, so rows added to the sheet by hand are never reused
+            seed = None if self._seeded else self._seed()
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if seed is not None:
+                    self._conn.execute(
+                        "INSERT INTO id_sequences (name, last_id) VALUES (?, ?)"
+                        " ON CONFLICT (name) DO UPDATE SET last_id = MAX(last_id, excluded.last_id)",
+                        (self.name, seed)
+                    )
+                self._conn.execute("UPDATE id_sequences SET last_id = last_id + 1 WHERE name = ?", (self.name,))
+                value = self._conn.execute("SELECT last_id FROM id_sequences WHERE name = ?", (self.name,)).fetchone()[0]
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._seeded = True
+            return value
+    
+    def reset(self) -> None:
+        with self._lock:
+            self._seeded = False
+
+
+def create_id_allocator(name: str, seed: Callable[[], int]) -> IdAllocator:
+    """Process-local allocator, or a shared one when several worker processes write to the sheet"""
+    return SharedIdAllocator(name, seed) if WORKERS > 1 else IdAllocator(seed)
+
+
+class SharedVersion:
+    """Counter in SQLite that a worker process bumps to make the others reload a cached worksheet"""
+    
+    def __init__(self, name: str, path: str = STATE_DB_PATH):
+        self.name = name
+        self._last = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS cache_versions (name TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+    
+    def get(self) -> int:
+        with self._lock:
+            try:
+                row = self._conn.execute("SELECT version FROM cache_versions WHERE name = ?", (self.name,)).fetchone()
+                self._last = row[0] if row else 0
+            except sqlite3.Error as e:
+                # Keep serving the current snapshot rather than reloading on every read
+                logger.error(f"Error reading {self.name} cache version: {e}")
+            return self._last
+    
+    def bump(self) -> None:
+        with self._lock:
+            try:
+                self._conn.execute(
+                    "INSERT INTO cache_versions (name, version) VALUES (?, 1)"
+                    " ON CONFLICT (name) DO UPDATE SET version = version + 1",
+                    (self.name,)
+                )
+            except sqlite3.Error as e:
+                logger.error(f"Error bumping {self.name} cache version: {e}")
+
+
+def create_cache_version(name: str) -> Optional[SharedVersion]:
+    """A shared version for a cached worksheet when there are several worker processes, else None"""
+    return SharedVersion(name) if WORKERS > 1 else None
+
+
+class InstrumentedGspreadClient(gspread.Client):
+    """gspread client that sends every API request through the quota scheduler and reports its latency and size"""
+
+    def request(self, method, endpoint, *args, **kwargs):
+        operation = _sheets_operation(method, endpoint)
+
+        def attempt():
+            started = time.perf_counter()
+            size = 0
+            try:
+                response = gspread.Client.request(self, method, endpoint, *args, **kwargs)
+                size = len(response.content)
+                return response
+            except gspread.exceptions.APIError as e:
+                size = len(e.response.content)
+                raise
+            finally:
+                metrics.record_sheets_call(operation, time.perf_counter() - started, size)
+
+        # An append sent twice adds its rows twice; the write queue retries it safely instead
+        return sheets_scheduler.call('read' if method.lower() == 'get' else 'write', attempt,
+                                     idempotent=operation != 'append')
+
+
+# Custom methods of the Sheets API, sent as ".../resource:method"
+SHEETS_API_METHODS = frozenset({'append', 'batchGet', 'batchUpdate', 'batchClear', 'clear', 'copyTo'})
+
+
+def _sheets_operation(method: str, endpoint: str) -> str:
+    """Metrics label for a Sheets API request: 'append', 'batchGet', 'values.get', ..."""
+    action = endpoint.rsplit(':', 1)[-1]
+    if action in SHEETS_API_METHODS:
+        return action
+    if '/values/' in endpoint:
+        return f"values.{method.lower()}"
+    return method.lower()
+
+
 class SheetsClient:
+    # Process-wide user_id -> language cache shared by all client instances,
+    # warmed from the users sheet and updated in place by set_user_language
+    language_cache = LRUCache(USER_CACHE_SIZE)
+    language_cache_complete = False
+    
     def __init__(self):
         self.scope = [
             'https://spreadsheets.google.com/feeds',
@@ -17,10 +205,72 @@ class SheetsClient:
         self.client = None
         self.sheet = None
         self.initialized = False
-        self.initialize()
+        # Worksheet handles resolved once and reused by every call
+        self._worksheets: Dict[str, gspread.Worksheet] = {}
+        self.schema: Optional[sheets_schema.Schema] = None
+        # False while the worksheet handles come from the schema cache and have not been checked yet
+        self.schema_checked = False
+        # Set once warm_up has checked the spreadsheet and loaded the language cache
+        self.warmed_up = False
+        self._init_lock = threading.Lock()
+        self._last_init_attempt = 0.0
+        self.registration_ids = create_id_allocator('yoga_registrations', lambda: self._max_id('yoga_registrations'))
+        self.event_ids = create_id_allocator('events', lambda: self._max_id('events'))
+        self.write_queue = SheetsWriteQueue(self)
+        # Local read store; reads keep working from it while Sheets is slow or down
+        self.replica = SheetsReplica(REPLICA_DB_PATH, WORKSHEET_HEADERS, REPLICA_FULL_SYNC_EVERY) if REPLICA_ENABLED else None
+        # Snapshots of the small read-mostly worksheets; with several workers a
+        # change made by one of them is announced to the others through the versions
+        self.cache_versions = {name: create_cache_version(name) for name in ('events', 'schedule')}
+        self.events_cache = SnapshotCache(self._load_events, SHEETS_CACHE_TTL, 'events',
+                                          self._version_reader('events'))
+        self.schedule_cache = SnapshotCache(self._load_schedule, SHEETS_CACHE_TTL, 'schedule',
+                                            self._version_reader('schedule'))
+    
+    def _version_reader(self, name: str) -> Optional[Callable[[], int]]:
+        version = self.cache_versions[name]
+        return version.get if version is not None else None
+    
+    def _announce_change(self, name: str) -> None:
+        """Make other worker processes reload their snapshot of a worksheet"""
+        version = self.cache_versions[name]
+        if version is not None:
+            version.bump()
+    
+    def _ensure_initialized(self) -> bool:
+        """Connect on first use; retry failed connections at most every INIT_RETRY_INTERVAL seconds"""
+        if self.initialized:
+            return True
+        
+        with self._init_lock:
+            if self.initialized:
+                return True
+            if self._last_init_attempt and time.monotonic() - self._last_init_attempt < INIT_RETRY_INTERVAL:
+                return False
+            self._last_init_attempt = time.monotonic()
+            return self.initialize()
+    
+    def _replica_ready(self) -> bool:
+        return self.replica is not None and self.replica.ready
+    
+    def _readable(self) -> bool:
+        """True if reads can be served, from the replica or from Sheets"""
+        return self._replica_ready() or self._ensure_initialized()
+    
+    def ready(self) -> bool:
+        """True if reads can be served right now without waiting for a connection"""
+        return self.initialized or self._replica_ready()
+    
+    def _worksheet(self, name: str) -> gspread.Worksheet:
+        """Return a cached worksheet handle"""
+        worksheet = self._worksheets.get(name)
+        if worksheet is None:
+            worksheet = self.sheet.worksheet(name)
+            self._worksheets[name] = worksheet
+        return worksheet
         
     def initialize(self) -> bool:
-        """Initialize Google Sheets connection"""
+        """Connect to the spreadsheet; schema checks and cache warming are left to warm_up"""
         try:
             if not os.path.exists(CREDENTIALS_FILE):
                 logger.error(f"Credentials file {CREDENTIALS_FILE} not found")
@@ -31,107 +281,152 @@ class SheetsClient:
                 return False
                 
             self.creds = ServiceAccountCredentials.from_json_keyfile_name(CREDENTIALS_FILE, self.scope)
-            self.client = gspread.authorize(self.creds)
-            self.sheet = self.client.open_by_key(SPREADSHEET_ID)
-            
-            # Ensure required worksheets exist
-            self._ensure_worksheet_exists('users')
-            self._ensure_worksheet_exists('yoga_registrations')
-            self._ensure_worksheet_exists('events')
-            self._ensure_worksheet_exists('schedule')
+            self.client = gspread.authorize(self.creds, client_factory=InstrumentedGspreadClient)
+            # The schema cached by the previous run lets a restart connect without any
+            # API request; otherwise it costs a single metadata request
+            schema = sheets_schema.load_schema(SHEETS_SCHEMA_CACHE, SPREADSHEET_ID, list(WORKSHEET_HEADERS))
+            self.schema_checked = schema is None
+            if schema is None:
+                schema = self._fetch_schema()
+            self._open_schema(schema)
             
             self.initialized = True
-            logger.info(f"Successfully connected to Google Sheets: {self.sheet.title}")
+            logger.info(f"Successfully connected to Google Sheets: {self.sheet.title}"
+                        f"{'' if self.schema_checked else ' (cached schema)'}")
             return True
         except Exception as e:
             logger.error(f"Failed to initialize Google Sheets: {e}")
             return False
-            
-    def _ensure_worksheet_exists(self, name: str) -> None:
-        """Ensure a worksheet exists, create it if not"""
+    
+    def _fetch_schema(self) -> sheets_schema.Schema:
+        """Read the schema from the spreadsheet and cache it for the next start"""
+        schema = sheets_schema.fetch_schema(self.client, SPREADSHEET_ID, list(WORKSHEET_HEADERS))
+        sheets_schema.save_schema(SHEETS_SCHEMA_CACHE, schema)
+        return schema
+    
+    def _open_schema(self, schema: sheets_schema.Schema) -> None:
+        self.sheet, self._worksheets = sheets_schema.open_schema(self.client, schema)
+        self.schema = schema
+    
+    def warm_up(self, create_worksheets: bool = True) -> bool:
+        """Startup work deferred until the bot is taking updates; False if it has to be retried"""
+        if not self._ensure_initialized():
+            return False
         try:
-            try:
-                self.sheet.worksheet(name)
-            except gspread.exceptions.WorksheetNotFound:
-                if name == 'users':
-                    worksheet = self.sheet.add_worksheet(title=name, rows=1000, cols=3)
-                    worksheet.append_row(["user_id", "language", "last_activity"])
-                elif name == 'yoga_registrations':
-                    worksheet = self.sheet.add_worksheet(title=name, rows=1000, cols=7)
-                    worksheet.append_row(["id", "name", "email", "date", "class_type", "comment", "registered_at"])
-                elif name == 'events':
-                    worksheet = self.sheet.add_worksheet(title=name, rows=50, cols=10)
-                    worksheet.append_row(["id", "title_uk", "title_en", "title_de", "date", "time", 
-                                         "location", "price", "description_uk", "description_en", "description_de"])
-                elif name == 'schedule':
-                    worksheet = self.sheet.add_worksheet(title=name, rows=50, cols=6)
-                    worksheet.append_row(["day", "time", "class_uk", "class_en", "class_de", "notes"])
+            # Worksheets may have been renamed or deleted since the cached schema was saved
+            if not self.schema_checked:
+                self._open_schema(self._fetch_schema())
+                self.schema_checked = True
+            # With several worker processes only one of them creates worksheets
+            created = [name for name in WORKSHEET_HEADERS
+                       if create_worksheets and name not in self.schema['worksheets']]
+            for name in created:
+                header = WORKSHEET_HEADERS[name]
+                worksheet = self.sheet.add_worksheet(title=name, rows=WORKSHEET_ROWS[name], cols=len(header))
+                worksheet.append_row(header)
                 logger.info(f"Created worksheet: {name}")
+            if created:
+                self._open_schema(self._fetch_schema())
+            for name, found in sheets_schema.header_mismatches(self.schema, WORKSHEET_HEADERS).items():
+                logger.error(f"Worksheet {name} has header {found}, expected {WORKSHEET_HEADERS[name]}")
         except Exception as e:
-            logger.error(f"Error ensuring worksheet {name} exists: {e}")
-    
-    def set_user_language(self, user_id: int, language: str) -> bool:
-        """Set user language preference"""
-        if not self.initialized:
+            logger.error(f"Error checking the spreadsheet schema: {e}")
             return False
-            
+        self.warmed_up = self._load_user_languages()
+        return self.warmed_up
+    
+    def _max_id(self, name: str) -> int:
+        """Return the largest ID used so far: in the sheet, in the replica or in rows not flushed yet"""
+        ids = [int(value) for value in self._worksheet(name).col_values(1)[1:] if value.isdigit()]
+        # Rows restored from the write queue spool are not in the sheet yet
+        candidates = [max(ids, default=0), self.write_queue.pending_max_id(name)]
+        # The replica may hold rows mirrored by another worker
+        if self.replica is not None:
+            candidates.append(self.replica.max_id(name))
+        return max(candidates)
+    
+    def _load_user_languages(self) -> bool:
+        """Warm the language cache with a single bulk read of the users sheet; False if it failed"""
         try:
-            worksheet = self.sheet.worksheet('users')
-            
-            # Check if user exists
-            try:
-                cell = worksheet.find(str(user_id))
-                # Update language
-                worksheet.update_cell(cell.row, 2, language)
-                worksheet.update_cell(cell.row, 3, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-            except gspread.exceptions.CellNotFound:
-                # Add new user
-                worksheet.append_row([str(user_id), language, datetime.now().strftime("%Y-%m-%d %H:%M:%S")])
-                
+            rows = self._worksheet('users').get_all_values()
+            self.language_cache.clear()
+            for row in rows[1:]:
+                if row and row[0].isdigit() and len(row) >= 2 and row[1]:
+                    self.language_cache.set(int(row[0]), row[1])
+            # Changes restored from the write queue spool are newer than the sheet
+            self.language_cache.update(self.write_queue.pending_languages().items())
+            SheetsClient.language_cache_complete = True
+            logger.info(f"Loaded {len(self.language_cache)} user languages into cache")
             return True
         except Exception as e:
-            logger.error(f"Error setting user language: {e}")
+            logger.error(f"Error loading user languages: {e}")
+            SheetsClient.language_cache_complete = False
             return False
     
-    def get_user_language(self, user_id: int) -> str:
-        """Get user language preference"""
-        if not self.initialized:
+    def set_user_language(self, user_id: int, language: str) -> bool:
+        """Set user language preference"""
+        # Update the cache immediately; the sheet is written by the batched write queue,
+        # which spools the change, so it is kept even while Sheets is unreachable
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.language_cache.set(user_id, language)
+        self.write_queue.enqueue_language(user_id, language, timestamp)
+        if self.replica is not None:
+            self.replica.upsert('users', [user_id, language, timestamp])
+        return True
+    
+    def get_user_language(self, user_id: int) -> Optional[str]:
+        """Get user language preference; None if it can't be looked up right now"""
+        language = self.language_cache.get(user_id)
+        if language:
+            return language
+        
+        if self._replica_ready():
+            language = self.replica.get_user_language(user_id)
+            if language:
+                self.language_cache.set(user_id, language)
+            return language or 'uk'
+        
+        if not self._ensure_initialized():
+            return self._last_known_language(user_id)
+        
+        # The cache holds every known user unless entries were evicted,
+        # so a miss on a complete cache means the user has no preference yet
+        if self.language_cache_complete and not self.language_cache.evictions:
             return 'uk'
             
         try:
-            worksheet = self.sheet.worksheet('users')
+            worksheet = self._worksheet('users')
             
             try:
                 cell = worksheet.find(str(user_id))
-                return worksheet.cell(cell.row, 2).value
+                language = worksheet.cell(cell.row, 2).value
+                if language:
+                    self.language_cache.set(user_id, language)
+                return language
             except gspread.exceptions.CellNotFound:
                 return 'uk'  # Default language
         except Exception as e:
             logger.error(f"Error getting user language: {e}")
-            return 'uk'
+            return self._last_known_language(user_id)
+    
+    def _last_known_language(self, user_id: int) -> Optional[str]:
+        """Queued or replicated language while Sheets can't be asked; never a made-up default"""
+        language = self.write_queue.pending_languages().get(user_id)
+        if not language and self.replica is not None:
+            language = self.replica.get_user_language(user_id)
+        return language or None
     
     def add_yoga_registration(self, name: str, email: str, date: str, 
                              class_type: str, comment: str) -> Tuple[bool, str]:
         """Add a new yoga class registration"""
-        if not self.initialized:
+        if not self._ensure_initialized():
             return False, "Google Sheets not initialized"
             
         try:
-            worksheet = self.sheet.worksheet('yoga_registrations')
-            
             # Get next ID
-            try:
-                all_values = worksheet.get_all_values()
-                if len(all_values) <= 1:  # Only header row
-                    next_id = 1
-                else:
-                    ids = [int(row[0]) for row in all_values[1:] if row[0].isdigit()]
-                    next_id = max(ids) + 1 if ids else 1
-            except:
-                next_id = 1
+            next_id = self.registration_ids.next_id()
                 
-            # Add registration
-            worksheet.append_row([
+            row = [
                 next_id, 
                 name, 
                 email, 
@@ -139,79 +434,109 @@ class SheetsClient:
                 class_type, 
                 comment, 
                 datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            ])
+            ]
+            
+            # Queue registration for the next batched append
+            self.write_queue.enqueue_append('yoga_registrations', row)
+            if self.replica is not None:
+                self.replica.upsert('yoga_registrations', row)
             
             return True, f"Registration successful with ID {next_id}"
         except Exception as e:
             logger.error(f"Error adding yoga registration: {e}")
             return False, f"Error: {str(e)}"
     
-    def get_events(self) -> List[Dict[str, Any]]:
-        """Get all events"""
-        if not self.initialized:
+    def _load_events(self) -> EventIndex:
+        """Read all events from the replica or the sheet and index them by date and id"""
+        if self._replica_ready():
+            return EventIndex(self.replica.query('events'))
+        
+        return EventIndex(rows_from_values(self._worksheet('events').get_all_values()))
+    
+    def _load_schedule(self) -> List[Row]:
+        """Read the class schedule from the replica or the sheet, sorted by day of week"""
+        if self._replica_ready():
+            records = self.replica.query('schedule', order_by='row_number')
+        else:
+            records = rows_from_values(self._worksheet('schedule').get_all_values())
+        
+        # Sort by day of week
+        day_order = {
+            'Monday': 0, 'Tuesday': 1, 'Wednesday': 2, 
+            'Thursday': 3, 'Friday': 4, 'Saturday': 5, 'Sunday': 6
+        }
+        
+        records.sort(key=lambda x: day_order.get(x.get('day', ''), 7))
+        
+        return records
+    
+    def refresh_caches(self) -> None:
+        """Reload the events and schedule snapshots from the sheet"""
+        if not self._readable():
+            return
+        
+        for cache in (self.events_cache, self.schedule_cache):
+            try:
+                cache.refresh()
+            except Exception as e:
+                logger.error(f"Error refreshing {cache.name} cache: {e}")
+    
+    def get_events(self) -> List[Row]:
+        """Get upcoming events, soonest first"""
+        if not self._readable():
             return []
             
         try:
-            worksheet = self.sheet.worksheet('events')
-            
-            # Get all records
-            records = worksheet.get_all_records()
-            
-            # Sort by date (upcoming first)
-            today = datetime.now().strftime("%Y-%m-%d")
-            upcoming_events = [r for r in records if r.get('date', '') >= today]
-            upcoming_events.sort(key=lambda x: x.get('date', ''))
-            
-            return upcoming_events
+            return self.events_cache.get().upcoming()
         except Exception as e:
             logger.error(f"Error getting events: {e}")
             return []
     
-    def get_schedule(self) -> List[Dict[str, Any]]:
-        """Get class schedule"""
-        if not self.initialized:
-            return []
+    def get_event(self, event_id: str) -> Optional[Row]:
+        """Get an event by id"""
+        if not self._readable():
+            return None
             
         try:
-            worksheet = self.sheet.worksheet('schedule')
-            
-            # Get all records
-            records = worksheet.get_all_records()
-            
-            # Sort by day of week
-            day_order = {
-                'Monday': 0, 'Tuesday': 1, 'Wednesday': 2, 
-                'Thursday': 3, 'Friday': 4, 'Saturday': 5, 'Sunday': 6
-            }
+            return self.events_cache.get().get(event_id)
+        except Exception as e:
+            logger.error(f"Error getting event {event_id}: {e}")
+            return None
+    
+    def get_event_page(self, event_id: Optional[str] = None) -> Optional[EventPage]:
+        """Get an upcoming event with its neighbours; the first upcoming one if event_id is None"""
+        if not self._readable():
+            return None
             
-            records.sort(key=lambda x: day_order.get(x.get('day', ''), 7))
+        try:
+            return self.events_cache.get().page(event_id)
+        except Exception as e:
+            logger.error(f"Error getting event page: {e}")
+            return None
+    
+    def get_schedule(self) -> List[Row]:
+        """Get class schedule"""
+        if not self._readable():
+            return []
             
-            return records
+        try:
+            return list(self.schedule_cache.get())
         except Exception as e:
             logger.error(f"Error getting schedule: {e}")
             return []
     
     def add_event(self, event_data: Dict[str, str]) -> Tuple[bool, str]:
         """Add a new event"""
-        if not self.initialized:
+        if not self._ensure_initialized():
             return False, "Google Sheets not initialized"
             
         try:
-            worksheet = self.sheet.worksheet('events')
+            worksheet = self._worksheet('events')
             
             # Get next ID
-            try:
-                all_values = worksheet.get_all_values()
-                if len(all_values) <= 1:  # Only header row
-                    next_id = 1
-                else:
-                    ids = [int(row[0]) for row in all_values[1:] if row[0].isdigit()]
-                    next_id = max(ids) + 1 if ids else 1
-            except:
-                next_id = 1
+            next_id = self.event_ids.next_id()
                 
-            # Add event
-            worksheet.append_row([
+            row = [
                 next_id,
                 event_data.get('title_uk', ''),
                 event_data.get('title_en', ''),
@@ -223,23 +548,32 @@ class SheetsClient:
                 event_data.get('description_uk', ''),
                 event_data.get('description_en', ''),
                 event_data.get('description_de', '')
-            ])
+            ]
+            
+            # Add event
+            worksheet.append_row(row)
+            if self.replica is not None:
+                self.replica.upsert('events', row)
+            self._announce_change('events')
+            self.events_cache.invalidate()
             
             return True, f"Event added successfully with ID {next_id}"
         except Exception as e:
             logger.error(f"Error adding event: {e}")
             return False, f"Error: {str(e)}"
     
-    def get_all_registrations(self) -> List[Dict[str, Any]]:
+    def get_all_registrations(self) -> List[Row]:
         """Get all yoga registrations"""
-        if not self.initialized:
+        if not self._readable():
             return []
             
         try:
-            worksheet = self.sheet.worksheet('yoga_registrations')
+            if self._replica_ready():
+                return self.replica.query('yoga_registrations', order_by='registered_at DESC')
+            
+            worksheet = self._worksheet('yoga_registrations')
             
-            # Get all records
-            records = worksheet.get_all_records()
+            records = rows_from_values(worksheet.get_all_values())
             
             # Sort by registration date (newest first)
             records.sort(key=lambda x: x.get('registered_at', ''), reverse=True)
@@ -249,18 +583,271 @@ class SheetsClient:
             logger.error(f"Error getting registrations: {e}")
             return []
     
-    def get_all_users(self) -> List[Dict[str, Any]]:
+    def get_registrations_page(self, cursor: Optional[str] = None, newer: bool = False,
+                               date: str = '', class_type: str = '',
+                               limit: int = REGISTRATIONS_PAGE_SIZE) -> RegistrationsPage:
+        """Get a page of registrations, newest first, optionally filtered by class date and type
+
+        Without a cursor the newest page is returned. Otherwise the page holds the
+        rows older than the registration `cursor`, or newer than it if `newer` is set.
+        """
+        empty = RegistrationsPage([], False, False, 0)
+        if not self._readable():
+            return empty
+            
+        try:
+            if self._replica_ready():
+                return self._registrations_page_from_replica(cursor, newer, date, class_type, limit)
+            
+            # Without the replica the whole sheet has to be read and paged in memory
+            records = [
+                r for r in self.get_all_registrations()
+                if (not date or str(r.get('date', '')) == date) and (not class_type or r.get('class_type') == class_type)
+            ]
+            ids = [str(r.get('id', '')) for r in records]
+            if cursor is None or cursor not in ids:
+                start = 0
+            elif newer:
+                start = max(0, ids.index(cursor) - limit)
+            else:
+                start = ids.index(cursor) + 1
+            return RegistrationsPage(records[start:start + limit], start > 0, start + limit < len(records), len(records))
+        except Exception as e:
+            logger.error(f"Error getting registrations page: {e}")
+            return empty
+    
+    def _registrations_page_from_replica(self, cursor: Optional[str], newer: bool, date: str,
+                                         class_type: str, limit: int) -> RegistrationsPage:
+        """Keyset pagination over (registered_at, id), served by the registered_at index"""
+        filters, params = [], []
+        if date:
+            filters.append("date = ?")
+            params.append(date)
+        if class_type:
+            filters.append("class_type = ?")
+            params.append(class_type)
+        total = self.replica.count('yoga_registrations', " AND ".join(filters), params)
+        
+        anchor = self.replica.query('yoga_registrations', "id = ?", (cursor,)) if cursor else []
+        if not anchor:
+            rows = self.replica.query(
+                'yoga_registrations', " AND ".join(filters), params,
+                order_by="registered_at DESC, CAST(id AS INTEGER) DESC", limit=limit + 1
+            )
+            return RegistrationsPage(rows[:limit], False, len(rows) > limit, total)
+        
+        registered_at, anchor_id = anchor[0]['registered_at'], int(anchor[0]['id'])
+        op, order = (">", "ASC") if newer else ("<", "DESC")
+        # Written so the range on registered_at can be served by its index
+        filters.append(f"registered_at {op}= ? AND (registered_at {op} ? OR CAST(id AS INTEGER) {op} ?)")
+        params += [registered_at, registered_at, anchor_id]
+        rows = self.replica.query(
+            'yoga_registrations', " AND ".join(filters), params,
+            order_by=f"registered_at {order}, CAST(id AS INTEGER) {order}", limit=limit + 1
+        )
+        more = len(rows) > limit
+        rows = rows[:limit]
+        if newer:
+            rows.reverse()
+            return RegistrationsPage(rows, more, True, total)
+        return RegistrationsPage(rows, True, more, total)
+    
+    def iter_registrations(self, date_from: str = '', date_to: str = '', class_type: str = '',
+                           chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[Row]:
+        """Yield registrations in sheet order, filtered by class date range and type
+
+        Rows are read chunk_size at a time, from the replica or from consecutive
+        sheet ranges, so memory use does not grow with the size of the sheet.
+        """
+        if not self._readable():
+            return
+        
+        if self._replica_ready():
+            filters, params = [], []
+            if date_from:
+                filters.append("date >= ?")
+                params.append(date_from)
+            if date_to:
+                filters.append("date <= ?")
+                params.append(date_to)
+            if class_type:
+                filters.append("class_type = ?")
+                params.append(class_type)
+            yield from self.replica.iter_rows('yoga_registrations', " AND ".join(filters), params, chunk_size)
+            return
+        
+        columns = Columns(WORKSHEET_HEADERS['yoga_registrations'])
+        worksheet = self._worksheet('yoga_registrations')
+        last_column = column_letter(len(columns.names))
+        start = 2
+        while True:
+            values = worksheet.get(f"A{start}:{last_column}{start + chunk_size - 1}")
+            for row in values:
+                record = columns.row(row)
+                if date_from and record['date'] < date_from:
+                    continue
+                if date_to and record['date'] > date_to:
+                    continue
+                if class_type and record['class_type'] != class_type:
+                    continue
+                yield record
+            if len(values) < chunk_size:
+                return
+            start += chunk_size
+    
+    def get_registration_filters(self, limit: int = 8) -> Tuple[List[str], List[str]]:
+        """Most recent class dates and all class types that have registrations"""
+        if not self._readable():
+            return [], []
+            
+        try:
+            if self._replica_ready():
+                return (self.replica.distinct('yoga_registrations', 'date', descending=True, limit=limit),
+                        self.replica.distinct('yoga_registrations', 'class_type'))
+            
+            records = self.get_all_registrations()
+            dates = sorted({str(r.get('date', '')) for r in records} - {''}, reverse=True)[:limit]
+            class_types = sorted({str(r.get('class_type', '')) for r in records} - {''})
+            return dates, class_types
+        except Exception as e:
+            logger.error(f"Error getting registration filters: {e}")
+            return [], []
+    
+    def get_all_users(self) -> List[Row]:
         """Get all bot users"""
-        if not self.initialized:
+        if not self._readable():
             return []
             
         try:
-            worksheet = self.sheet.worksheet('users')
+            if self._replica_ready():
+                return self.replica.query('users')
             
-            # Get all records
-            records = worksheet.get_all_records()
+            worksheet = self._worksheet('users')
             
-            return records
+            return rows_from_values(worksheet.get_all_values())
         except Exception as e:
             logger.error(f"Error getting users: {e}")
-            return []
\ No newline at end of file
+            return []
+    
+    def sync_replica(self) -> None:
+        """Reconcile the local replica with the spreadsheet"""
+        if self.replica is None or not self._ensure_initialized():
+            return
+        
+        changed = self.replica.sync(self._worksheet, self.write_queue.pending_rows)
+        # Rebuild the snapshots of changed tables here, on the sync task, rather
+        # than invalidating them and making the next handler wait for the rebuild
+        for name, cache in (('events', self.events_cache), ('schedule', self.schedule_cache)):
+            if name in changed:
+                self._announce_change(name)
+                try:
+                    cache.refresh()
+                except Exception as e:
+                    logger.error(f"Error refreshing {cache.name} cache: {e}")
+
+
+
+class AsyncSheetsClient:
+    """Awaitable facade over SheetsClient that runs blocking I/O on a bounded thread pool"""
+    
+    def __init__(self, client: SheetsClient, max_workers: int = SHEETS_MAX_WORKERS):
+        self.client = client
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='sheets')
+    
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        # Run in a copy of the caller's context so the call is counted against the current update
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self._executor, functools.partial(context.run, func, *args, **kwargs))
+    
+    async def get_user_language(self, user_id: int) -> Optional[str]:
+        """Get user language preference (served from memory when cached)"""
+        language = self.client.language_cache.get(user_id)
+        if language:
+            return language
+        return await self._run(self.client.get_user_language, user_id)
+    
+    async def set_user_language(self, user_id: int, language: str) -> bool:
+        return await self._run(self.client.set_user_language, user_id, language)
+    
+    async def add_yoga_registration(self, name: str, email: str, date: str,
+                                    class_type: str, comment: str) -> Tuple[bool, str]:
+        return await self._run(self.client.add_yoga_registration, name, email, date, class_type, comment)
+    
+    async def get_events(self) -> List[Row]:
+        return await self._run(self.client.get_events)
+    
+    async def get_event(self, event_id: str) -> Optional[Row]:
+        return await self._run(self.client.get_event, event_id)
+    
+    async def get_event_page(self, event_id: Optional[str] = None) -> Optional[EventPage]:
+        return await self._run(self.client.get_event_page, event_id)
+    
+    async def get_schedule(self) -> List[Row]:
+        return await self._run(self.client.get_schedule)
+    
+    async def add_event(self, event_data: Dict[str, str]) -> Tuple[bool, str]:
+        return await self._run(self.client.add_event, event_data)
+    
+    async def get_all_registrations(self) -> List[Row]:
+        return await self._run(self.client.get_all_registrations)
+    
+    async def get_registrations_page(self, cursor: Optional[str] = None, newer: bool = False,
+                                     date: str = '', class_type: str = '') -> RegistrationsPage:
+        return await self._run(self.client.get_registrations_page, cursor, newer, date, class_type)
+    
+    async def export_registrations(self, fmt: str, date_from: str = '', date_to: str = '',
+                                   class_type: str = '') -> Tuple[str, int]:
+        """Stream matching registrations into a CSV/XLSX file; returns (path, row count)"""
+        def export() -> Tuple[str, int]:
+            rows = self.client.iter_registrations(date_from, date_to, class_type)
+            return export_rows(rows, WORKSHEET_HEADERS['yoga_registrations'], fmt)
+        return await self._run(export)
+    
+    async def get_registration_filters(self) -> Tuple[List[str], List[str]]:
+        return await self._run(self.client.get_registration_filters)
+    
+    async def get_all_users(self) -> List[Row]:
+        return await self._run(self.client.get_all_users)
+    
+    async def refresh_caches(self) -> None:
+        await self._run(self.client.refresh_caches)
+    
+    async def warm_up(self, create_worksheets: bool = True, max_delay: float = MAX_WARM_UP_DELAY) -> None:
+        """Run the client's warm-up, retrying with exponential backoff until it succeeds"""
+        delay = INIT_RETRY_INTERVAL
+        while not await self._run(self.client.warm_up, create_worksheets):
+            logger.warning(f"Sheets warm-up did not complete, retrying in {delay} s")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, max_delay)
+    
+    async def run_cache_refresher(self, interval: float = SHEETS_CACHE_REFRESH_INTERVAL) -> None:
+        """Keep the events/schedule snapshots warm so handlers never wait on a reload"""
+        while True:
+            await self.refresh_caches()
+            await asyncio.sleep(interval)
+    
+    async def run_replica_sync(self, interval: float = REPLICA_SYNC_INTERVAL) -> None:
+        """Periodically pull spreadsheet changes into the local replica"""
+        while True:
+            await self._run(self.client.sync_replica)
+            await asyncio.sleep(interval)
+    
+    async def run_write_queue(self) -> None:
+        """Flush queued Sheets writes in the background"""
+        await self.client.write_queue.run(self._executor)
+    
+    async def close(self) -> None:
+        """Flush pending writes, then release the worker threads"""
+        if self.client.initialized:
+            await self._run(self.client.write_queue.flush)
+        self.shutdown()
+    
+    def shutdown(self) -> None:
+        """Stop accepting work and release the worker threads"""
+        self._executor.shutdown(wait=False)
+
+
+# Shared client used by all handlers; connects lazily on the first Sheets call
+sheets_client = SheetsClient()
+async_sheets_client = AsyncSheetsClient(sheets_client)
\ No newline at end of file
@@ -0,0 +1,262 @@
+import os
+import json
+import asyncio
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from config import SHEETS_FLUSH_INTERVAL, SHEETS_FLUSH_BATCH_SIZE, PENDING_WRITES_FILE
+
+logger = logging.getLogger(__name__)
+
+# Upper bound for the retry delay after consecutive failed flushes (seconds)
+MAX_RETRY_DELAY = 300
+
+
+class SheetsWriteQueue:
+    """Write-behind queue that coalesces Sheets mutations and flushes them in batches
+
+    Every write is appended to the spool file (one JSON line, fsynced) before
+    enqueue returns, so a write the user was told succeeded survives a crash.
+    After each flush the spool is rewritten with the writes still pending.
+
+    An append that failed may still have reached the sheet (a timeout or 5xx
+    after Google applied it), so before rows are appended again to such a
+    worksheet, those whose ID is already in its first column are dropped.
+    """
+
+    def __init__(self, client, interval: float = SHEETS_FLUSH_INTERVAL,
+                 batch_size: int = SHEETS_FLUSH_BATCH_SIZE, spool_file: str = PENDING_WRITES_FILE):
+        self.client = client
+        self.interval = interval
+        self.batch_size = batch_size
+        self.spool_file = spool_file
+        # user_id -> (language, last_activity); later updates overwrite earlier ones
+        self._languages: Dict[int, Tuple[str, str]] = {}
+        # worksheet name -> rows waiting to be appended
+        self._appends: Dict[str, List[List[Any]]] = {}
+        # Copy of the batch a flush is writing, until it is done
+        self._flushing: Optional[Tuple[Dict[int, Tuple[str, str]], Dict[str, List[List[Any]]]]] = None
+        # Worksheets whose last append may or may not have been written
+        self._unconfirmed: Set[str] = set()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._load_spool()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._languages) + sum(len(rows) for rows in self._appends.values())
+
+    def enqueue_language(self, user_id: int, language: str, timestamp: str) -> None:
+        """Queue a language change, replacing any pending change for the same user"""
+        with self._lock:
+            self._languages[user_id] = (language, timestamp)
+            self._journal({'language': [user_id, language, timestamp]})
+        self._notify()
+
+    def enqueue_append(self, worksheet: str, row: List[Any]) -> None:
+        """Queue a row to be appended to a worksheet"""
+        with self._lock:
+            self._appends.setdefault(worksheet, []).append(row)
+            self._journal({'append': [worksheet, row]})
+        self._notify()
+
+    def pending_languages(self) -> Dict[int, str]:
+        """Language changes not yet written to the sheet"""
+        with self._lock:
+            return {user_id: language for user_id, (language, _) in self._languages.items()}
+
+    def pending_rows(self) -> Dict[str, List[List[Any]]]:
+        """Rows queued or being flushed, by worksheet in sheet column order; language changes as users rows"""
+        with self._lock:
+            batches = [(self._languages, self._appends)]
+            if self._flushing is not None:
+                batches.insert(0, self._flushing)
+            rows: Dict[str, List[List[Any]]] = {}
+            for languages, appends in batches:
+                rows.setdefault('users', []).extend(
+                    [str(user_id), language, timestamp] for user_id, (language, timestamp) in languages.items()
+                )
+                for name, values in appends.items():
+                    rows.setdefault(name, []).extend(values)
+        return rows
+
+    def pending_max_id(self, worksheet: str) -> int:
+        """Largest numeric ID among the rows queued or being flushed to a worksheet"""
+        with self._lock:
+            rows = list(self._appends.get(worksheet, []))
+            if self._flushing is not None:
+                rows += self._flushing[1].get(worksheet, [])
+        ids = [int(row[0]) for row in rows if row and str(row[0]).isdigit()]
+        return max(ids, default=0)
+
+    def _notify(self) -> None:
+        """Wake the flush loop early once the batch size is reached"""
+        if self._loop is not None and len(self) >= self.batch_size:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def flush(self) -> bool:
+        """Write all pending mutations; failed batches are re-queued, the spool keeps what is still pending"""
+        with self._flush_lock:
+            # Offline: keep everything queued (and spooled) until Sheets is reachable
+            if not self.client._ensure_initialized():
+                return False
+            with self._lock:
+                languages, self._languages = self._languages, {}
+                appends, self._appends = self._appends, {}
+                if not languages and not appends:
+                    return True
+                self._flushing = (dict(languages), {name: list(rows) for name, rows in appends.items()})
+
+            try:
+                if languages:
+                    self._flush_languages(languages)
+                    languages = {}
+                for name in list(appends):
+                    self._append_rows(name, appends[name])
+                    del appends[name]
+            except Exception as e:
+                logger.error(f"Error flushing Sheets writes, will retry: {e}")
+                self._unconfirmed.update(appends)
+                self._requeue(languages, appends)
+                self._save_spool()
+                return False
+            finally:
+                self._flushing = None
+
+            self._save_spool()
+            return True
+
+    def _flush_languages(self, languages: Dict[int, Tuple[str, str]]) -> None:
+        worksheet = self.client._worksheet('users')
+        # Row numbers are looked up in the id column on every flush: cached ones go
+        # stale when rows are sorted or deleted by hand, and a user missing from a
+        # cache may still have a row. Updating or appending blindly would overwrite
+        # another user's row or add a second row for the same user.
+        rows: Dict[int, int] = {}
+        for row_number, value in enumerate(worksheet.col_values(1), start=1):
+            if value.isdigit():
+                rows.setdefault(int(value), row_number)
+
+        updates = []
+        new_users = []
+        for user_id, (language, timestamp) in languages.items():
+            row = rows.get(user_id)
+            if row:
+                updates.append({'range': f'B{row}:C{row}', 'values': [[language, timestamp]]})
+            else:
+                new_users.append([str(user_id), language, timestamp])
+
+        if updates:
+            worksheet.batch_update(updates)
+        if new_users:
+            self._append_rows('users', new_users)
+
+    def _append_rows(self, name: str, values: List[List[Any]]) -> None:
+        """Append rows in one request, leaving out rows an unconfirmed earlier append already wrote"""
+        worksheet = self.client._worksheet(name)
+        if name in self._unconfirmed:
+            written = set(worksheet.col_values(1))
+            values = [row for row in values if str(row[0]) not in written]
+        if values:
+            worksheet.append_rows(values)
+        self._unconfirmed.discard(name)
+
+    def _requeue(self, languages: Dict[int, Tuple[str, str]], appends: Dict[str, List[List[Any]]]) -> None:
+        with self._lock:
+            for user_id, value in languages.items():
+                # Keep changes queued after the failed batch was taken
+                self._languages.setdefault(user_id, value)
+            for name, rows in appends.items():
+                self._appends[name] = rows + self._appends.get(name, [])
+
+    def _journal(self, entry: Dict[str, Any]) -> None:
+        """Append one write to the spool (caller holds the lock)"""
+        try:
+            with open(self.spool_file, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+        except OSError as e:
+            logger.error(f"Error spooling Sheets write: {e}")
+
+    def _save_spool(self) -> None:
+        """Rewrite the spool with only the writes still pending"""
+        with self._lock:
+            entries = [{'language': [user_id, language, timestamp]}
+                       for user_id, (language, timestamp) in self._languages.items()]
+            entries += [{'append': [name, row]} for name, rows in self._appends.items() for row in rows]
+            try:
+                if not entries:
+                    if os.path.exists(self.spool_file):
+                        os.remove(self.spool_file)
+                    return
+                tmp_file = f"{self.spool_file}.tmp"
+                with open(tmp_file, 'w', encoding='utf-8') as f:
+                    f.writelines(json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_file, self.spool_file)
+            except OSError as e:
+                logger.error(f"Error saving pending Sheets writes: {e}")
+
+    def _load_spool(self) -> None:
+        if not os.path.exists(self.spool_file):
+            return
+        try:
+            with open(self.spool_file, encoding='utf-8') as f:
+                lines = f.read().splitlines()
+        except OSError as e:
+            logger.error(f"Error loading pending Sheets writes: {e}")
+            return
+
+        for number, line in enumerate(lines, start=1):
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # The last line is cut short if the process died while writing it
+                logger.warning(f"Skipping unreadable line {number} of {self.spool_file}")
+                continue
+            if 'language' in entry:
+                user_id, language, timestamp = entry['language']
+                self._languages[int(user_id)] = (language, timestamp)
+            elif 'append' in entry:
+                name, row = entry['append']
+                self._appends.setdefault(name, []).append(row)
+            else:
+                # Spool written as a single JSON object by earlier versions
+                for user_id, value in entry.get('languages', {}).items():
+                    self._languages[int(user_id)] = tuple(value)
+                for name, rows in entry.get('appends', {}).items():
+                    self._appends.setdefault(name, []).extend(rows)
+        # The process may have died after sending these but before rewriting the spool
+        self._unconfirmed.update(self._appends)
+        if len(self):
+            logger.info(f"Restored {len(self)} pending Sheets writes from {self.spool_file}")
+
+    async def run(self, executor=None) -> None:
+        """Flush on a timer or when the batch size is reached, backing off after failures"""
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        delay = self.interval
+
+        while True:
+            if delay > self.interval:
+                # Backing off after a failure (e.g. quota exceeded): ignore early wakeups
+                await asyncio.sleep(delay)
+            else:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+            self._wakeup.clear()
+
+            if not len(self):
+                continue
+
+            if await self._loop.run_in_executor(executor, self.flush):
+                delay = self.interval
+            else:
+                delay = min(delay * 2, MAX_RETRY_DELAY)
@@ -0,0 +1,178 @@
+import time
+import random
+import logging
+import threading
+from typing import Any, Callable, Dict, Optional
+
+import metrics
+from utils.rate_limit import TokenBucket
+from config import (
+    SHEETS_READ_QUOTA, SHEETS_WRITE_QUOTA, SHEETS_QUOTA_WAIT, SHEETS_MAX_RETRIES,
+    SHEETS_BACKOFF_BASE, SHEETS_BACKOFF_MAX, SHEETS_BREAKER_THRESHOLD, SHEETS_BREAKER_COOLDOWN, WORKERS
+)
+
+logger = logging.getLogger(__name__)
+
+retries = metrics.register(metrics.Counter(
+    'sheets_retries_total', 'Google Sheets API requests retried, by reason', 'reason'))
+rejections = metrics.register(metrics.Counter(
+    'sheets_rejected_total', 'Google Sheets API requests refused without calling the API, by reason', 'reason'))
+
+
+class SheetsUnavailable(Exception):
+    """Raised instead of calling the API while the circuit is open or the quota is used up"""
+
+
+class CircuitBreaker:
+    """Stops calling a failing API for `cooldown` seconds after `threshold` failures in a row
+
+    After the cooldown one trial request is let through (half-open); its
+    result closes the circuit again or restarts the cooldown.
+    """
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        opened_at = self._opened_at
+        if opened_at is None:
+            return 'closed'
+        return 'open' if time.monotonic() - opened_at < self.cooldown else 'half_open'
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._probing or time.monotonic() - self._opened_at < self.cooldown:
+                return False
+            self._probing = True
+            return True
+
+    def release(self) -> None:
+        """Give up a trial request without a verdict, so another one may be let through"""
+        with self._lock:
+            self._probing = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info("Google Sheets is reachable again, closing the circuit")
+            self.failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self._probing or (self._opened_at is None and self.failures >= self.threshold):
+                logger.warning(f"Google Sheets failed {self.failures} times in a row, "
+                               f"pausing requests for {self.cooldown:.0f} s")
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+
+class SheetsScheduler:
+    """Admits every Sheets API request through per-minute quota buckets, retries and a circuit breaker
+
+    Reads and writes have separate quotas, as in the Sheets API. The quota
+    is per project, so with several worker processes each one gets an equal
+    share. Requests wait up to quota_wait seconds for a token. 429, 5xx and
+    network errors are retried with jittered exponential backoff (honouring
+    Retry-After), and a 429 also drains the bucket so other threads back off
+    too. Requests that are not idempotent (appends) are retried only after a
+    429: after a timeout or 5xx Google may already have applied them.
+    Callers run on the Sheets thread pool, so waiting here never blocks
+    the event loop.
+    """
+
+    def __init__(self, read_quota: float = SHEETS_READ_QUOTA / WORKERS,
+                 write_quota: float = SHEETS_WRITE_QUOTA / WORKERS,
+                 quota_wait: float = SHEETS_QUOTA_WAIT, max_retries: int = SHEETS_MAX_RETRIES,
+                 backoff_base: float = SHEETS_BACKOFF_BASE, backoff_max: float = SHEETS_BACKOFF_MAX,
+                 breaker: Optional[CircuitBreaker] = None):
+        self.quotas: Dict[str, Optional[TokenBucket]] = {
+            'read': TokenBucket(read_quota / 60, read_quota) if read_quota else None,
+            'write': TokenBucket(write_quota / 60, write_quota) if write_quota else None,
+        }
+        self.quota_wait = quota_wait
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker(SHEETS_BREAKER_THRESHOLD, SHEETS_BREAKER_COOLDOWN)
+
+    def headroom(self) -> Dict[str, float]:
+        """Requests that could be sent right now without waiting, per quota (-1 if unlimited)"""
+        return {kind: -1 if bucket is None else round(bucket.available(), 2) for kind, bucket in self.quotas.items()}
+
+    def call(self, kind: str, func: Callable[[], Any], idempotent: bool = True) -> Any:
+        """Run one API request (func) under the `kind` ('read' or 'write') quota"""
+        if not self.breaker.allow():
+            rejections.inc('circuit_open')
+            raise SheetsUnavailable("Google Sheets is unavailable, circuit is open")
+        bucket = self.quotas[kind]
+
+        attempt = 0
+        while True:
+            if bucket is not None and not bucket.acquire(self.quota_wait):
+                rejections.inc(f'{kind}_quota')
+                # Not a failure of the API, so the breaker keeps its state
+                self.breaker.release()
+                raise SheetsUnavailable(f"Google Sheets {kind} quota exhausted")
+            try:
+                result = func()
+            except Exception as e:
+                reason, retry_after = _retry_reason(e)
+                if reason is None:
+                    # A client error (bad range, missing sheet) says nothing about the API's health
+                    self.breaker.record_success()
+                    raise
+                if attempt >= self.max_retries or (not idempotent and reason != '429'):
+                    self.breaker.record_failure()
+                    raise
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+                if retry_after is not None:
+                    delay = max(delay, retry_after)
+                if reason == '429' and bucket is not None:
+                    bucket.pause(delay)
+                retries.inc(reason)
+                logger.warning(f"Sheets {kind} request failed ({reason}), retry {attempt + 1} in {delay:.1f} s: {e}")
+                time.sleep(delay)
+                attempt += 1
+                continue
+            self.breaker.record_success()
+            return result
+
+
+def _retry_reason(error: Exception):
+    """('429' | '5xx' | 'network', Retry-After seconds or None) for retryable errors, (None, None) otherwise"""
+    response = getattr(error, 'response', None)
+    status = getattr(response, 'status_code', None)
+    if status is not None:
+        if status == 429 or status >= 500:
+            retry_after = (getattr(response, 'headers', None) or {}).get('Retry-After')
+            try:
+                retry_after = float(retry_after) if retry_after is not None else None
+            except ValueError:
+                retry_after = None
+            return ('429' if status == 429 else '5xx'), retry_after
+        return None, None
+    # requests' connection and timeout errors derive from OSError
+    if isinstance(error, OSError):
+        return 'network', None
+    return None, None
+
+
+scheduler = SheetsScheduler()
+
+metrics.register(metrics.Gauge(
+    'sheets_quota_headroom', 'Google Sheets API requests available without waiting (-1 = unlimited)', 'quota',
+    scheduler.headroom))
+metrics.register(metrics.Gauge(
+    'sheets_circuit_state', 'Circuit breaker state for Google Sheets (1 for the current state)', 'state',
+    lambda: {state: int(scheduler.breaker.state == state) for state in ('closed', 'open', 'half_open')}))
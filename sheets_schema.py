@@ -0,0 +1,102 @@
+import os
+import json
+import logging
+from typing import Any, Dict, List, Optional
+
+import gspread
+from gspread.urls import SPREADSHEET_URL
+
+logger = logging.getLogger(__name__)
+
+# The only parts of the spreadsheet metadata the bot needs: sheet properties and the header row values
+SCHEMA_FIELDS = 'spreadsheetId,properties.title,sheets(properties,data.rowData.values.formattedValue)'
+
+# A schema is a plain dict, stored as JSON in the cache file:
+# {'spreadsheet_id': str, 'title': str,
+#  'worksheets': {title: worksheet properties}, 'headers': {title: [header row values]}}
+Schema = Dict[str, Any]
+
+
+class CachedSpreadsheet(gspread.Spreadsheet):
+    """Spreadsheet built from known properties, without the metadata request gspread makes when opening one"""
+
+    def __init__(self, client: gspread.Client, properties: Dict[str, Any]):
+        self.client = client
+        self._properties = properties
+
+
+def fetch_schema(client: gspread.Client, key: str, titles: List[str]) -> Schema:
+    """Read worksheet properties and the header rows of `titles` with one metadata request
+
+    A range naming a missing worksheet fails the whole request, so in that
+    case the existing worksheets are listed first and their headers fetched
+    in a second request.
+    """
+    url = SPREADSHEET_URL % key
+    params = {'fields': SCHEMA_FIELDS, 'includeGridData': 'true', 'ranges': [f"'{title}'!1:1" for title in titles]}
+    try:
+        return _parse_metadata(client.request('get', url, params=params).json())
+    except gspread.exceptions.APIError as e:
+        if e.response.status_code != 400:
+            raise
+    listed = client.request('get', url, params={'fields': 'sheets.properties.title'}).json()
+    existing = {sheet['properties']['title'] for sheet in listed.get('sheets', [])}
+    params['ranges'] = [f"'{title}'!1:1" for title in titles if title in existing]
+    if not params['ranges']:
+        del params['ranges'], params['includeGridData']
+    return _parse_metadata(client.request('get', url, params=params).json())
+
+
+def _parse_metadata(metadata: Dict[str, Any]) -> Schema:
+    schema: Schema = {
+        'spreadsheet_id': metadata['spreadsheetId'],
+        'title': metadata['properties']['title'],
+        'worksheets': {},
+        'headers': {},
+    }
+    for sheet in metadata.get('sheets', []):
+        title = sheet['properties']['title']
+        schema['worksheets'][title] = sheet['properties']
+        rows = (sheet.get('data') or [{}])[0].get('rowData') or [{}]
+        schema['headers'][title] = [cell.get('formattedValue', '') for cell in rows[0].get('values', [])]
+    return schema
+
+
+def open_schema(client: gspread.Client, schema: Schema):
+    """Spreadsheet and {title: Worksheet} handles for a schema, without any API request"""
+    spreadsheet = CachedSpreadsheet(client, {'id': schema['spreadsheet_id'], 'title': schema['title']})
+    worksheets = {title: gspread.Worksheet(spreadsheet, dict(properties))
+                  for title, properties in schema['worksheets'].items()}
+    return spreadsheet, worksheets
+
+
+def header_mismatches(schema: Schema, expected: Dict[str, List[str]]) -> Dict[str, List[str]]:
+    """{title: header found} for expected worksheets whose header row differs from the expected one"""
+    return {title: schema['headers'].get(title, []) for title, header in expected.items()
+            if title in schema['worksheets'] and schema['headers'].get(title, []) != header}
+
+
+def load_schema(path: str, key: str, titles: List[str]) -> Optional[Schema]:
+    """The cached schema of spreadsheet `key`, or None if there is none or it lacks one of `titles`"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            schema = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable Sheets schema cache {path}: {e}")
+        return None
+    if schema.get('spreadsheet_id') != key or not all(title in schema.get('worksheets', {}) for title in titles):
+        return None
+    return schema
+
+
+def save_schema(path: str, schema: Schema) -> None:
+    try:
+        # Worker processes share the cache file, so each writes its own temporary file
+        tmp_file = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(schema, f, ensure_ascii=False)
+        os.replace(tmp_file, path)
+    except OSError as e:
+        logger.error(f"Error saving Sheets schema cache: {e}")
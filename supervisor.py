@@ -0,0 +1,166 @@
+import os
+import asyncio
+import signal
+import logging
+import multiprocessing
+from typing import List, Optional
+
+from telegram import Update
+from telegram.ext import Application, ContextTypes, TypeHandler
+
+from config import BOT_TOKEN, HEALTH_PORT, STATE_BACKEND
+from health import HealthServer
+
+logger = logging.getLogger(__name__)
+
+# Seconds between checks for crashed workers, and to wait for a worker to drain on shutdown
+WATCHDOG_INTERVAL = 5
+WORKER_STOP_TIMEOUT = 30
+
+# Workers are started with spawn so each one imports config with its own WORKER_INDEX
+_context = multiprocessing.get_context('spawn')
+
+
+def shard_for(update: Update, workers: int) -> int:
+    """Worker index for an update; all updates of one user go to the same worker"""
+    if update.effective_user is not None:
+        key = update.effective_user.id
+    elif update.effective_chat is not None:
+        key = update.effective_chat.id
+    else:
+        key = update.update_id
+    return key % workers
+
+
+class Supervisor:
+    """Receives updates in the parent process and hands them to worker processes by user"""
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.queues = [_context.Queue() for _ in range(workers)]
+        self.processes: List[Optional[multiprocessing.Process]] = [None] * workers
+
+    def start_worker(self, index: int) -> None:
+        # The child reads WORKER_INDEX from the environment it inherits at start
+        os.environ['WORKER_INDEX'] = str(index)
+        try:
+            process = _context.Process(target=worker_main, args=(self.queues[index],), name=f"worker-{index}")
+            process.start()
+        finally:
+            os.environ.pop('WORKER_INDEX', None)
+        self.processes[index] = process
+        logger.info(f"Started worker {index} (pid {process.pid})")
+
+    def start(self) -> None:
+        for index in range(self.workers):
+            self.start_worker(index)
+
+    def stop(self) -> None:
+        """Ask every worker to finish its queued updates, then terminate stragglers"""
+        for queue in self.queues:
+            queue.put(None)
+        for index, process in enumerate(self.processes):
+            if process is None:
+                continue
+            process.join(WORKER_STOP_TIMEOUT)
+            if process.is_alive():
+                logger.warning(f"Worker {index} did not stop in time, terminating")
+                process.terminate()
+                process.join()
+
+    def alive(self) -> List[bool]:
+        return [process is not None and process.is_alive() for process in self.processes]
+
+    async def dispatch(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        self.queues[shard_for(update, self.workers)].put(update.to_dict())
+
+    async def watchdog(self) -> None:
+        """Restart workers that exited unexpectedly; their queued updates are kept"""
+        while True:
+            await asyncio.sleep(WATCHDOG_INTERVAL)
+            for index, process in enumerate(self.processes):
+                if process is not None and not process.is_alive():
+                    logger.error(f"Worker {index} exited with code {process.exitcode}, restarting")
+                    self.start_worker(index)
+
+
+def run_supervisor(workers: int) -> None:
+    """Run the bot as one receiving process and `workers` handler processes"""
+    from bot import run
+
+    if STATE_BACKEND != 'sqlite':
+        logger.warning("STATE_BACKEND is not 'sqlite'; conversation state will not be shared between workers")
+
+    supervisor = Supervisor(workers)
+
+    async def post_init(application: Application) -> None:
+        supervisor.start()
+        application.bot_data['watchdog'] = asyncio.create_task(supervisor.watchdog())
+        if HEALTH_PORT:
+            health_server = HealthServer("0.0.0.0", HEALTH_PORT)
+            health_server.route("/healthz", lambda: (200, {"status": "ok"}))
+
+            def readyz():
+                alive = supervisor.alive()
+                body = {"running": application.running, "workers": alive}
+                return (200 if application.running and all(alive) else 503), body
+
+            health_server.route("/readyz", readyz)
+            await health_server.start()
+            application.bot_data['health_server'] = health_server
+
+    async def post_shutdown(application: Application) -> None:
+        watchdog = application.bot_data.pop('watchdog', None)
+        if watchdog is not None:
+            watchdog.cancel()
+        health_server = application.bot_data.pop('health_server', None)
+        if health_server is not None:
+            await health_server.stop()
+        await asyncio.get_running_loop().run_in_executor(None, supervisor.stop)
+
+    application = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
+    application.add_handler(TypeHandler(Update, supervisor.dispatch))
+    logger.info(f"Starting supervisor with {workers} workers")
+    run(application)
+
+
+def worker_main(queue) -> None:
+    """Entry point of a worker process"""
+    # Ctrl+C reaches the whole process group; workers stop when the supervisor says so
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(run_worker(queue))
+
+
+async def run_worker(queue) -> None:
+    from bot import build_application, build_health_server, start_background_tasks, post_shutdown
+    from config import WORKER_INDEX
+
+    loop = asyncio.get_running_loop()
+    # On SIGTERM (e.g. systemd stopping the whole unit) finish what is queued and exit
+    loop.add_signal_handler(signal.SIGTERM, queue.put, None)
+
+    application = build_application(receive_updates=False)
+    async with application:
+        if HEALTH_PORT:
+            # Each worker serves its own probes and /metrics on the ports after the supervisor's
+            health_server = build_health_server(application, HEALTH_PORT + 1 + WORKER_INDEX)
+            await health_server.start()
+            application.bot_data['health_server'] = health_server
+        await start_background_tasks(application, leader=WORKER_INDEX == 0)
+        await application.start()
+        logger.info(f"Worker {WORKER_INDEX} ready")
+        try:
+            while True:
+                data = await loop.run_in_executor(None, queue.get)
+                if data is None:
+                    break
+                await application.update_queue.put(Update.de_json(data, application.bot))
+        finally:
+            await application.stop()
+            await post_shutdown(application)
@@ -0,0 +1,116 @@
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Awaitable, Deque, Dict, Optional, Set, Tuple
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Processes updates concurrently, but one at a time per user
+
+    Up to max_concurrent_updates handlers run at once. Updates from the same
+    user (or chat, for updates without a user) go to that user's queue, which
+    one task drains in order, so multi-step flows like registration never see
+    steps out of order. do_process_update only enqueues, so the base class's
+    slot is released at once, and a slot of our own is taken just around each
+    handler run: a burst from one user never holds slots other users need.
+    """
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        self._slots = asyncio.BoundedSemaphore(max_concurrent_updates)
+        # key -> updates waiting behind the one being handled
+        self._queues: Dict[int, Deque[Tuple[object, Awaitable]]] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self.in_flight = 0
+
+    @staticmethod
+    def _key(update: object) -> Optional[int]:
+        if not isinstance(update, Update):
+            return None
+        if update.effective_user is not None:
+            return update.effective_user.id
+        if update.effective_chat is not None:
+            return update.effective_chat.id
+        return None
+
+    async def do_process_update(self, update: object, coroutine: Awaitable) -> None:
+        key = self._key(update)
+        if key is None:
+            self._spawn(self._run_in_slot(update, coroutine))
+            return
+
+        queue = self._queues.get(key)
+        if queue is not None:
+            queue.append((update, coroutine))
+            return
+        self._queues[key] = deque([(update, coroutine)])
+        self._spawn(self._drain(key))
+
+    def _spawn(self, coroutine: Awaitable) -> None:
+        task = asyncio.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _drain(self, key: int) -> None:
+        """Handle a user's updates one after another until the queue is empty"""
+        queue = self._queues[key]
+        try:
+            while queue:
+                update, coroutine = queue.popleft()
+                await self._run_in_slot(update, coroutine)
+        finally:
+            del self._queues[key]
+            # Only left over if the task was cancelled
+            for _, coroutine in queue:
+                coroutine.close()
+
+    async def _run_in_slot(self, update: object, coroutine: Awaitable) -> None:
+        async with self._slots:
+            try:
+                await self._run(update, coroutine)
+            except Exception:
+                # Handler errors go to the Application's error handlers; this only guards the queue
+                logger.exception("Unhandled error while processing an update")
+
+    @staticmethod
+    def _handler_label(update: object) -> str:
+        """Metrics label until a router names the actual handler"""
+        if not isinstance(update, Update):
+            return type(update).__name__
+        if update.callback_query is not None:
+            return 'callback'
+        message = update.message
+        if message is not None and message.text and message.text.startswith('/'):
+            return message.text.split()[0].split('@')[0]
+        return 'message' if message is not None else 'other'
+
+    async def _run(self, update: object, coroutine: Awaitable) -> None:
+        self.in_flight += 1
+        stats, token = metrics.start_update(self._handler_label(update))
+        started = time.perf_counter()
+        try:
+            await coroutine
+        finally:
+            metrics.finish_update(stats, token, time.perf_counter() - started)
+            self.in_flight -= 1
+
+    @property
+    def queued_users(self) -> int:
+        """Users with at least one update running or waiting"""
+        return len(self._queues)
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        """Let queued updates finish; the Application has stopped fetching new ones"""
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
@@ -1,3 +0,0 @@
-from .user import start_command, language_selection, main_menu, handle_yoga_registration
-from .admin import handle_admin_input
-from .callbacks import button_callback
\ No newline at end of file
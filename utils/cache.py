@@ -0,0 +1,116 @@
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class LRUCache:
+    """Thread-safe bounded mapping with least-recently-used eviction"""
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max(1, max_size)
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return cached value and mark it as recently used"""
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return default
+            return self._data[key]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Insert or update a value, evicting the oldest entry if full"""
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def update(self, items: Iterable[Tuple[Hashable, Any]]) -> None:
+        """Bulk insert (used for warming the cache)"""
+        for key, value in items:
+            self.set(key, value)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            return self._data.pop(key, default)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.evictions = 0
+
+    def snapshot(self) -> Dict[Hashable, Any]:
+        """Return a shallow copy of the cache contents"""
+        with self._lock:
+            return dict(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._data
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+
+class SnapshotCache:
+    """Holds the latest result of a loader and reloads it once older than ttl seconds
+
+    If `version` is given, the snapshot is also reloaded as soon as version()
+    returns something other than it did when the snapshot was loaded; other
+    processes use it to invalidate this one.
+    """
+
+    def __init__(self, loader: Callable[[], Any], ttl: float, name: str = '',
+                 version: Optional[Callable[[], Any]] = None):
+        self._loader = loader
+        self.ttl = ttl
+        self.name = name
+        self._version = version
+        # (loaded_at, version, value) replaced as a whole so readers never see a partial update
+        self._snapshot: Optional[Tuple[float, Any, Any]] = None
+        self._lock = threading.Lock()
+
+    def _fresh(self, snapshot: Optional[Tuple[float, Any, Any]]) -> bool:
+        if snapshot is None or time.monotonic() - snapshot[0] >= self.ttl:
+            return False
+        return self._version is None or snapshot[1] == self._version()
+
+    def get(self) -> Any:
+        """Return the cached value, loading it if missing, expired or invalidated"""
+        snapshot = self._snapshot
+        if self._fresh(snapshot):
+            return snapshot[2]
+        return self.refresh(force=False)
+
+    def refresh(self, force: bool = True) -> Any:
+        """Reload the value; on failure keep serving the previous snapshot if there is one"""
+        with self._lock:
+            snapshot = self._snapshot
+            if not force and self._fresh(snapshot):
+                # Another caller refreshed while we waited for the lock
+                return snapshot[2]
+            # Read before loading, so a change made during the load triggers another one
+            version = self._version() if self._version is not None else None
+            try:
+                value = self._loader()
+            except Exception as e:
+                if snapshot is None:
+                    raise
+                logger.error(f"Error refreshing {self.name or 'snapshot'} cache, serving stale data: {e}")
+                return snapshot[2]
+            self._snapshot = (time.monotonic(), version, value)
+            return value
+
+    def invalidate(self) -> None:
+        """Drop the snapshot so the next read reloads it"""
+        self._snapshot = None
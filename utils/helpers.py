@@ -1,91 +1,106 @@
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import calendar
 import re
-from typing import List, Dict, Any, Tuple, Union
+from typing import List, Dict, Any, Optional, Tuple, Union
 import logging
 
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from config import CALENDAR_CACHE_SIZE, CALENDAR_PREWARM_MONTHS
+from utils.cache import LRUCache
+
 logger = logging.getLogger(__name__)
 
+WEEKDAY_LABELS = ["Mo", "Tu", "We", "Th", "Fr", "Sa", "Su"]
+
+# (year, month, min_date) -> InlineKeyboardMarkup; bounded because callback data is user-supplied
+_calendar_cache = LRUCache(CALENDAR_CACHE_SIZE)
+_calendar_day: Optional[date] = None
+
 def validate_email(email: str) -> bool:
     """Validate email format"""
     pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
     return bool(re.match(pattern, email))
 
-def generate_calendar_keyboard(year: int = None, month: int = None) -> Tuple[List[List[Dict[str, str]]], str]:
+def generate_calendar_keyboard(year: int = None, month: int = None,
+                               min_date: date = None) -> Tuple[List[List[InlineKeyboardButton]], str]:
     """Generate an inline keyboard with calendar for date selection"""
     # Default to current month
-    now = datetime.now()
+    today = date.today()
     if year is None:
-        year = now.year
+        year = today.year
     if month is None:
-        month = now.month
-        
-    # Get month name and create title
-    month_name = calendar.month_name[month]
-    title = f"{month_name} {year}"
-    
-    # Create calendar matrix
-    cal = calendar.monthcalendar(year, month)
-    
-    # Initialize keyboard
-    keyboard = []
-    
-    # Add days of week header
-    days_row = []
-    for day in ["Mo", "Tu", "We", "Th", "Fr", "Sa", "Su"]:
-        days_row.append({"text": day, "callback_data": "ignore"})
-    keyboard.append(days_row)
-    
+        month = today.month
+
     # Minimum date - tomorrow
-    min_date = now.date() + timedelta(days=1)
-    
-    # Add date buttons
-    for week in cal:
+    if min_date is None:
+        min_date = today + timedelta(days=1)
+
+    # Get month name and create title
+    title = f"{calendar.month_name[month]} {year}"
+
+    # Days of week header
+    keyboard = [[InlineKeyboardButton(day, callback_data="ignore") for day in WEEKDAY_LABELS]]
+
+    # Date buttons; past dates and padding cells are disabled
+    for week in calendar.monthcalendar(year, month):
         week_row = []
         for day in week:
             if day == 0:
-                # Empty day
-                week_row.append({"text": " ", "callback_data": "ignore"})
+                week_row.append(InlineKeyboardButton(" ", callback_data="ignore"))
+            elif date(year, month, day) < min_date:
+                week_row.append(InlineKeyboardButton(str(day), callback_data="ignore"))
             else:
-                # Check if date is in the past
-                current_date = datetime(year, month, day).date()
-                if current_date < min_date:
-                    # Past date - disable
-                    week_row.append({"text": str(day), "callback_data": "ignore"})
-                else:
-                    # Future date - selectable
-                    date_str = current_date.strftime("%Y-%m-%d")
-                    week_row.append({"text": str(day), "callback_data": f"date_{date_str}"})
-        
-        if week_row:
-            keyboard.append(week_row)
-    
-    # Add navigation buttons
-    nav_row = []
-    
-    # Previous month
-    prev_month = month - 1
-    prev_year = year
-    if prev_month == 0:
-        prev_month = 12
-        prev_year -= 1
-    nav_row.append({"text": "« Prev", "callback_data": f"calendar_{prev_year}_{prev_month}"})
-    
-    # Back to main
-    nav_row.append({"text": "🏠 Menu", "callback_data": "back_to_main"})
-    
-    # Next month
-    next_month = month + 1
-    next_year = year
-    if next_month == 13:
-        next_month = 1
-        next_year += 1
-    nav_row.append({"text": "Next »", "callback_data": f"calendar_{next_year}_{next_month}"})
-    
-    keyboard.append(nav_row)
-    
+                week_row.append(InlineKeyboardButton(str(day), callback_data=f"date_{year:04d}-{month:02d}-{day:02d}"))
+        keyboard.append(week_row)
+
+    # Navigation buttons
+    prev_year, prev_month = (year - 1, 12) if month == 1 else (year, month - 1)
+    next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+    keyboard.append([
+        InlineKeyboardButton("« Prev", callback_data=f"calendar_{prev_year}_{prev_month}"),
+        InlineKeyboardButton("🏠 Menu", callback_data="back_to_main"),
+        InlineKeyboardButton("Next »", callback_data=f"calendar_{next_year}_{next_month}"),
+    ])
+
     return keyboard, title
 
+def calendar_markup(year: int = None, month: int = None) -> InlineKeyboardMarkup:
+    """Calendar keyboard for the month, built once per day and reused
+
+    Markup depends only on (year, month, min_date), and InlineKeyboardMarkup
+    is immutable, so the same object can be sent to every user. The cache is
+    dropped when the date changes, i.e. at midnight.
+    """
+    global _calendar_day
+    today = date.today()
+    if year is None:
+        year = today.year
+    if month is None:
+        month = today.month
+
+    if _calendar_day != today:
+        _calendar_cache.clear()
+        _calendar_day = today
+
+    min_date = today + timedelta(days=1)
+    key = (year, month, min_date)
+    markup = _calendar_cache.get(key)
+    if markup is None:
+        keyboard, _ = generate_calendar_keyboard(year, month, min_date)
+        markup = InlineKeyboardMarkup(keyboard)
+        _calendar_cache.set(key, markup)
+    return markup
+
+def prewarm_calendar(months: int = CALENDAR_PREWARM_MONTHS) -> None:
+    """Build markup for the current month and the next `months - 1` months"""
+    today = date.today()
+    year, month = today.year, today.month
+    for _ in range(months):
+        calendar_markup(year, month)
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    logger.info(f"Prewarmed {months} calendar keyboards")
+
 def format_event_details(event: Dict[str, Any], lang: str) -> str:
     """Format event details based on language"""
     try:
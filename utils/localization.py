@@ -1,55 +1,102 @@
 import os
+import json
 import logging
-from dotenv import load_dotenv
+from string import Formatter
+from typing import Any, Dict, List, Optional, Tuple
 
-# Завантаження змінних середовища
-load_dotenv()
+from config import LANGUAGES, DEFAULT_LANGUAGE, LOCALES_DIR
 
-# Налаштування логування
-LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
-numeric_level = getattr(logging, LOG_LEVEL.upper(), None)
+logger = logging.getLogger(__name__)
 
-os.makedirs('logs', exist_ok=True)
 
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=numeric_level,
-    handlers=[
-        logging.FileHandler("logs/bot.log"),
-        logging.StreamHandler()
-    ]
-)
-logger = logging.getLogger(__name__)
+class _Blank(dict):
+    def __missing__(self, key: str) -> str:
+        return ""
+
+
+class Template:
+    """A `.format` template parsed once at load time"""
+
+    def __init__(self, text: str):
+        self.text = text
+        # (literal, field name) pairs; the field is None after the last literal
+        self.parts: List[Tuple[str, Optional[str]]] = []
+        self.simple = True
+        for literal, field, spec, conversion in Formatter().parse(text):
+            if field is not None and (spec or conversion or not field.isidentifier()):
+                self.simple = False
+            self.parts.append((literal, field))
+        self.fields = frozenset(field for _, field in self.parts if field)
+
+    def format(self, values: Dict[str, Any]) -> str:
+        if not self.simple:
+            return self.text.format_map(_Blank(values))
+        return "".join(
+            literal + ("" if field is None else str(values.get(field, "")))
+            for literal, field in self.parts
+        )
+
+
+# (lang, key) -> text, with DEFAULT_LANGUAGE already filled in for missing translations
+_texts: Dict[Tuple[str, str], str] = {}
+# (lang, key) -> Template, for texts with placeholders
+_templates: Dict[Tuple[str, str], Template] = {}
+
+
+def load_catalogs(directory: str = LOCALES_DIR) -> List[str]:
+    """Load <lang>.json for every language into the flat catalog; returns validation problems"""
+    catalogs: Dict[str, Dict[str, str]] = {}
+    problems = []
+    for lang in LANGUAGES:
+        path = os.path.join(directory, f"{lang}.json")
+        try:
+            with open(path, encoding='utf-8') as f:
+                catalogs[lang] = json.load(f)
+        except (OSError, ValueError) as e:
+            problems.append(f"Cannot load {path}: {e}")
+            catalogs[lang] = {}
+
+    default = catalogs.get(DEFAULT_LANGUAGE, {})
+    texts: Dict[Tuple[str, str], str] = {}
+    templates: Dict[Tuple[str, str], Template] = {}
+    for lang, catalog in catalogs.items():
+        for key in sorted(set(default) - set(catalog)):
+            problems.append(f"Missing '{key}' in {lang}")
+        for key in sorted(set(catalog) - set(default)):
+            problems.append(f"Unknown key '{key}' in {lang}")
+
+        for key, default_text in default.items():
+            text = catalog.get(key, default_text)
+            texts[(lang, key)] = text
+            if '{' in text:
+                template = Template(text)
+                if template.fields != Template(default_text).fields:
+                    problems.append(f"Placeholders of '{key}' in {lang} differ from {DEFAULT_LANGUAGE}")
+                templates[(lang, key)] = template
+
+    # Swap in complete dicts so concurrent readers never see a half-built catalog
+    global _texts, _templates
+    _texts, _templates = texts, templates
+
+    for problem in problems:
+        logger.error(f"Localization: {problem}")
+    return problems
+
+
+def get_text(key: str, lang: Optional[str] = DEFAULT_LANGUAGE) -> str:
+    """Text for key in lang, falling back to DEFAULT_LANGUAGE and then to the key itself"""
+    text = _texts.get((lang, key))
+    if text is None:
+        text = _texts.get((DEFAULT_LANGUAGE, key), key)
+    return text
+
+
+def format_text(key: str, lang: Optional[str] = DEFAULT_LANGUAGE, **values: Any) -> str:
+    """Fill a template text; missing values are rendered empty"""
+    template = _templates.get((lang, key)) or _templates.get((DEFAULT_LANGUAGE, key))
+    if template is None:
+        return get_text(key, lang)
+    return template.format(values)
+
 
-# Основні налаштування бота
-BOT_TOKEN = os.getenv('BOT_TOKEN')
-if not BOT_TOKEN:
-    logger.error("BOT_TOKEN не знайдено в .env файлі!")
-    exit(1)
-
-# Налаштування адміністраторів
-ADMIN_USER_IDS = []
-admin_ids_str = os.getenv('ADMIN_USER_IDS', '')
-if admin_ids_str:
-    try:
-        ADMIN_USER_IDS = [int(user_id.strip()) for user_id in admin_ids_str.split(',') if user_id.strip().isdigit()]
-        logger.info(f"Зареєстровані адміністратори: {ADMIN_USER_IDS}")
-    except Exception as e:
-        logger.error(f"Помилка при обробці ADMIN_USER_IDS: {e}")
-
-# Налаштування Google Sheets
-SPREADSHEET_ID = os.getenv('SPREADSHEET_ID')
-CREDENTIALS_FILE = os.getenv('CREDENTIALS_FILE', 'credentials.json')
-
-# Перевірка наявності credentials.json
-if not os.path.exists(CREDENTIALS_FILE):
-    logger.warning(f"Файл {CREDENTIALS_FILE} не знайдено! Google Sheets функціонал буде недоступний.")
-
-# Режим бота
-BOT_MODE = os.getenv('BOT_MODE', 'polling').lower()
-WEBHOOK_URL = os.getenv('WEBHOOK_URL', '')
-PORT = int(os.getenv('PORT', '8443'))
-
-# Підтримувані мови
-LANGUAGES = ['uk', 'en', 'de']
-DEFAULT_LANGUAGE = 'uk'
\ No newline at end of file
+load_catalogs()
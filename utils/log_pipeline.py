@@ -0,0 +1,184 @@
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+import traceback
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, RotatingFileHandler
+from typing import Any, Dict, List, Optional, Sequence
+
+# Attributes every LogRecord has; anything else was passed with extra= and goes into the JSON record
+_RECORD_ATTRS = frozenset(logging.LogRecord('', 0, '', 0, '', None, None).__dict__) | {'message', 'asctime', 'taskName'}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, message, optional exc and extra fields"""
+
+    def __init__(self, static_fields: Optional[Dict[str, Any]] = None):
+        super().__init__()
+        self.static_fields = static_fields or {}
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        data.update(self.static_fields)
+        if record.exc_info:
+            data['exc'] = ''.join(traceback.format_exception(*record.exc_info)).rstrip()
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                data[key] = value
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Hands records to the writer thread without formatting them
+
+    Formatting happens on the writer thread. When the queue is full (the disk
+    cannot keep up) records are dropped and counted instead of blocking the caller.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _format_batch(handler: logging.StreamHandler, records: Sequence[logging.LogRecord]) -> str:
+    lines = []
+    for record in records:
+        try:
+            lines.append(handler.format(record) + handler.terminator)
+        except Exception:
+            handler.handleError(record)
+    return ''.join(lines)
+
+
+class BatchStreamHandler(logging.StreamHandler):
+    """StreamHandler that writes a batch of records with one write and one flush"""
+
+    def emit_batch(self, records: Sequence[logging.LogRecord]) -> None:
+        data = _format_batch(self, records)
+        if not data:
+            return
+        with self.lock:
+            try:
+                self.stream.write(data)
+                self.flush()
+            except Exception:
+                self.handleError(records[-1])
+
+
+class BatchRotatingFileHandler(RotatingFileHandler):
+    """RotatingFileHandler that writes a batch of records with one write and one flush"""
+
+    def emit_batch(self, records: Sequence[logging.LogRecord]) -> None:
+        data = _format_batch(self, records)
+        if not data:
+            return
+        with self.lock:
+            try:
+                if self.stream is None:
+                    self.stream = self._open()
+                if self.maxBytes > 0 and self.stream.tell() > 0 \
+                        and self.stream.tell() + len(data.encode(self.encoding or 'utf-8')) >= self.maxBytes:
+                    self.doRollover()
+                self.stream.write(data)
+                self.stream.flush()
+            except Exception:
+                self.handleError(records[-1])
+
+
+class LogWriter(threading.Thread):
+    """Background thread that drains the log queue into the real handlers
+
+    Records are collected into batches of up to batch_size, or whatever
+    arrived within flush_interval of the first record, and written together.
+    """
+
+    def __init__(self, log_queue: queue.Queue, handlers: List[logging.Handler],
+                 batch_size: int = 256, flush_interval: float = 1.0):
+        super().__init__(name='log-writer', daemon=True)
+        self.queue = log_queue
+        self.handlers = handlers
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._stop_marker = object()
+
+    def run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                try:
+                    batch.append(self.queue.get(timeout=timeout) if timeout > 0 else self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if self._stop_marker in batch:
+                stopping = True
+                batch = [record for record in batch if record is not self._stop_marker]
+            if batch:
+                self._write(batch)
+
+    def _write(self, batch: List[logging.LogRecord]) -> None:
+        for handler in self.handlers:
+            records = [record for record in batch if record.levelno >= handler.level]
+            if not records:
+                continue
+            if hasattr(handler, 'emit_batch'):
+                handler.emit_batch(records)
+            else:
+                for record in records:
+                    handler.handle(record)
+
+    def stop(self) -> None:
+        """Write everything queued so far and stop the thread"""
+        # Blocks if the queue is full, so the records ahead of the marker are not lost
+        self.queue.put(self._stop_marker)
+        self.join()
+        for handler in self.handlers:
+            handler.close()
+
+
+def setup_logging(level: int, log_file: str, max_bytes: int, backup_count: int,
+                  batch_size: int, flush_interval: float, queue_size: int,
+                  static_fields: Optional[Dict[str, Any]] = None) -> NonBlockingQueueHandler:
+    """Route all logging through a queue to a writer thread
+
+    The log file gets JSON lines and is rotated by size; the console keeps
+    the plain text format. Returns the queue handler installed on the root logger.
+    """
+    file_handler = BatchRotatingFileHandler(
+        log_file, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8', delay=True
+    )
+    file_handler.setFormatter(JsonFormatter(static_fields))
+    console_handler = BatchStreamHandler()
+    console_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+
+    log_queue: queue.Queue = queue.Queue(queue_size)
+    writer = LogWriter(log_queue, [file_handler, console_handler], batch_size, flush_interval)
+    writer.start()
+    atexit.register(writer.stop)
+
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    root = logging.getLogger()
+    root.setLevel(level)
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    return queue_handler
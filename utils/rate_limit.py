@@ -0,0 +1,75 @@
+import time
+import asyncio
+import threading
+
+
+class AsyncTokenBucket:
+    """Token bucket limiter for coroutines: `rate` tokens per second, bursts up to `capacity`"""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, tokens: float = 1) -> None:
+        """Wait until `tokens` are available and take them"""
+        async with self._lock:
+            self._refill()
+            while self._tokens < tokens:
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= tokens
+
+    def pause(self, seconds: float) -> None:
+        """Drain the bucket so no tokens are handed out for `seconds` (e.g. after a flood-wait)"""
+        self._refill()
+        self._tokens = min(self._tokens, -seconds * self.rate)
+
+
+class TokenBucket:
+    """Thread-safe token bucket for blocking callers: `rate` tokens per second, bursts up to `capacity`"""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, timeout: float, tokens: float = 1) -> bool:
+        """Wait up to `timeout` seconds for `tokens` and take them; False if they would not arrive in time"""
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return True
+                wait = (tokens - self._tokens) / self.rate
+            if time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        """Drain the bucket so no tokens are handed out for `seconds` (e.g. after a quota error)"""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self._tokens, -seconds * self.rate)
+
+    def available(self) -> float:
+        """Tokens that could be taken right now"""
+        with self._lock:
+            self._refill()
+            return max(0.0, self._tokens)
@@ -0,0 +1,241 @@
+import json
+import time
+import queue
+import atexit
+import sqlite3
+import logging
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from config import STATE_BACKEND, STATE_DB_PATH, STATE_TTL, STATE_MAX_ENTRIES
+
+logger = logging.getLogger(__name__)
+
+
+class StateStore(ABC):
+    """Per-user conversation state with TTL and size-based eviction
+
+    Values are plain dicts. Reads return copies, so changes must be saved
+    back with `store[user_id] = state` or `store.update(user_id, **changes)`.
+    """
+
+    def __init__(self, ttl: float = STATE_TTL, max_entries: int = STATE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+    @abstractmethod
+    def get(self, user_id: int, default: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def __setitem__(self, user_id: int, state: Dict[str, Any]) -> None:
+        ...
+
+    @abstractmethod
+    def __delitem__(self, user_id: int) -> None:
+        ...
+
+    @abstractmethod
+    def __len__(self) -> int:
+        ...
+
+    def __getitem__(self, user_id: int) -> Dict[str, Any]:
+        state = self.get(user_id)
+        if state is None:
+            raise KeyError(user_id)
+        return state
+
+    def __contains__(self, user_id: int) -> bool:
+        return self.get(user_id) is not None
+
+    def pop(self, user_id: int, default: Any = None) -> Any:
+        state = self.get(user_id)
+        if state is None:
+            return default
+        del self[user_id]
+        return state
+
+    def update(self, user_id: int, **changes: Any) -> Dict[str, Any]:
+        """Merge changes into the user's state and save it"""
+        state = self.get(user_id) or {}
+        state.update(changes)
+        self[user_id] = state
+        return state
+
+
+class MemoryStateStore(StateStore):
+    """Process-local store; the oldest entries are evicted once max_entries is reached"""
+
+    def __init__(self, ttl: float = STATE_TTL, max_entries: int = STATE_MAX_ENTRIES):
+        super().__init__(ttl, max_entries)
+        # user_id -> (updated_at, state), ordered from least to most recently updated
+        self._data: "OrderedDict[int, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int, default: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._data.get(user_id)
+            if entry is None:
+                return default
+            if time.time() - entry[0] > self.ttl:
+                del self._data[user_id]
+                return default
+            return dict(entry[1])
+
+    def __setitem__(self, user_id: int, state: Dict[str, Any]) -> None:
+        with self._lock:
+            self._data[user_id] = (time.time(), dict(state))
+            self._data.move_to_end(user_id)
+            self._evict()
+
+    def __delitem__(self, user_id: int) -> None:
+        with self._lock:
+            self._data.pop(user_id, None)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+    def _evict(self) -> None:
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+        # Entries are ordered by update time, so expired ones are at the front
+        cutoff = time.time() - self.ttl
+        while self._data:
+            user_id, (updated_at, _) = next(iter(self._data.items()))
+            if updated_at >= cutoff:
+                break
+            del self._data[user_id]
+
+
+class SQLiteStateStore(MemoryStateStore):
+    """Store backed by a local SQLite file; survives restarts and can be shared by worker processes
+
+    Reads are served from the in-process copy, loaded from the file at start:
+    the supervisor sends each user's updates to one worker, so that copy is
+    authoritative. Writes go to the file on a background thread, so a handler
+    never blocks the event loop waiting for another worker's write lock.
+    """
+
+    # Run the expiry sweep after this many writes
+    SWEEP_EVERY = 100
+    # Seconds to wait for queued writes on shutdown
+    CLOSE_TIMEOUT = 10
+
+    def __init__(self, namespace: str, path: str = STATE_DB_PATH,
+                 ttl: float = STATE_TTL, max_entries: int = STATE_MAX_ENTRIES):
+        super().__init__(ttl, max_entries)
+        self.namespace = namespace
+        self._writes = 0
+        # (user_id, JSON state or None to delete, updated_at); None stops the writer
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS conversation_state ("
+            " namespace TEXT NOT NULL, user_id INTEGER NOT NULL, data TEXT NOT NULL,"
+            " updated_at REAL NOT NULL, PRIMARY KEY (namespace, user_id))"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_conversation_state_updated"
+            " ON conversation_state (namespace, updated_at)"
+        )
+        self._sweep()
+        self._load()
+        self._writer = threading.Thread(target=self._write_loop, name=f"state-{namespace}", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def _load(self) -> None:
+        rows = self._conn.execute(
+            "SELECT user_id, data, updated_at FROM conversation_state WHERE namespace = ? ORDER BY updated_at",
+            (self.namespace,)
+        ).fetchall()
+        with self._lock:
+            for user_id, data, updated_at in rows:
+                self._data[user_id] = (updated_at, json.loads(data))
+            self._evict()
+
+    def __setitem__(self, user_id: int, state: Dict[str, Any]) -> None:
+        super().__setitem__(user_id, state)
+        self._queue.put((user_id, json.dumps(state, ensure_ascii=False), time.time()))
+
+    def __delitem__(self, user_id: int) -> None:
+        super().__delitem__(user_id)
+        self._queue.put((user_id, None, None))
+
+    def close(self) -> None:
+        """Write what is still queued and stop the writer thread"""
+        if self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join(self.CLOSE_TIMEOUT)
+
+    def _write_loop(self) -> None:
+        while True:
+            item = self._queue.get()
+            # Everything queued meanwhile goes in the same transaction
+            batch = []
+            while item is not None:
+                batch.append(item)
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                self._write(batch)
+            if item is None:
+                return
+
+    def _write(self, batch: List[tuple]) -> None:
+        try:
+            self._conn.execute("BEGIN")
+            for user_id, data, updated_at in batch:
+                if data is None:
+                    self._conn.execute(
+                        "DELETE FROM conversation_state WHERE namespace = ? AND user_id = ?",
+                        (self.namespace, user_id)
+                    )
+                else:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO conversation_state (namespace, user_id, data, updated_at)"
+                        " VALUES (?, ?, ?, ?)",
+                        (self.namespace, user_id, data, updated_at)
+                    )
+            self._conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            logger.error(f"Error saving conversation state: {e}")
+            if self._conn.in_transaction:
+                self._conn.execute("ROLLBACK")
+            return
+        self._writes += len(batch)
+        if self._writes >= self.SWEEP_EVERY:
+            self._writes = 0
+            self._sweep()
+
+    def _sweep(self) -> None:
+        """Delete expired entries and trim the namespace to max_entries"""
+        try:
+            self._conn.execute(
+                "DELETE FROM conversation_state WHERE namespace = ? AND updated_at < ?",
+                (self.namespace, time.time() - self.ttl)
+            )
+            self._conn.execute(
+                "DELETE FROM conversation_state WHERE namespace = ? AND user_id IN ("
+                " SELECT user_id FROM conversation_state WHERE namespace = ?"
+                " ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+                (self.namespace, self.namespace, self.max_entries)
+            )
+        except sqlite3.Error as e:
+            logger.error(f"Error sweeping conversation state: {e}")
+
+
+def create_state_store(namespace: str) -> StateStore:
+    """Build the state store selected by STATE_BACKEND ('memory' or 'sqlite')"""
+    if STATE_BACKEND == 'sqlite':
+        return SQLiteStateStore(namespace)
+    if STATE_BACKEND != 'memory':
+        logger.warning(f"Unknown STATE_BACKEND '{STATE_BACKEND}', using memory")
+    return MemoryStateStore()